@@ -0,0 +1,99 @@
+import hashlib
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.agents.base import BaseAgent
+from app.agents.types import ProcessingContext
+from app.models.chunk import DocumentChunk
+
+
+def chunk_hash(content: str) -> str:
+    """SHA-256 chunk-a; isto što i encode(sha256(convert_to(content, 'UTF8')), 'hex') u Postgresu."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ChunkDiffAgent(BaseAgent):
+    """
+    Verzionisani re-ingest: chunk-ovi nove verzije se porede po SHA-256 sa
+    postojećim chunk-ovima dokumenta. Nepromijenjeni zadržavaju red i embedding,
+    a context.chunks se sužava na nove chunk-ove, pa DensePrep/Embedding/Indexing
+    rade samo nad deltom. Ništa se ne briše dok ChunkDiffApplyAgent ne potvrdi
+    da je delta indeksirana.
+    Postavlja:
+      context.metadata['chunk_diff'] ({keep: [(chunk_id, novi index)], remove: [chunk_id]}),
+      ['chunk_indices'], ['total_chunks'], ['diff_stats']
+    """
+
+    def __init__(self, db: Session, enabled: bool = True):
+        super().__init__("ChunkDiffAgent", enabled=enabled)
+        self.db = db
+
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        # Hash se računa u bazi da se sadržaj starih chunk-ova ne prenosi
+        existing: Dict[str, List[uuid.UUID]] = defaultdict(list)
+        rows = self.db.execute(
+            text("""
+                SELECT id, encode(sha256(convert_to(content, 'UTF8')), 'hex')
+                FROM document_chunks WHERE document_id = :d ORDER BY chunk_index
+            """),
+            {"d": uuid.UUID(context.document_id)}
+        )
+        for chunk_id, digest in rows:
+            existing[digest].append(chunk_id)
+        previous = sum(len(ids) for ids in existing.values())
+
+        keep, new_chunks, new_indices = [], [], []
+        for idx, chunk in enumerate(context.chunks):
+            ids = existing.get(chunk_hash(chunk))
+            if ids:
+                keep.append((ids.pop(0), idx))
+            else:
+                new_chunks.append(chunk)
+                new_indices.append(idx)
+        remove = [chunk_id for ids in existing.values() for chunk_id in ids]
+
+        context.metadata['total_chunks'] = len(context.chunks)
+        context.metadata['chunk_diff'] = {"keep": keep, "remove": remove}
+        context.metadata['chunk_indices'] = new_indices
+        context.metadata['diff_stats'] = {
+            "previous": previous,
+            "unchanged": len(keep),
+            "added": len(new_chunks),
+            "removed": len(remove),
+        }
+        context.chunks = new_chunks
+        return context
+
+
+class ChunkDiffApplyAgent(BaseAgent):
+    """
+    Završni korak verzionisanog re-ingesta: zadržani chunk-ovi dobijaju nove
+    pozicije (chunk_index), a uklonjeni se brišu (entiteti idu CASCADE).
+    Ako delta nije indeksirana, stara verzija ostaje netaknuta. Commit radi
+    pozivalac, u istoj transakciji sa zamjenom kataloga tabela i metapodataka.
+    """
+
+    def __init__(self, db: Session, enabled: bool = True):
+        super().__init__("ChunkDiffApplyAgent", enabled=enabled)
+        self.db = db
+
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        diff = context.metadata.get('chunk_diff')
+        if not diff:
+            return context
+        if len(context.metadata.get('chunk_ids', [])) != len(context.chunks):
+            raise Exception("Novi chunk-ovi nisu indeksirani; prethodna verzija je zadržana.")
+
+        if diff["keep"]:
+            self.db.bulk_update_mappings(
+                DocumentChunk,
+                [{"id": chunk_id, "chunk_index": idx} for chunk_id, idx in diff["keep"]]
+            )
+        remove = diff["remove"]
+        for i in range(0, len(remove), 1000):
+            self.db.query(DocumentChunk).filter(DocumentChunk.id.in_(remove[i:i + 1000])).delete(synchronize_session=False)
+        return context
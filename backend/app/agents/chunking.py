@@ -80,7 +80,7 @@ class ChunkingAgent(BaseAgent):
         rows = tmeta.get('rows')
         cols = tmeta.get('cols')
         page = tmeta.get('page')
-        csv_path = tmeta.get('csv_path')
+        table_path = tmeta.get('table_path')
         preview = (tmeta.get('preview') or '')[:1200]
-        header = f"[TABLE rows={rows} cols={cols} page={page} path={csv_path}]"
+        header = f"[TABLE rows={rows} cols={cols} page={page} path={table_path}]"
         return f"{header}\n{preview}"
\ No newline at end of file
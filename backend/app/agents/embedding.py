@@ -1,8 +1,8 @@
+import asyncio
 from typing import List
-from openai import OpenAI
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
-from app.core.config import settings
+from app.services.llm_client import create_embeddings
 
 # Model i batch parametri
 EMBED_MODEL = "text-embedding-3-small"  # 1536 dimenzija, idealno za tvoju bazu
@@ -11,7 +11,6 @@ BATCH_SIZE = 64
 class EmbeddingAgent(BaseAgent):
     def __init__(self):
         super().__init__("EmbeddingAgent")
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
     async def process(self, context: ProcessingContext) -> ProcessingContext:
         if not context.chunks:
@@ -27,11 +26,10 @@ class EmbeddingAgent(BaseAgent):
         for i in range(0, len(texts), BATCH_SIZE):
             batch = texts[i:i + BATCH_SIZE]
             try:
-                resp = self.client.embeddings.create(
-                    model=EMBED_MODEL,
-                    input=batch
-                )
-                embeddings.extend([d.embedding for d in resp.data])
+                # Limiter/retry sloj može čekati, pa poziv ne blokira event loop
+                embeddings.extend(await asyncio.to_thread(
+                    create_embeddings, batch, model=EMBED_MODEL, caller=self.name
+                ))
             except Exception as e:
                 raise Exception(f"Embedding batch failed at {i}: {e}")
 
@@ -0,0 +1,42 @@
+from sqlalchemy.orm import Session
+from app.agents.base import BaseAgent
+from app.agents.types import ProcessingContext
+from app.models.entity import DocumentEntity
+from app.services.entity_index import extract_entities
+import uuid
+
+
+class EntityIndexAgent(BaseAgent):
+    """
+    Upisuje entitete (JMBG, ID dokumenata, email, datumi, iznosi) iz svakog
+    chunk-a u document_entities za exact-match pretragu bez embeddinga.
+    """
+    
+    def __init__(self, db: Session):
+        super().__init__("EntityIndexAgent")
+        self.db = db
+    
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        chunk_ids = context.metadata.get('chunk_ids', [])
+        if not chunk_ids:
+            return context
+        
+        document_id = uuid.UUID(context.document_id)
+        rows = []
+        for chunk_id, chunk_text in zip(chunk_ids, context.chunks):
+            for entity_type, normalized, raw in extract_entities(chunk_text):
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "document_id": document_id,
+                    "chunk_id": uuid.UUID(chunk_id),
+                    "entity_type": entity_type,
+                    "normalized_value": normalized,
+                    "raw_value": raw[:500],
+                })
+        
+        if rows:
+            self.db.bulk_insert_mappings(DocumentEntity, rows)
+            self.db.commit()
+        
+        context.metadata['indexed_entities'] = len(rows)
+        return context
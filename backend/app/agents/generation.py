@@ -22,6 +22,6 @@ class GenerationAgent:
         """
         chunks = ctx.get("retrieval", {}).get("hits", [])
         prompt = build_answer_prompt(user_query=ctx["query"], chunks=chunks)
-        out = llm_complete(prompt, model=settings.CHAT_MODEL, n=1)[0]
+        out = llm_complete(prompt, model=settings.CHAT_MODEL, n=1, caller=self.name)[0]
         ctx["answer"] = (out or "").strip()
         return ctx
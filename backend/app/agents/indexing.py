@@ -20,20 +20,32 @@ class IndexingAgent(BaseAgent):
             raise Exception("Mismatch between chunks and embeddings count")
         
         indexed_count = 0
+        chunk_ids = []
+        # Streaming ingest upisuje batch po batch, pa indeksi nastavljaju od prethodnog batch-a
+        offset = context.metadata.get('chunk_index_offset', 0)
+        # Verzionisani re-ingest indeksira samo deltu, pa pozicije dolaze eksplicitno
+        chunk_indices = context.metadata.get('chunk_indices')
+        # Opcioni metadata po chunk-u (npr. row_key/row_hash za inkrementalni SQL sync)
+        chunk_metadata = context.metadata.get('chunk_metadata')
         
         for idx, (chunk_text, embedding) in enumerate(zip(context.chunks, embeddings)):
+            # ID unaprijed, da ga naredni agenti (npr. EntityIndexAgent) imaju bez re-load-a
+            chunk_id = uuid.uuid4()
             chunk = DocumentChunk(
+                id=chunk_id,
                 document_id=uuid.UUID(context.document_id),
-                chunk_index=idx,
+                chunk_index=chunk_indices[idx] if chunk_indices else offset + idx,
                 content=chunk_text,
                 embedding=embedding,
-                chunk_metadata={}
+                chunk_metadata=chunk_metadata[idx] if chunk_metadata else {}
             )
             self.db.add(chunk)
+            chunk_ids.append(str(chunk_id))
             indexed_count += 1
         
         self.db.commit()
         
         context.metadata['indexed_chunks'] = indexed_count
+        context.metadata['chunk_ids'] = chunk_ids
         
         return context
@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -6,9 +7,9 @@ from .types import IngestContext
 from app.models.chunk import DocumentChunk
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import create_embeddings
 except ImportError:
-    get_llm_client = None
+    create_embeddings = None
 
 
 class IndexAgent(IngestAgent):
@@ -60,8 +61,6 @@ class IndexAgent(IngestAgent):
     
     async def _generate_embeddings(self, chunks: List, context: IngestContext):
         """Generiši embeddings u batch-evima"""
-        llm = get_llm_client()
-        
         total_batches = (len(chunks) + self.batch_size - 1) // self.batch_size
         
         for batch_idx in range(total_batches):
@@ -74,7 +73,7 @@ class IndexAgent(IngestAgent):
                 texts = [chunk.text for chunk in batch]
                 
                 # Batch embedding request
-                embeddings = await llm.create_embeddings(texts)
+                embeddings = await asyncio.to_thread(create_embeddings, texts, caller="IndexAgent")
                 
                 # Assign embeddings to chunks
                 for chunk, embedding in zip(batch, embeddings):
@@ -1,3 +1,4 @@
+import asyncio
 import re
 from datetime import datetime
 from typing import List, Dict, Any
@@ -6,9 +7,22 @@ from .types import IngestContext, ExtractedEntity
 from app.core.config import settings
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import get_llm_client, chat_completion
 except ImportError:
-    get_llm_client = None
+    get_llm_client = chat_completion = None
+
+
+# Obrasci entiteta (dijele ih RewriterAgent, planner i indeks entiteta)
+JMBG_PATTERN = re.compile(r'\b\d{13}\b')  # JMBG - 13 cifara
+# DOC-12345, INV-2024-001, ...; korisnici ID često kucaju malim slovima ("inv-2024-001")
+DOC_ID_PATTERN = re.compile(r'\b[A-Z]{2,4}[-/]?\d{3,8}(?:[-/]\d{1,8})*\b', re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+ID_PATTERNS = {"jmbg": JMBG_PATTERN, "doc_id": DOC_ID_PATTERN, "email": EMAIL_PATTERN}
+DATE_PATTERNS = [
+    re.compile(r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}'),
+    re.compile(r'\d{4}[./-]\d{1,2}[./-]\d{1,2}'),
+]
+MONEY_PATTERN = re.compile(r'\d+(?:[.,]\d+)*\s*(?:EUR|USD|BAM|KM|RSD|€|\$)', re.IGNORECASE)
 
 
 class MetaAgent(IngestAgent):
@@ -71,7 +85,9 @@ Odgovori sa JSON:
 }}"""
         
         try:
-            response = llm.chat.completions.create(
+            response = await asyncio.to_thread(
+                chat_completion,
+                caller="MetaAgent",
                 model=settings.CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.2,
@@ -149,7 +165,9 @@ Odgovori sa JSON:
 Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/brojeve dokumenata."""
         
         try:
-            response = llm.chat.completions.create(
+            response = await asyncio.to_thread(
+                chat_completion,
+                caller="MetaAgent",
                 model=settings.CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
@@ -187,13 +205,8 @@ Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/bro
         text = context.raw_text
         
         # Dates
-        date_patterns = [
-            r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}',
-            r'\d{4}[./-]\d{1,2}[./-]\d{1,2}'
-        ]
-        
-        for pattern in date_patterns:
-            for match in re.finditer(pattern, text):
+        for pattern in DATE_PATTERNS:
+            for match in pattern.finditer(text):
                 entity = ExtractedEntity(
                     text=match.group(0),
                     entity_type="DATE",
@@ -204,8 +217,7 @@ Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/bro
                 context.entities.append(entity)
         
         # Money amounts
-        money_pattern = r'\d+[.,]?\d*\s*(EUR|USD|BAM|KM|RSD|€|\$)'
-        for match in re.finditer(money_pattern, text, re.IGNORECASE):
+        for match in MONEY_PATTERN.finditer(text):
             entity = ExtractedEntity(
                 text=match.group(0),
                 entity_type="MONEY",
@@ -216,8 +228,7 @@ Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/bro
             context.entities.append(entity)
         
         # Email addresses
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        for match in re.finditer(email_pattern, text):
+        for match in EMAIL_PATTERN.finditer(text):
             entity = ExtractedEntity(
                 text=match.group(0),
                 entity_type="EMAIL",
@@ -245,14 +256,12 @@ Fokusiraj se na: imena, kompanije, datume, novčane iznose, lokacije, šifre/bro
         text = context.raw_text
         
         # JMBG (Bosnia ID number - 13 digits)
-        jmbg_pattern = r'\b\d{13}\b'
-        jmbg_matches = re.findall(jmbg_pattern, text)
+        jmbg_matches = JMBG_PATTERN.findall(text)
         if jmbg_matches:
             context.extracted_metadata["jmbg_numbers"] = list(set(jmbg_matches[:5]))
         
         # Document IDs (patterns like: DOC-12345, INV-2024-001, etc.)
-        doc_id_pattern = r'\b[A-Z]{2,4}[-/]?\d{3,8}\b'
-        doc_ids = re.findall(doc_id_pattern, text)
+        doc_ids = DOC_ID_PATTERN.findall(text)
         if doc_ids:
             context.extracted_metadata["document_ids"] = list(set(doc_ids[:10]))
         
@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 import re
 from .base import IngestAgent
@@ -5,9 +6,9 @@ from .types import IngestContext, DocumentSegment, ProcessedChunk
 from app.core.config import settings
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import get_llm_client, chat_completion
 except ImportError:
-    get_llm_client = None
+    get_llm_client = chat_completion = None
 
 
 class StructureAgent(IngestAgent):
@@ -74,7 +75,9 @@ Pravila:
 - Sažmi svaki segment u 1-2 rečenice"""
         
         try:
-            response = llm.chat.completions.create(
+            response = await asyncio.to_thread(
+                chat_completion,
+                caller="StructureAgent",
                 model=settings.CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
@@ -1,15 +1,17 @@
+import asyncio
 import json
-import csv
-import io
+from pathlib import Path
 from typing import List, Dict, Any
+import pandas as pd
 from .base import IngestAgent
 from .types import IngestContext, TableData
 from app.core.config import settings
+from app.services.table_store import write_table
 
 try:
-    from app.services.llm_client import get_llm_client
+    from app.services.llm_client import chat_completion
 except ImportError:
-    get_llm_client = None
+    chat_completion = None
 
 
 class TableAgent(IngestAgent):
@@ -43,9 +45,8 @@ class TableAgent(IngestAgent):
                     if enhanced_table:
                         cleaned_table = enhanced_table
                 
-                # Convert to multiple formats
-                cleaned_table.metadata["csv"] = self._table_to_csv(cleaned_table)
-                cleaned_table.metadata["json"] = self._table_to_json(cleaned_table)
+                # Tipizovana kolonarna kopija umjesto CSV/JSON stringova u metapodacima
+                cleaned_table.metadata.update(self._store_table(cleaned_table, context, idx))
                 
                 processed_tables.append(cleaned_table)
                 
@@ -61,7 +62,8 @@ class TableAgent(IngestAgent):
             {
                 "headers": table.headers,
                 "row_count": len(table.rows),
-                "col_count": len(table.headers)
+                "col_count": len(table.headers),
+                "table_path": table.metadata.get("table_path")
             }
             for table in processed_tables
         ]
@@ -117,8 +119,6 @@ class TableAgent(IngestAgent):
     
     async def _llm_enhance_table(self, table: TableData, context: IngestContext) -> TableData:
         """LLM enhancement - provjerava header-e, tipove, značenje kolona"""
-        llm = get_llm_client()
-        
         # Create table preview
         preview_rows = table.rows[:5]
         table_text = self._table_to_text(table.headers, preview_rows)
@@ -140,8 +140,10 @@ Pravila:
 - Zadrži isti broj kolona"""
         
         try:
-            response = await llm.chat_completion(
+            response = await asyncio.to_thread(
+                chat_completion,
                 messages=[{"role": "user", "content": prompt}],
+                caller="TableAgent",
                 temperature=0.2,
                 max_tokens=500
             )
@@ -185,29 +187,18 @@ Pravila:
         
         return "\n".join(lines)
     
-    def _table_to_csv(self, table: TableData) -> str:
-        """Convert table to CSV string"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write headers
-        writer.writerow(table.headers)
-        
-        # Write rows
-        for row in table.rows:
-            writer.writerow(row)
-        
-        return output.getvalue()
-    
-    def _table_to_json(self, table: TableData) -> str:
-        """Convert table to JSON array"""
-        records = []
-        
-        for row in table.rows:
-            record = {}
-            for idx, header in enumerate(table.headers):
-                value = row[idx] if idx < len(row) else ""
-                record[header] = value
-            records.append(record)
-        
-        return json.dumps(records, ensure_ascii=False, indent=2)
+    def _store_table(self, table: TableData, context: IngestContext, idx: int) -> Dict[str, Any]:
+        """Upiši tabelu u table store (Parquet) pored izvornog fajla"""
+        width = len(table.headers)
+        rows = [(row + [""] * width)[:width] for row in table.rows]
+        df = pd.DataFrame(rows, columns=table.headers or None)
+        file_path = Path(context.file_path)
+        assets_dir = file_path.parent / (file_path.stem + "_extract") / "assets"
+        stored = write_table(df, assets_dir / f"ingest_table_{idx}")
+        # LLM tipovi kolona (text|number|date|...) idu u šemu kao hint za SQL tipove
+        column_types = table.metadata.get("column_types") or []
+        schema = [
+            {**col, "semantic": column_types[i]} if i < len(column_types) else col
+            for i, col in enumerate(stored["schema"])
+        ]
+        return {"table_path": stored["table_path"], "format": stored["format"], "schema": schema}
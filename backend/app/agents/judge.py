@@ -1,7 +1,17 @@
 from typing import Any, Dict
 import json
+from app.core.config import settings
+from app.services.grounding import grounding_signals, grounding_confidence, is_refusal
 from app.services.llm_client import llm_complete
 
+# (donja, gornja) granica nesigurnog pojasa po JUDGE_STRICTNESS;
+# samo ocjene unutar pojasa idu na LLM judge
+CONFIDENCE_BANDS = {
+    "low": (0.25, 0.6),
+    "medium": (0.35, 0.75),
+    "high": (0.45, 0.9),
+}
+
 
 def _safe_json(s: str):
     """Parse JSON sa fallback-om."""
@@ -14,6 +24,8 @@ def _safe_json(s: str):
 class JudgeAgent:
     """
     Evaluira kvalitet generisanog odgovora i odlučuje da li su potrebni dodatni izvori.
+    Prvo računa lokalne signale utemeljenosti (heuristic tier); LLM se poziva
+    samo kada ocjena padne u nesigurni pojas.
     """
     name = "judge"
     
@@ -25,10 +37,19 @@ class JudgeAgent:
             ctx: Kontekst sa 'answer' i 'retrieval' dict-om
         
         Returns:
-            Ažurirani kontekst sa 'verdict' dict-om: {ok, needs_more, notes}
+            Ažurirani kontekst sa 'verdict' dict-om: {ok, needs_more, notes, tier, confidence}
         """
         answer = ctx.get("answer", "")
         chunks = ctx.get("retrieval", {}).get("hits", [])
+        
+        confidence = None
+        if settings.JUDGE_HEURISTIC_ENABLED:
+            verdict = self._heuristic(answer, chunks)
+            if verdict.get("tier") == "heuristic":
+                ctx["verdict"] = verdict
+                return ctx
+            confidence = verdict["confidence"]
+        
         cite_texts = "\n".join((c.get("content", "") or "")[:400] for c in chunks[:3])
         
         prompt = (
@@ -37,6 +58,37 @@ class JudgeAgent:
             f"ODGOVOR:\n{answer}\n\nKONTEKST (skraćeno):\n{cite_texts}"
         )
         
-        raw = llm_complete(prompt, n=1)[0]
-        ctx["verdict"] = _safe_json(raw or "")
+        raw = llm_complete(prompt, n=1, caller=self.name)[0]
+        verdict = _safe_json(raw or "")
+        if not isinstance(verdict, dict):
+            verdict = {"ok": True, "needs_more": False, "notes": "fallback"}
+        verdict["tier"] = "llm"
+        verdict["confidence"] = confidence
+        ctx["verdict"] = verdict
         return ctx
+    
+    def _heuristic(self, answer: str, chunks: list) -> Dict[str, Any]:
+        """
+        Lokalna presuda iz signala utemeljenosti. Vraća tier "heuristic" kada je
+        ocjena van nesigurnog pojasa, inače tier "uncertain" (ide na LLM).
+        """
+        if not chunks:
+            return {"ok": False, "needs_more": True, "notes": "nema konteksta",
+                    "tier": "heuristic", "confidence": 0.0}
+        if is_refusal(answer):
+            return {"ok": True, "needs_more": True, "notes": "odgovor navodi da kontekst nije dovoljan",
+                    "tier": "heuristic", "confidence": 1.0}
+        
+        signals = grounding_signals(answer, chunks)
+        confidence = round(grounding_confidence(signals), 4)
+        low, high = CONFIDENCE_BANDS.get(settings.JUDGE_STRICTNESS, CONFIDENCE_BANDS["medium"])
+        # Broj koji se ne pojavljuje u kontekstu nikad ne prolazi bez LLM provjere
+        numbers_ok = signals["numeric"] is None or signals["numeric"] >= 1.0
+        
+        if confidence >= high and numbers_ok:
+            return {"ok": True, "needs_more": False, "notes": "utemeljeno u kontekstu",
+                    "tier": "heuristic", "confidence": confidence}
+        if confidence <= low:
+            return {"ok": False, "needs_more": True, "notes": "slaba pokrivenost kontekstom",
+                    "tier": "heuristic", "confidence": confidence}
+        return {"tier": "uncertain", "confidence": confidence}
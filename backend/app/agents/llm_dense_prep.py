@@ -1,8 +1,18 @@
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
 from app.services.llm_client import llm_complete
 from app.core.config import settings
 
+# Mijenja se uz svaku izmjenu promptova, da keš ne vraća izlaze starog prompta
+PROMPT_VERSION = "2"
+
 PROMPT_TMPL = """Pretvori sljedeći odlomak u 'embedding-ready' tekst za semantičku pretragu.
 - U jednoj rečenici sažmi suštinu (maks. 25 riječi).
 - Dodaj 3–6 ključnih pojmova (bez znakova).
@@ -12,25 +22,200 @@ PROMPT_TMPL = """Pretvori sljedeći odlomak u 'embedding-ready' tekst za semanti
 Tekst:
 \"\"\"{chunk}\"\"\""""
 
+BATCH_PROMPT_TMPL = """Pretvori svaki od sljedećih odlomaka u 'embedding-ready' tekst za semantičku pretragu.
+Za svaki odlomak:
+- U jednoj rečenici sažmi suštinu (maks. 25 riječi).
+- Dodaj 3–6 ključnih pojmova (bez znakova).
+- Vrati 1–3 kratka reda koji nose glavni smisao teksta, bez uvoda i zaključka.
+- Ne dodaj oznake ili meta-tekst; vrati samo čisti tekst.
+
+Vrati strogo JSON: {{"items": [{{"id": <id odlomka>, "text": "..."}}]}} sa tačno jednim elementom po odlomku.
+
+Odlomci (JSON):
+{chunks}"""
+
+
+def _clean(out: Optional[str], chunk: str) -> str:
+    cleaned = (out or "").strip()
+    return cleaned or chunk
+
+
+def parse_batch_output(raw: str, ids: List[int]) -> Dict[int, str]:
+    """
+    Izlazi batch prompta po id-u odlomka; nevalidni ili nepoznati elementi se ignorišu.
+
+    Args:
+        raw: odgovor modela (JSON)
+        ids: id-evi odlomaka poslanih u batch-u
+
+    Returns:
+        {id: tekst} samo za odlomke sa ispravnim izlazom
+    """
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return {}
+    wanted = set(ids)
+    outputs = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str) or not item["text"].strip():
+            continue
+        try:
+            item_id = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if item_id in wanted:
+            outputs[item_id] = item["text"].strip()
+    return outputs
+
+
+class DensePrepCache:
+    """LRU keš dense-prep izlaza po (SHA-256 chunk-a, PROMPT_VERSION, model)."""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(chunk: str, model: str) -> str:
+        return hashlib.sha256(f"{PROMPT_VERSION}\x00{model}\x00{chunk}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            out = self._entries.get(key)
+            if out is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return out
+
+    def put(self, key: str, out: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = out
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+
+dense_prep_cache = DensePrepCache(max_entries=settings.DENSE_PREP_CACHE_MAX_ENTRIES)
+
+
 class LLMDensePrepAgent(BaseAgent):
-    def __init__(self, enabled: bool = True):
+    """
+    Priprema chunk-ova za dense retrieval (embed_texts).
+
+    Više chunk-ova ide u jedan prompt sa JSON izlazom (DENSE_PREP_BATCH_SIZE /
+    DENSE_PREP_BATCH_CHARS), batch-evi se šalju paralelno do
+    DENSE_PREP_CONCURRENCY istovremenih poziva, a izlazi se keširaju po hash-u
+    chunk-a i verziji prompta. Chunk bez ispravnog izlaza u batch odgovoru ide
+    pojedinačnim promptom; ako i on padne, embeduje se originalni tekst.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        batch_size: Optional[int] = None,
+        batch_chars: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        cache: Optional[DensePrepCache] = None
+    ):
         super().__init__("LLMDensePrepAgent")
         self.enabled = enabled and bool(settings.OPENAI_API_KEY)
+        self.batch_size = max(1, batch_size or settings.DENSE_PREP_BATCH_SIZE)
+        self.batch_chars = batch_chars or settings.DENSE_PREP_BATCH_CHARS
+        self.concurrency = max(1, concurrency or settings.DENSE_PREP_CONCURRENCY)
+        self.cache = cache if cache is not None else dense_prep_cache
+        self.model = settings.CHAT_MODEL
+
+    def _batches(self, pending: List[int], chunks: List[str]) -> List[List[int]]:
+        """Grupiši indekse chunk-ova po broju i ukupnoj dužini."""
+        batches, current, size = [], [], 0
+        for idx in pending:
+            length = len(chunks[idx])
+            if current and (len(current) >= self.batch_size or size + length > self.batch_chars):
+                batches.append(current)
+                current, size = [], 0
+            current.append(idx)
+            size += length
+        if current:
+            batches.append(current)
+        return batches
+
+    def _run_batch(self, batch: List[int], chunks: List[str]) -> Tuple[Dict[int, str], int]:
+        """Jedan batch (blokirajuće; izvršava se u threadpool-u). Vraća izlaze i broj pojedinačnih fallback-a."""
+        outputs: Dict[int, str] = {}
+        fallback = 0
+        if len(batch) > 1:
+            payload = json.dumps([{"id": idx, "text": chunks[idx]} for idx in batch], ensure_ascii=False)
+            try:
+                raw = llm_complete(BATCH_PROMPT_TMPL.format(chunks=payload), model=self.model, n=1, json_mode=True,
+                                   caller=self.name)[0]
+                outputs = parse_batch_output(raw, batch)
+            except Exception:
+                outputs = {}
+        for idx in batch:
+            if idx in outputs:
+                continue
+            if len(batch) > 1:
+                fallback += 1
+            try:
+                out = llm_complete(PROMPT_TMPL.format(chunk=chunks[idx]), model=self.model, n=1, caller=self.name)[0]
+                outputs[idx] = _clean(out, chunks[idx])
+            except Exception:
+                outputs[idx] = chunks[idx]  # fallback ako LLM padne
+        return outputs, fallback
 
     async def process(self, context: ProcessingContext) -> ProcessingContext:
         if not self.enabled or not context.chunks:
             return context
 
-        embed_texts = []
-        for ch in context.chunks:
-            try:
-                out = llm_complete(PROMPT_TMPL.format(chunk=ch), n=1)[0]
-                cleaned = (out or "").strip()
-                if not cleaned:
-                    cleaned = ch
-                embed_texts.append(cleaned)
-            except Exception:
-                embed_texts.append(ch)  # fallback ako LLM padne
+        chunks = context.chunks
+        embed_texts: List[Optional[str]] = [None] * len(chunks)
+        keys = [self.cache.key(ch, self.model) for ch in chunks]
+        # Isti chunk (npr. ponovljeno zaglavlje) se šalje samo jednom
+        first_by_key: Dict[str, int] = {}
+        pending = []
+        for idx, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is not None:
+                embed_texts[idx] = cached
+            elif key not in first_by_key:
+                first_by_key[key] = idx
+                pending.append(idx)
+
+        stats = {"chunks": len(chunks), "cached": sum(t is not None for t in embed_texts),
+                 "llm_chunks": len(pending), "batches": 0, "fallback": 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: List[int]) -> Tuple[Dict[int, str], int]:
+            async with semaphore:
+                return await asyncio.to_thread(self._run_batch, batch, chunks)
+
+        batches = self._batches(pending, chunks)
+        stats["batches"] = len(batches)
+        for outputs, fallback in await asyncio.gather(*(run(b) for b in batches)):
+            stats["fallback"] += fallback
+            for idx, out in outputs.items():
+                # Originalni tekst (LLM pao) se ne kešira, pa sljedeći ingest pokušava ponovo
+                if out != chunks[idx]:
+                    self.cache.put(keys[idx], out)
+                embed_texts[idx] = out
+
+        for idx, key in enumerate(keys):
+            if embed_texts[idx] is None:
+                embed_texts[idx] = embed_texts[first_by_key[key]]
 
         context.metadata["embed_texts"] = embed_texts
+        context.metadata["dense_prep_stats"] = stats
         return context
@@ -1,29 +1,89 @@
 from typing import Any, Dict
+from app.agents.rewriter import rewrite_cache, rewrite_skip_reason
+from app.services.entity_index import has_id_entity
+from app.services.table_router import detect_table_intent
+
+# Procjena trajanja faza (ms); pipeline ih zamjenjuje izmjerenim prosjecima
+STAGE_COST_MS: Dict[str, float] = {
+    "embedding": 200.0,
+    "retrieval": 150.0,
+    "rewriter": 900.0,
+    "generation": 2500.0,
+    "judge": 1200.0,
+}
+MAX_ITERATIONS = 2
 
 
 class PlannerAgent:
     """
     Planira strategiju pretrage i odgovaranja.
     Trenutno uvijek koristi RAG pretragu sa konfigurabilnim brojem rewrites-a.
+    Ako je zadat budžet latencije ('deadline_ms'), bira koje faze stanu u budžet.
+    Rewrites se preskaču za kratke upite, citirane fraze i ID upite; ID upiti
+    idu prvo na exact-match lookup u indeksu entiteta. Agregacijska i tabelarna
+    pitanja nad ingestovanim tabelama ('tables') idu direktno na table agente.
     """
     name = "planner"
-    
+
     def run(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
         """
         Kreira plan za query processing.
-        
+
         Args:
-            ctx: Kontekst sa 'rewrites_count' i ostalim parametrima
-        
+            ctx: Kontekst sa 'query', 'rewrites_count', opciono 'deadline_ms', 'stage_costs_ms' i 'tables'
+
         Returns:
             Ažurirani kontekst sa 'plan' dict-om
         """
         # Minimalni plan: koristi RAG; broj rewrites je iz ctx-a ili 0
         rewrites = int(ctx.get("rewrites_count", 0))
+        exact_match = has_id_entity(ctx.get("query", ""))
+        skip_reason = rewrite_skip_reason(ctx.get("query", "")) if rewrites > 0 else None
+        if rewrites > 0 and exact_match and not skip_reason:
+            skip_reason = "exact_match"
+        if skip_reason:
+            rewrites = 0
+        use_judge = True
+        max_iterations = MAX_ITERATIONS
+
+        deadline_ms = ctx.get("deadline_ms")
+        if deadline_ms is not None:
+            cost = {**STAGE_COST_MS, **(ctx.get("stage_costs_ms") or {})}
+            retrieve = cost["embedding"] + cost["retrieval"]
+            # Obavezno: retrieval originalnog upita + generisanje
+            spare = float(deadline_ms) - retrieve - cost["generation"]
+
+            # Keširani rewrites ne troše LLM poziv; svi rewrites se embeduju jednim
+            # batch pozivom, a pretražuju jedan po jedan
+            rewriter_cost = 0.0 if rewrite_cache.contains(ctx.get("query", ""), rewrites) else cost["rewriter"]
+            rewrite_total = rewriter_cost + cost["embedding"] + cost["retrieval"] * rewrites
+            if rewrites > 0 and spare >= rewrite_total:
+                spare -= rewrite_total
+            elif rewrites > 0:
+                rewrites = 0
+                skip_reason = "deadline"
+
+            use_judge = spare >= cost["judge"]
+            if use_judge:
+                spare -= cost["judge"]
+                per_iteration = retrieve + cost["generation"] + cost["judge"]
+                max_iterations = min(MAX_ITERATIONS, max(0, int(spare // per_iteration)))
+            else:
+                max_iterations = 0
+
+        table_query = detect_table_intent(ctx.get("query", ""), ctx.get("tables") or [])
+
         ctx["plan"] = {
-            "use_rag": True,
+            "use_rag": table_query is None,
             "use_sql": False,
             "use_web": False,
+            "use_table": table_query is not None,
+            "table_query": table_query,
             "rewrites": rewrites,
+            "rewrite_skip_reason": skip_reason,
+            "exact_match": exact_match,
+            "judge": use_judge,
+            "max_iterations": max_iterations,
+            "deadline_ms": deadline_ms,
         }
         return ctx
@@ -1,10 +1,79 @@
-from typing import Any, Dict, List
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.agents.ingest.meta import ID_PATTERNS
 from app.services.llm_client import llm_complete
+from app.services.singleflight import normalize_query
+
+_QUOTED_RE = re.compile(r'["“„«»].+?["”“»«]')
+
+
+def rewrite_skip_reason(query: str) -> Optional[str]:
+    """
+    Jeftina lokalna pravila kada parafraze ne pomažu pretrazi.
+
+    Args:
+        query: Korisnikov upit
+
+    Returns:
+        Razlog preskakanja ("short_query", "quoted_phrase", "id:<tip>") ili None
+    """
+    if len(re.findall(r"\w+", query)) < settings.REWRITE_MIN_QUERY_WORDS:
+        return "short_query"
+    if _QUOTED_RE.search(query):
+        return "quoted_phrase"
+    for kind, pattern in ID_PATTERNS.items():
+        if pattern.search(query):
+            return f"id:{kind}"
+    return None
+
+
+class RewriteCache:
+    """LRU keš rewrites po (normalizovan upit, k)."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, query: str, k: int) -> Optional[List[str]]:
+        key = (normalize_query(query), k)
+        with self._lock:
+            rewrites = self._entries.get(key)
+            if rewrites is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return list(rewrites)
+
+    def contains(self, query: str, k: int) -> bool:
+        with self._lock:
+            return (normalize_query(query), k) in self._entries
+
+    def put(self, query: str, k: int, rewrites: List[str]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(normalize_query(query), k)] = list(rewrites)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+
+rewrite_cache = RewriteCache(max_entries=settings.REWRITE_CACHE_MAX_ENTRIES)
 
 
 class RewriterAgent:
     """
     Parafrazira korisnikov upit u više varijanti za poboljšanje pretrage.
+    Rezultati se keširaju; kratki upiti, citirane fraze i ID upiti se ne parafraziraju.
     """
     name = "rewriter"
     
@@ -19,18 +88,25 @@ class RewriterAgent:
             Ažurirani kontekst sa 'rewrites' listom
         """
         k = int(ctx.get("plan", {}).get("rewrites", 0))
-        if k <= 0:
+        if k <= 0 or rewrite_skip_reason(ctx["query"]):
             ctx["rewrites"] = []
             return ctx
         
+        cached = rewrite_cache.get(ctx["query"], k)
+        if cached is not None:
+            ctx["rewrites"] = cached
+            return ctx
+        
         prompt = (
             f"Parafraziraj upit u {k} varijanti koje mogu poboljšati vektorsku pretragu. "
             "Sačuvaj semantiku. Vrati svaku varijantu u novom redu bez dodatnog teksta.\n\n"
             f"Upit: {ctx['query']}"
         )
         
-        outs = llm_complete(prompt, n=1)
+        outs = llm_complete(prompt, n=1, caller=self.name)
         lines = (outs[0] or "").splitlines()
         rewrites = [ln.strip(" -•\t") for ln in lines if ln.strip()]
         ctx["rewrites"] = rewrites[:k]
+        if ctx["rewrites"]:
+            rewrite_cache.put(ctx["query"], k, ctx["rewrites"])
         return ctx
@@ -25,7 +25,7 @@ class SemanticChunkerAgent:
         if not clean_text:
             return []
         prompt = CHUNK_PROMPT.format(text=clean_text[: self.max_chars])
-        out = llm_complete(prompt, n=1)[0]
+        out = llm_complete(prompt, n=1, caller="SemanticChunkerAgent")[0]
         try:
             data = json.loads(out)
             if isinstance(data, list):
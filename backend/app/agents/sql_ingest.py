@@ -1,12 +1,13 @@
 import uuid
 from typing import List
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
 from app.core.config import settings
+from app.services.engine_registry import engine_registry
 
 
 def _to_uuid(val) -> uuid.UUID:
@@ -54,7 +55,7 @@ class PgVectorIngestAgent(BaseAgent):
         if len(vectors) != len(chunks):
             raise ValueError(f"PgVectorIngestAgent: length mismatch vectors({len(vectors)}) vs chunks({len(chunks)})")
 
-        engine = create_engine(self.target_pg_url)
+        engine = engine_registry.get_engine(self.target_pg_url)
         doc_id = _to_uuid(context.metadata.get("doc_id"))
 
         insert_chunk_sql = text(f"""
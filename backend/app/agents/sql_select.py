@@ -1,24 +1,126 @@
+import csv
 import re
+from decimal import Decimal
 from pathlib import Path
 from typing import Dict, Any, List, Optional
-import pandas as pd
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext, DocumentType
 from app.core.config import settings
+from app.services.engine_registry import engine_registry
+from app.services.table_store import PARQUET_AVAILABLE, unique_columns
+
+# Optional; bez pyarrow-a export ostaje CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+
+def is_safe_query(q: str) -> bool:
+    """Dozvoljava samo SELECT/CTE bez DDL/DML ključnih riječi."""
+    U = q.strip().upper()
+    bad = ['DROP','DELETE','UPDATE','INSERT','CREATE','ALTER','TRUNCATE','EXEC','EXECUTE','MERGE']
+    if any(re.search(rf'\b{kw}\b', U) for kw in bad):
+        return False
+    return U.startswith("SELECT") or U.startswith("WITH")
+
+
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_ISO_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?")
+
+
+def _typed_text(arr):
+    """
+    Tekst kolona koja je u cijelosti ISO datum/vrijeme (npr. SQLite DATE, koji
+    drajver vraća kao string) postaje date32/timestamp; ostalo ostaje string.
+    """
+    values = [v for v in arr.to_pylist() if v is not None]
+    for pattern, target in ((_ISO_DATE_RE, pa.date32()), (_ISO_TIMESTAMP_RE, pa.timestamp("us"))):
+        if values and all(pattern.fullmatch(v) for v in values):
+            try:
+                return pa.array([None if v is None else v.replace(" ", "T") for v in arr.to_pylist()],
+                                type=pa.string()).cast(target)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                return arr
+    return arr
+
+
+def _arrow_column(values: List[Any], type_=None):
+    """
+    Kolona batch-a kao Arrow niz. Datumi, vremena i Decimal ostaju tipizovani
+    (date32, timestamp, decimal128); Decimal pomiješan sa int/float ide u float64.
+    Bez type_ se tip zaključuje iz vrijednosti (samo-NULL i miješane kolone
+    postaju string). Vrijednosti koje ne staju u type_ bez gubitka (decimale ili
+    tekst u cjelobrojnoj koloni, prekoračenje) dižu ArrowInvalid umjesto tihog odsijecanja.
+    """
+    if not all(v is None or isinstance(v, Decimal) for v in values):
+        values = [float(v) if isinstance(v, Decimal) else v for v in values]
+    if type_ is not None and pa.types.is_string(type_):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    try:
+        arr = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        arr = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    if pa.types.is_string(arr.type):
+        arr = _typed_text(arr)
+    if pa.types.is_null(arr.type):
+        return pa.nulls(len(values), type=type_ or pa.string())
+    if type_ is None or arr.type == type_:
+        return arr
+    if pa.types.is_string(arr.type):
+        raise pa.ArrowInvalid(f"tekstualne vrijednosti u koloni tipa {type_}")
+    if pa.types.is_date(type_) and pa.types.is_timestamp(arr.type):
+        # cast bi tiho odsjekao vrijeme; kolona se proširuje u timestamp
+        raise pa.ArrowInvalid(f"vrijeme u koloni tipa {type_}")
+    return arr.cast(type_)
+
+
+def _fit_column(values: List[Any], type_):
+    """
+    Kolona batch-a u tipu type_, a ako vrijednosti ne staju, u najužem širem
+    tipu (int -> int64 -> float64, decimal -> širi decimal, date -> timestamp,
+    sve ostalo -> string). Pozivalac upoređuje tip rezultata.
+    """
+    try:
+        return _arrow_column(values, type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        pass
+    new = _arrow_column(values).type
+    candidates = []
+    if pa.types.is_decimal(type_) and pa.types.is_decimal(new):
+        scale = max(type_.scale, new.scale)
+        digits = max(type_.precision - type_.scale, new.precision - new.scale)
+        if digits + scale <= 38:
+            candidates.append(pa.decimal128(digits + scale, scale))
+    if pa.types.is_temporal(type_) and pa.types.is_temporal(new):
+        candidates.append(pa.timestamp("us"))
+    if pa.types.is_integer(type_) and pa.types.is_integer(new):
+        candidates.append(pa.int64())
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t) for t in (type_, new)):
+        candidates.append(pa.float64())
+    for candidate in candidates:
+        try:
+            return _arrow_column(values, candidate)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            continue
+    return _arrow_column(values, pa.string())
 
 
 class SQLSelectToCSVAgent(BaseAgent):
     """
-    Siguran SELECT nad SOURCE_DB_URL (npr. Db2), rezultat u CSV.
+    Siguran SELECT nad SOURCE_DB_URL (npr. Db2), rezultat u tipizovani Parquet
+    (zstd, row group-e pišu se dok kursor stream-uje) ili CSV.
     Postavlja:
       - context.file_path, context.filename
-      - context.document_type = DocumentType.CSV
-      - context.metadata['sql_csv_path'], ['sql_row_count'], ['sql_rows' (preview)]
+      - context.document_type = DocumentType.CSV (tabelarni izvor; TextExtract čita i .parquet)
+      - context.metadata['sql_csv_path'] (putanja exporta, ime ključa zadržano zbog agenata),
+        ['sql_export_format'], ['sql_row_count'], ['sql_rows' (preview)]
     """
 
     def __init__(self,
@@ -26,7 +128,9 @@ class SQLSelectToCSVAgent(BaseAgent):
                  query: Optional[str] = None,
                  out_dir: Optional[str] = None,
                  out_name: Optional[str] = None,
-                 max_rows: int = 50000):
+                 max_rows: int = 50000,
+                 source_key: Optional[str] = None,
+                 out_format: Optional[str] = None):
         super().__init__("SQLSelectToCSVAgent")
         self.source_url = source_url or getattr(settings, "SOURCE_DB_URL", None) or getattr(settings, "EXTERNAL_DB_URL", None)
         if not self.source_url:
@@ -35,69 +139,156 @@ class SQLSelectToCSVAgent(BaseAgent):
         if not self.query:
             raise ValueError("SQLSelectToCSVAgent: SQL_INGEST_QUERY nije podešen.")
         self.max_rows = max_rows
+        self.source_key = source_key
         self.out_dir = Path(out_dir or getattr(settings, "SQL_EXPORT_DIR", "/app/uploads/sql_exports")).resolve()
         self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.out_format = (out_format or settings.SQL_EXPORT_FORMAT).lower()
+        if self.out_format == "parquet" and not PARQUET_AVAILABLE:
+            self.out_format = "csv"
+        ext = f".{self.out_format}"
         if out_name:
-            self.out_name = out_name if out_name.lower().endswith(".csv") else f"{out_name}.csv"
+            self.out_name = out_name if out_name.lower().endswith(ext) else f"{Path(out_name).stem}{ext}"
         else:
-            self.out_name = "db_select_export.csv"
+            self.out_name = f"db_select_export{ext}"
 
     async def process(self, context: ProcessingContext) -> ProcessingContext:
         if not self._is_safe_query(self.query):
             raise ValueError("SQLSelectToCSVAgent: dozvoljen je samo SELECT/CTE.")
-        engine = create_engine(self.source_url)
-        rows, columns = self._fetch_rows(engine, self.query, self.max_rows)
-        csv_path = self._write_csv(rows, columns)
+        engine = engine_registry.get_engine(self.source_url, key=self.source_key)
+        if self.out_format == "parquet":
+            csv_path, rows, row_count = self._stream_to_parquet(engine, self.query, self.max_rows)
+        else:
+            csv_path, rows, row_count = self._stream_to_csv(engine, self.query, self.max_rows)
         context.file_path = str(csv_path)
         context.filename = csv_path.name
         context.document_type = DocumentType.CSV
         context.text_content = ""  # TextExtract će ga popuniti
-        context.metadata["sql_rows"] = rows[:min(50, len(rows))]
-        context.metadata["sql_row_count"] = len(rows)
-        context.metadata["sql_source_url_dialect"] = create_engine(self.source_url).dialect.name
+        context.metadata["sql_rows"] = rows
+        context.metadata["sql_row_count"] = row_count
+        context.metadata["sql_source_url_dialect"] = engine.dialect.name
         context.metadata["sql_csv_path"] = str(csv_path)
+        context.metadata["sql_export_format"] = self.out_format
         context.metadata["sql_select_safe"] = True
         return context
 
-    def _fetch_rows(self, engine: Engine, query: str, max_rows: int) -> tuple[list[list[Any]], list[str]]:
-        rows, columns = [], []
+    def _stream_to_csv(self, engine: Engine, query: str, max_rows: int) -> tuple[Path, list[list[Any]], int]:
+        """
+        Server-side kursor (stream_results/yield_per): redovi idu u CSV batch po batch,
+        u memoriji se drži samo tekući batch i preview od 50 redova.
+        """
+        path = self._safe_csv_path()
+        preview: List[List[Any]] = []
+        count = 0
+        batch_rows = min(max_rows, settings.SQL_STREAM_BATCH_ROWS) or settings.SQL_STREAM_BATCH_ROWS
+        try:
+            with engine.connect() as conn, open(path, "w", newline="", encoding="utf-8", errors="ignore") as f:
+                res = conn.execution_options(stream_results=True, yield_per=batch_rows).execute(text(query))
+                writer = csv.writer(f)
+                writer.writerow([str(c).strip() for c in res.keys()])
+                for partition in res.partitions(batch_rows):
+                    rows = [self._csv_row(r) for r in partition[:max_rows - count]]
+                    writer.writerows(rows)
+                    if len(preview) < 50:
+                        preview.extend(rows[:50 - len(preview)])
+                    count += len(rows)
+                    if count >= max_rows:
+                        break
+        except SQLAlchemyError as e:
+            raise Exception(f"SQLSelectToCSVAgent: DB error: {e}") from e
+        return path, preview, count
+
+    def _stream_to_parquet(self, engine: Engine, query: str, max_rows: int) -> tuple[Path, list[list[Any]], int]:
+        """
+        Tipizovan Parquet export: svaki batch kursora postaje Arrow tabela, a batch-evi
+        se spajaju u row group-e od SQL_EXPORT_ROW_GROUP_ROWS redova. Datumi, brojevi
+        i NULL ostaju tipizovani; u memoriji je najviše jedan row group (kolonarno).
+
+        Tipovi se zaključuju iz prvog batch-a. Ako kasniji batch ne stane u tip
+        kolone (npr. decimale u cjelobrojnoj koloni), kolona se proširuje
+        (int -> float64 -> string, date -> timestamp, uži -> širi decimal), a već upisani row group-i se prepisuju u
+        novu šemu jedan po jedan.
+        """
+        path = self._safe_csv_path()
+        preview: List[List[Any]] = []
+        count = 0
+        batch_rows = min(max_rows, settings.SQL_STREAM_BATCH_ROWS) or settings.SQL_STREAM_BATCH_ROWS
+        group_rows = settings.SQL_EXPORT_ROW_GROUP_ROWS
+        writer = None
+        schema = None
+        pending: List[Any] = []
+        pending_rows = 0
+
+        def flush():
+            nonlocal pending, pending_rows
+            if pending:
+                writer.write_table(pa.concat_tables(pending), row_group_size=group_rows)
+                pending, pending_rows = [], 0
+
+        def widen(new_schema):
+            nonlocal writer, schema, pending
+            writer.close()
+            old = path.with_name(f"{path.stem}.widen{path.suffix}")
+            path.replace(old)
+            writer = pq.ParquetWriter(path, new_schema, compression=settings.SQL_EXPORT_COMPRESSION)
+            try:
+                with pq.ParquetFile(old) as written:
+                    for g in range(written.num_row_groups):
+                        writer.write_table(written.read_row_group(g).cast(new_schema), row_group_size=group_rows)
+            finally:
+                old.unlink(missing_ok=True)
+            pending = [t.cast(new_schema) for t in pending]
+            schema = new_schema
+
         try:
             with engine.connect() as conn:
-                res = conn.execute(text(query))
-                columns = list(res.keys())
-                for i, r in enumerate(res):
-                    if i >= max_rows: break
-                    row = []
-                    for v in r:
-                        if hasattr(v, "isoformat"):
-                            row.append(v.isoformat())
-                        else:
-                            row.append(v)
-                    rows.append(row)
+                res = conn.execution_options(stream_results=True, yield_per=batch_rows).execute(text(query))
+                names = unique_columns(list(res.keys()))
+                for partition in res.partitions(batch_rows):
+                    rows = partition[:max_rows - count]
+                    cols = list(zip(*rows)) if rows else [[] for _ in names]
+                    if schema is None:
+                        arrays = [_arrow_column(list(c)) for c in cols]
+                        schema = pa.schema([pa.field(n, a.type) for n, a in zip(names, arrays)])
+                        writer = pq.ParquetWriter(path, schema, compression=settings.SQL_EXPORT_COMPRESSION)
+                    else:
+                        arrays, fields = [], list(schema)
+                        for idx, (c, f) in enumerate(zip(cols, schema)):
+                            arr = _fit_column(list(c), f.type)
+                            if arr.type != f.type:
+                                fields[idx] = pa.field(f.name, arr.type)
+                            arrays.append(arr)
+                        if fields != list(schema):
+                            widen(pa.schema(fields))
+                    pending.append(pa.Table.from_arrays(arrays, schema=schema))
+                    pending_rows += len(rows)
+                    if pending_rows >= group_rows:
+                        flush()
+                    if len(preview) < 50:
+                        preview.extend(self._csv_row(r) for r in rows[:50 - len(preview)])
+                    count += len(rows)
+                    if count >= max_rows:
+                        break
+                if writer is None:
+                    schema = pa.schema([pa.field(n, pa.string()) for n in names])
+                    writer = pq.ParquetWriter(path, schema, compression=settings.SQL_EXPORT_COMPRESSION)
+                flush()
         except SQLAlchemyError as e:
             raise Exception(f"SQLSelectToCSVAgent: DB error: {e}") from e
-        return rows, columns
+        finally:
+            if writer is not None:
+                writer.close()
+        return path, preview, count
+
+    @staticmethod
+    def _csv_row(r) -> List[Any]:
+        return ["" if v is None else v.isoformat() if hasattr(v, "isoformat") else v for v in r]
 
     def _safe_csv_path(self) -> Path:
         from datetime import datetime
         ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        base = self.out_name.replace(".csv", f"_{ts}.csv")
+        out = Path(self.out_name)
+        base = f"{out.stem}_{ts}{out.suffix}"
         return (self.out_dir / base).resolve()
 
-    def _write_csv(self, rows: List[List[Any]], columns: List[str]) -> Path:
-        df = pd.DataFrame(rows, columns=columns)
-        df.columns = [str(c).strip() for c in df.columns]
-        df = df.replace({pd.NA: "", None: ""})
-        path = self._safe_csv_path()
-        try:
-            df.to_csv(path, index=False)
-        except Exception:
-            df.to_csv(path, index=False, encoding="utf-8", errors="ignore")
-        return path
-
     def _is_safe_query(self, q: str) -> bool:
-        U = q.strip().upper()
-        bad = ['DROP','DELETE','UPDATE','INSERT','CREATE','ALTER','TRUNCATE','EXEC','EXECUTE','MERGE']
-        if any(re.search(rf'\b{kw}\b', U) for kw in bad):
-            return False
-        return U.startswith("SELECT") or U.startswith("WITH")
+        return is_safe_query(q)
@@ -0,0 +1,373 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.agents.base import BaseAgent
+from app.agents.embedding import EmbeddingAgent
+from app.agents.entity_index import EntityIndexAgent
+from app.agents.indexing import IndexingAgent
+from app.agents.sql_select import is_safe_query
+from app.agents.types import ProcessingContext
+from app.core.config import settings
+from app.services.engine_registry import engine_registry
+
+
+def render_value(value: Any) -> str:
+    """Vrijednost ćelije kao tekst (datumi ISO, decimale bez eksponenta)."""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(bytes(value))} bajta>"
+    return str(value).strip()
+
+
+def render_row(columns: Sequence[str], row: Sequence[Any]) -> str:
+    """Red kao samoopisni tekst "kolona: vrijednost; ..." (prazne vrijednosti se izostavljaju)."""
+    return "; ".join(f"{c}: {v}" for c, v in ((c, render_value(v)) for c, v in zip(columns, row)) if v)
+
+
+def pack_rows(lines: List[str], first_row: int, max_chars: int) -> Iterator[str]:
+    """Pakuj redove u chunk-ove do max_chars; red se nikad ne dijeli između chunk-ova."""
+    buf: List[str] = []
+    size, start = 0, first_row
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        if buf and size + len(line) + 1 > max_chars:
+            yield f"[SQL redovi {start + 1}-{first_row + i}]\n" + "\n".join(buf)
+            buf, size, start = [], 0, first_row + i
+        buf.append(line)
+        size += len(line) + 1
+    if buf:
+        yield f"[SQL redovi {start + 1}-{first_row + len(lines)}]\n" + "\n".join(buf)
+
+
+def range_bounds(lo: Any, hi: Any, n: int) -> List[Any]:
+    """
+    Granice n key-range particija između lo i hi (uključivo).
+
+    Args:
+        lo: MIN ključa
+        hi: MAX ključa
+        n: željeni broj particija
+
+    Returns:
+        Rastuća lista granica (n+1 ili manje ako je opseg uzak)
+    """
+    if isinstance(lo, bool) or isinstance(hi, bool):
+        raise ValueError("Range particionisanje ne podržava boolean ključ.")
+    if isinstance(lo, int) and isinstance(hi, int):
+        bounds = [lo + (hi - lo) * i // n for i in range(n + 1)]
+    elif isinstance(lo, (int, float, Decimal)) and isinstance(hi, (int, float, Decimal)):
+        lo, hi = float(lo), float(hi)
+        bounds = [lo + (hi - lo) * i / n for i in range(n + 1)]
+    elif isinstance(lo, (datetime, date)) and type(lo) is type(hi):
+        bounds = [lo + (hi - lo) * i / n for i in range(n + 1)]
+    else:
+        raise ValueError(f"Range particionisanje nije podržano za tip {type(lo).__name__}; koristi hash.")
+    bounds[-1] = hi
+    return [b for i, b in enumerate(bounds) if i == 0 or b != bounds[i - 1]]
+
+
+def _is_integer(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    return isinstance(value, Decimal) and value == value.to_integral_value()
+
+
+_DONE = object()
+
+
+class SQLStreamIngestAgent(BaseAgent):
+    """
+    Streaming ingest SELECT upita: server-side kursor (stream_results/yield_per),
+    svaki batch redova se renderuje u tekst, chunk-uje, embeduje i indeksira
+    odmah, pa memorija ne raste sa veličinom izvora.
+    Postavlja:
+      context.metadata['sql_rows_fetched'], ['indexed_chunks'], ['sql_batches'], ['sql_rows_per_sec']
+
+    Sa partition_column upit se dijeli na N key-range particija (MIN/MAX se
+    otkrivaju upitom) ili hash particija (MOD nad cjelobrojnim ključem) plus
+    particiju za NULL ključeve. Particije se čitaju paralelno preko pool-a
+    izvora, a batch-evi idu u isti embed/index tok. Particija koja padne
+    nastavlja iza zadnjeg ključa čiji su svi redovi poslani (ORDER BY ključ),
+    do SQL_STREAM_PARTITION_RETRIES pokušaja; ključ zato ne mora biti
+    jedinstven. NULL particija nema poredak pa se nastavlja samo ako još
+    ništa nije poslala.
+    """
+
+    def __init__(self,
+                 db: Session,
+                 source_url: Optional[str] = None,
+                 query: Optional[str] = None,
+                 batch_rows: Optional[int] = None,
+                 chunk_chars: Optional[int] = None,
+                 max_rows: Optional[int] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 source_key: Optional[str] = None,
+                 max_connections: Optional[int] = None,
+                 partition_column: Optional[str] = None,
+                 partitions: int = 1,
+                 partition_mode: str = "range"):
+        super().__init__("SQLStreamIngestAgent")
+        self.db = db
+        self.source_url = source_url or getattr(settings, "SOURCE_DB_URL", None) or settings.EXTERNAL_DB_URL
+        if not self.source_url:
+            raise ValueError("SQLStreamIngestAgent: connection_string/EXTERNAL_DB_URL nije podešen.")
+        self.query = query or settings.SQL_INGEST_QUERY
+        if not self.query:
+            raise ValueError("SQLStreamIngestAgent: SQL upit nije zadan.")
+        self.batch_rows = batch_rows or settings.SQL_STREAM_BATCH_ROWS
+        self.chunk_chars = chunk_chars or settings.SQL_STREAM_CHUNK_CHARS
+        self.max_rows = max_rows if max_rows is not None else settings.SQL_STREAM_MAX_ROWS
+        self.on_progress = on_progress
+        self.source_key = source_key
+        self.max_connections = max_connections
+        self.partition_column = partition_column
+        self.partitions = max(1, partitions)
+        if partition_mode not in ("range", "hash"):
+            raise ValueError("SQLStreamIngestAgent: partition_mode mora biti 'range' ili 'hash'.")
+        self.partition_mode = partition_mode
+        self.partition_retries = settings.SQL_STREAM_PARTITION_RETRIES
+        self.partition_progress: List[Dict[str, Any]] = []
+        self.embedding_agent = EmbeddingAgent()
+        self.indexing_agent = IndexingAgent(db)
+        self.entity_index_agent = EntityIndexAgent(db)
+
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        if not is_safe_query(self.query):
+            raise ValueError("SQLStreamIngestAgent: dozvoljen je samo SELECT/CTE.")
+
+        rows = chunks = batches = 0
+        columns: List[str] = []
+        started = time.perf_counter()
+        engine = engine_registry.get_engine(self.source_url, key=self.source_key, max_connections=self.max_connections)
+        if self.partition_column and self.partitions > 1:
+            source = self._partitioned_batches(engine)
+        else:
+            source = self._single_batches(engine)
+        try:
+            for columns, partition in source:
+                if self.max_rows and rows >= self.max_rows:
+                    break
+                if self.max_rows:
+                    partition = partition[:self.max_rows - rows]
+                lines = [render_row(columns, r) for r in partition]
+                batch_chunks = list(pack_rows(lines, rows, self.chunk_chars))
+                if batch_chunks:
+                    await self._index_batch(context.document_id, batch_chunks, chunks)
+                rows += len(partition)
+                chunks += len(batch_chunks)
+                batches += 1
+                self._report(rows, chunks, batches, started, "running")
+        except SQLAlchemyError as e:
+            raise Exception(f"SQLStreamIngestAgent: DB error: {e}") from e
+        finally:
+            source.close()
+
+        stats = self._report(rows, chunks, batches, started, "completed")
+        context.metadata["sql_columns"] = columns
+        context.metadata["sql_rows_fetched"] = rows
+        context.metadata["indexed_chunks"] = chunks
+        context.metadata["sql_batches"] = batches
+        context.metadata["sql_rows_per_sec"] = stats["rows_per_sec"]
+        context.metadata["sql_source_dialect"] = engine.dialect.name
+        return context
+
+    def _single_batches(self, engine: Engine) -> Iterator[Tuple[List[str], Sequence[Any]]]:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=self.batch_rows).execute(text(self.query))
+            columns = [str(c) for c in result.keys()]
+            for partition in result.partitions(self.batch_rows):
+                yield columns, partition
+
+    def _plan_partitions(self, engine: Engine) -> List[Tuple[str, Dict[str, Any]]]:
+        """WHERE uslovi (nad aliasom part_src) i parametri za svaku particiju."""
+        col = f"part_src.{engine.dialect.identifier_preparer.quote(self.partition_column)}"
+        base = self.query.strip().rstrip(";")
+        n = self.partitions
+        if self.partition_mode == "hash":
+            with engine.connect() as conn:
+                sample = conn.execute(text(f"SELECT MIN({col}) FROM ({base}) part_src")).scalar()
+            if sample is not None and not _is_integer(sample):
+                raise ValueError(
+                    f"Hash particionisanje traži cjelobrojni ključ, '{self.partition_column}' je "
+                    f"{type(sample).__name__}; koristi range."
+                )
+            # MSSQL i SQLite (bez math ekstenzije) nemaju MOD(), Oracle nema %
+            if engine.dialect.name in ("mssql", "sqlite"):
+                plan = [(f"ABS({col}) % {n} = {i}", {}) for i in range(n)]
+            else:
+                plan = [(f"MOD(ABS({col}), {n}) = {i}", {}) for i in range(n)]
+        else:
+            with engine.connect() as conn:
+                lo, hi = conn.execute(text(f"SELECT MIN({col}), MAX({col}) FROM ({base}) part_src")).one()
+            if lo is None:
+                plan = []
+            else:
+                bounds = range_bounds(lo, hi, n)
+                if len(bounds) == 1:
+                    bounds = [lo, hi]
+                last = len(bounds) - 2
+                plan = [
+                    (f"{col} >= :lo AND {col} {'<=' if i == last else '<'} :hi", {"lo": bounds[i], "hi": bounds[i + 1]})
+                    for i in range(len(bounds) - 1)
+                ]
+        plan.append((f"{col} IS NULL", {}))
+        return plan
+
+    def _partitioned_batches(self, engine: Engine) -> Iterator[Tuple[List[str], Sequence[Any]]]:
+        """
+        Paralelno čitanje particija: svaka nit drži jednu konekciju iz pool-a
+        i puni ograničen red, a potrošač (embed/index) uzima batch po batch.
+        """
+        plan = self._plan_partitions(engine)
+        pool_size = engine.pool.size() if hasattr(engine.pool, "size") else len(plan)
+        workers = max(1, min(len(plan), pool_size))
+        out: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+        stop = threading.Event()
+        self.partition_progress = [{"partition": i, "state": "pending", "rows": 0, "retries": 0} for i in range(len(plan))]
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def worker(i: int) -> None:
+            try:
+                self._fetch_partition(engine, i, *plan[i], put, stop)
+            except Exception as e:
+                self.partition_progress[i]["state"] = "failed"
+                put(e)
+            finally:
+                put(_DONE)
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sql-partition")
+        try:
+            for i in range(len(plan)):
+                executor.submit(worker, i)
+            done = 0
+            while done < len(plan):
+                item = out.get()
+                if item is _DONE:
+                    done += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _fetch_partition(self, engine: Engine, i: int, where: str, params: Dict[str, Any],
+                         put: Callable[[Any], bool], stop: threading.Event) -> None:
+        """
+        Jedna particija sa retry-jem.
+
+        Redovi zadnjeg ključa u batch-u se zadržavaju dok ključ ne promijeni
+        vrijednost, pa je svaki poslani ključ poslan sa svim svojim redovima.
+        Nastavak zato ide od "ključ > zadnji poslani" i ne zavisi od poretka
+        redova sa istim ključem (ključ ne mora biti jedinstven).
+        """
+        col = f"part_src.{engine.dialect.identifier_preparer.quote(self.partition_column)}"
+        base = self.query.strip().rstrip(";")
+        progress = self.partition_progress[i]
+        last_key = None
+        attempt = 0
+        while True:
+            try:
+                progress["state"] = "running"
+                sql_where, sql_params = where, dict(params)
+                if progress["rows"]:
+                    if last_key is None:
+                        raise ValueError(
+                            f"SQLStreamIngestAgent: particija {i} (NULL ključevi) se ne može nastaviti nakon greške."
+                        )
+                    sql_where += f" AND {col} > :resume_key"
+                    sql_params["resume_key"] = last_key
+                pending: List[Any] = []
+                with engine.connect() as conn:
+                    result = conn.execution_options(stream_results=True, yield_per=self.batch_rows).execute(
+                        text(f"SELECT * FROM ({base}) part_src WHERE {sql_where} ORDER BY {col}"), sql_params
+                    )
+                    columns = [str(c) for c in result.keys()]
+                    key_idx = self._key_index(columns)
+                    for batch in result.partitions(self.batch_rows):
+                        if stop.is_set():
+                            return
+                        rows = pending + list(batch)
+                        tail = rows[-1][key_idx]
+                        cut = len(rows)
+                        if tail is not None:
+                            while cut and rows[cut - 1][key_idx] == tail:
+                                cut -= 1
+                        rows, pending = rows[:cut], rows[cut:]
+                        if not rows:
+                            continue
+                        if not put((columns, rows)):
+                            return
+                        last_key = rows[-1][key_idx]
+                        progress["rows"] += len(rows)
+                    if pending:
+                        if not put((columns, pending)):
+                            return
+                        last_key = pending[-1][key_idx]
+                        progress["rows"] += len(pending)
+                progress["state"] = "done"
+                return
+            except SQLAlchemyError:
+                attempt += 1
+                progress["retries"] = attempt
+                if attempt > self.partition_retries or stop.is_set():
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+
+    def _key_index(self, columns: List[str]) -> int:
+        lowered = [c.lower() for c in columns]
+        if self.partition_column.lower() not in lowered:
+            raise ValueError(f"SQLStreamIngestAgent: kolona '{self.partition_column}' nije u rezultatu upita.")
+        return lowered.index(self.partition_column.lower())
+
+    async def _index_batch(self, document_id: str, batch_chunks: List[str], offset: int) -> None:
+        """Embed + upis jednog batch-a; ništa od batch-a ne ostaje u memoriji poslije."""
+        sub = ProcessingContext(document_id=document_id, file_path="", filename="")
+        sub.chunks = batch_chunks
+        sub.metadata["chunk_index_offset"] = offset
+        sub = await self.embedding_agent.process(sub)
+        sub = await self.indexing_agent.process(sub)
+        await self.entity_index_agent.process(sub)
+
+    def _report(self, rows: int, chunks: int, batches: int, started: float, state: str) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        stats = {
+            "state": state,
+            "rows": rows,
+            "chunks": chunks,
+            "batches": batches,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        if self.partition_progress:
+            stats["partitions"] = [dict(p) for p in self.partition_progress]
+        if self.on_progress:
+            self.on_progress(stats)
+        return stats
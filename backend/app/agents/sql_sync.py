@@ -0,0 +1,256 @@
+import hashlib
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.agents.base import BaseAgent
+from app.agents.embedding import EmbeddingAgent
+from app.agents.entity_index import EntityIndexAgent
+from app.agents.indexing import IndexingAgent
+from app.agents.sql_select import is_safe_query
+from app.agents.sql_stream_ingest import render_row
+from app.agents.types import ProcessingContext
+from app.core.config import settings
+from app.models.chunk import DocumentChunk
+from app.models.entity import DocumentEntity
+from app.services.engine_registry import engine_registry
+
+
+def row_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def watermark_value(value: Any) -> Any:
+    """Watermark u JSON-serijalizabilnom obliku (brojevi ostaju brojevi, datumi ISO)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def _later(a: Any, b: Any) -> Any:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    try:
+        return b if b > a else a
+    except TypeError:
+        return b
+
+
+class SQLSyncAgent(BaseAgent):
+    """
+    Inkrementalni sync ExternalSource-a u dokument: svaki red je jedan chunk
+    sa row_key/row_hash u metadata, pa se embeduju samo novi i izmijenjeni redovi.
+
+    Konfiguracija (source.source_metadata['sync']):
+      key_column: kolona jedinstvenog ključa reda (obavezno)
+      watermark_column: updated_at ili monotoni id; bez nje svaki sync čita cijeli upit
+      watermark: zadnja viđena vrijednost (postavlja sync)
+      track_deletes: nakon delte uporedi sve ključeve izvora i obriši nestale redove
+    Postavlja:
+      context.metadata['sync_stats'], ['sync_watermark']
+    """
+
+    def __init__(self,
+                 db: Session,
+                 source_url: str,
+                 query: str,
+                 sync_config: Dict[str, Any],
+                 batch_rows: Optional[int] = None,
+                 max_connections: Optional[int] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        super().__init__("SQLSyncAgent")
+        self.db = db
+        self.source_url = source_url
+        self.query = query
+        self.key_column = sync_config.get("key_column")
+        if not self.key_column:
+            raise ValueError("SQLSyncAgent: key_column nije podešen.")
+        self.watermark_column = sync_config.get("watermark_column")
+        self.watermark = sync_config.get("watermark")
+        self.track_deletes = bool(sync_config.get("track_deletes", False))
+        self.batch_rows = batch_rows or settings.SQL_STREAM_BATCH_ROWS
+        self.max_connections = max_connections
+        self.on_progress = on_progress
+        self.embedding_agent = EmbeddingAgent()
+        self.indexing_agent = IndexingAgent(db)
+        self.entity_index_agent = EntityIndexAgent(db)
+
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        if not is_safe_query(self.query):
+            raise ValueError("SQLSyncAgent: dozvoljen je samo SELECT/CTE.")
+
+        document_id = uuid.UUID(context.document_id)
+        stats = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        started = time.perf_counter()
+        next_index = self.db.execute(
+            text("SELECT COALESCE(MAX(chunk_index) + 1, 0) FROM document_chunks WHERE document_id = :d"),
+            {"d": document_id}
+        ).scalar()
+        max_watermark = None
+
+        engine = engine_registry.get_engine(self.source_url, max_connections=self.max_connections)
+        try:
+            with engine.connect() as conn:
+                sql, params = self._delta_query(engine)
+                result = conn.execution_options(stream_results=True, yield_per=self.batch_rows).execute(text(sql), params)
+                columns = [str(c) for c in result.keys()]
+                key_idx = self._column_index(columns, self.key_column)
+                wm_idx = self._column_index(columns, self.watermark_column) if self.watermark_column else None
+                for partition in result.partitions(self.batch_rows):
+                    rows = {}
+                    for r in partition:
+                        if r[key_idx] is None:
+                            continue
+                        # Isti ključ više puta u batch-u: vrijedi zadnji red
+                        rows[str(r[key_idx])] = render_row(columns, r)
+                        if wm_idx is not None:
+                            max_watermark = _later(max_watermark, r[wm_idx])
+                    next_index = await self._apply_batch(context.document_id, document_id, rows, next_index, stats)
+                    stats["rows"] += len(partition)
+                    self._report(stats, started, "running")
+
+                if self.track_deletes:
+                    stats["deleted"] = self._delete_missing(conn, engine, document_id)
+        except SQLAlchemyError as e:
+            raise Exception(f"SQLSyncAgent: DB error: {e}") from e
+
+        self._report(stats, started, "completed")
+        context.metadata["sync_stats"] = stats
+        context.metadata["sync_watermark"] = watermark_value(max_watermark) if max_watermark is not None else self.watermark
+        context.metadata["sql_rows_fetched"] = stats["rows"]
+        context.metadata["indexed_chunks"] = stats["inserted"] + stats["updated"]
+        return context
+
+    def _delta_query(self, engine) -> tuple[str, Dict[str, Any]]:
+        """
+        Delta nad korisnikovim upitom. Koristi se >= (ne >) da redovi sa istim
+        timestamp-om upisani nakon prošlog synca ne promaknu; ponovljeni redovi
+        se preskaču po hash-u.
+        """
+        base = self.query.strip().rstrip(";")
+        if not self.watermark_column or self.watermark is None:
+            return base, {}
+        col = engine.dialect.identifier_preparer.quote(self.watermark_column)
+        return f"SELECT * FROM ({base}) sync_src WHERE sync_src.{col} >= :watermark", {"watermark": self.watermark}
+
+    @staticmethod
+    def _column_index(columns: List[str], name: str) -> int:
+        lowered = [c.lower() for c in columns]
+        if name in columns:
+            return columns.index(name)
+        if name.lower() in lowered:
+            return lowered.index(name.lower())
+        raise ValueError(f"SQLSyncAgent: kolona '{name}' nije u rezultatu upita.")
+
+    async def _apply_batch(self, doc_id: str, document_id: uuid.UUID, rows: Dict[str, str], next_index: int, stats: Dict[str, int]) -> int:
+        """Upsert jednog batch-a: novi redovi se indeksiraju, izmijenjeni ažuriraju na mjestu."""
+        if not rows:
+            return next_index
+        existing = {
+            key: (chunk_id, digest)
+            for chunk_id, key, digest in self.db.execute(
+                text("""
+                    SELECT id, metadata->>'row_key', metadata->>'row_hash'
+                    FROM document_chunks
+                    WHERE document_id = :d AND metadata->>'row_key' = ANY(:keys)
+                """),
+                {"d": document_id, "keys": list(rows.keys())}
+            )
+        }
+
+        new_keys, changed_keys = [], []
+        for key, content in rows.items():
+            if key not in existing:
+                new_keys.append(key)
+            elif existing[key][1] != row_hash(content):
+                changed_keys.append(key)
+        stats["unchanged"] += len(rows) - len(new_keys) - len(changed_keys)
+        if not new_keys and not changed_keys:
+            return next_index
+
+        keys = new_keys + changed_keys
+        sub = ProcessingContext(document_id=doc_id, file_path="", filename="")
+        sub.chunks = [rows[k] for k in keys]
+        sub = await self.embedding_agent.process(sub)
+        embeddings = sub.metadata["embeddings"]
+        metadata = [{"row_key": k, "row_hash": row_hash(rows[k])} for k in keys]
+
+        chunk_ids: List[str] = []
+        if new_keys:
+            insert = ProcessingContext(document_id=doc_id, file_path="", filename="")
+            insert.chunks = sub.chunks[:len(new_keys)]
+            insert.metadata["embeddings"] = embeddings[:len(new_keys)]
+            insert.metadata["chunk_metadata"] = metadata[:len(new_keys)]
+            insert.metadata["chunk_index_offset"] = next_index
+            insert = await self.indexing_agent.process(insert)
+            chunk_ids.extend(insert.metadata["chunk_ids"])
+            next_index += len(new_keys)
+
+        if changed_keys:
+            offset = len(new_keys)
+            updates = [
+                {
+                    "id": existing[k][0],
+                    "content": sub.chunks[offset + i],
+                    "embedding": embeddings[offset + i],
+                    "chunk_metadata": metadata[offset + i],
+                }
+                for i, k in enumerate(changed_keys)
+            ]
+            updated_ids = [u["id"] for u in updates]
+            self.db.query(DocumentEntity).filter(DocumentEntity.chunk_id.in_(updated_ids)).delete(synchronize_session=False)
+            self.db.bulk_update_mappings(DocumentChunk, updates)
+            self.db.commit()
+            chunk_ids.extend(str(i) for i in updated_ids)
+
+        sub.metadata["chunk_ids"] = chunk_ids
+        await self.entity_index_agent.process(sub)
+        stats["inserted"] += len(new_keys)
+        stats["updated"] += len(changed_keys)
+        return next_index
+
+    def _delete_missing(self, conn, engine, document_id: uuid.UUID) -> int:
+        """Obriši chunk-ove čiji ključ više ne postoji u izvoru (čitaju se samo ključevi)."""
+        col = engine.dialect.identifier_preparer.quote(self.key_column)
+        base = self.query.strip().rstrip(";")
+        result = conn.execution_options(stream_results=True, yield_per=self.batch_rows).execute(
+            text(f"SELECT sync_src.{col} FROM ({base}) sync_src")
+        )
+        source_keys: Set[str] = set()
+        for partition in result.partitions(self.batch_rows):
+            source_keys.update(str(r[0]) for r in partition if r[0] is not None)
+
+        stale = [
+            chunk_id for chunk_id, key in self.db.execute(
+                text("SELECT id, metadata->>'row_key' FROM document_chunks WHERE document_id = :d AND metadata ? 'row_key'"),
+                {"d": document_id}
+            )
+            if key not in source_keys
+        ]
+        for i in range(0, len(stale), 1000):
+            self.db.query(DocumentChunk).filter(DocumentChunk.id.in_(stale[i:i + 1000])).delete(synchronize_session=False)
+        self.db.commit()
+        return len(stale)
+
+    def _report(self, stats: Dict[str, int], started: float, state: str) -> None:
+        if not self.on_progress:
+            return
+        elapsed = time.perf_counter() - started
+        self.on_progress({
+            "state": state,
+            **stats,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_sec": round(stats["rows"] / elapsed, 1) if elapsed > 0 else 0.0,
+        })
@@ -24,5 +24,5 @@ class SummarizerAgent:
             return ctx
             
         prompt = f"Sažmi sljedeći odgovor u dvije rečenice, jasno i precizno:\n\n{ans}"
-        ctx["summary"] = llm_complete(prompt, n=1)[0]
+        ctx["summary"] = llm_complete(prompt, n=1, caller=self.name)[0]
         return ctx
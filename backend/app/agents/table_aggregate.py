@@ -1,36 +1,89 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union
 from pathlib import Path
+import re
+from sqlalchemy.orm import Session
 import pandas as pd
 import numpy as np
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
+from app.services.table_store import read_table
+from app.services.table_sql import sql_aggregate
+
+# op -> pandas agregacija (cythonizovane groupby implementacije)
+AGG_FUNCS = {"sum": "sum", "avg": "mean", "min": "min", "max": "max", "median": "median", "nunique": "nunique"}
+OP_ALIASES = {"mean": "avg", "distinct": "nunique", "count_distinct": "nunique"}
+PERCENTILE_RE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+
+Metric = Tuple[str, Optional[str], str]  # (op, kolona, labela)
+
+
+def parse_op(op: str) -> Tuple[str, Optional[float]]:
+    """Normalizuj op; percentil 'p95' -> ('quantile', 0.95)."""
+    op = OP_ALIASES.get(op.lower().strip(), op.lower().strip())
+    m = PERCENTILE_RE.match(op)
+    if m:
+        return "quantile", float(m.group(1)) / 100
+    if op == "count" or op in AGG_FUNCS:
+        return op, None
+    raise ValueError(f"Nepodržana operacija: {op}")
+
 
 class TableAggregateAgent(BaseAgent):
     """
-    Agregacije nad CSV/XLSX:
-      op: 'count'|'sum'|'avg'|'min'|'max'
+    Agregacije nad Parquet/CSV/XLSX:
+      op: 'count'|'sum'|'avg'|'min'|'max'|'median'|'nunique'|'p<NN>' (npr. 'p95')
       column: ciljna kolona (nije potrebna za 'count' bez groupby)
-      filter: npr {"distance_km": ("<=", 50)}, {"city":("==","Sarajevo")}
-      groupby: kolona za grupisanje
+      metrics: više (op, column) parova u jednom prolazu, npr. [("count", None), ("sum", "iznos"), ("p95", "iznos")]
+      filter: npr {"distance_km": ("<=", 50)}, {"city":("==","Sarajevo")};
+              "ieq" poredi tekst bez obzira na velika/mala slova i razmake na krajevima
+      groupby: kolona ili lista kolona za grupisanje
       csv_path_key: default koristi context.metadata['matches_csv_path'] ako postoji (poslije pretrage),
                     inače context.metadata['sql_csv_path'] ili context.file_path
+      db: ako je zadan i context.metadata['sql_table'] postoji, agregacija je jedan SQL upit
+          nad tipizovanom Postgres kopijom tabele (bez čitanja fajla)
+    Rezultat (context.metadata['aggregate']):
+      - jedan op: {op: vrijednost} ili [{groupby..., op: vrijednost}] kao i ranije
+      - metrics: {labela: vrijednost} ili [{groupby..., labela: vrijednost}], labela = "<op>_<kolona>"
     """
 
     def __init__(self,
-                 op: str,
+                 op: Optional[str] = None,
                  column: Optional[str] = None,
                  filter: Optional[Dict[str, Any]] = None,
-                 groupby: Optional[str] = None,
-                 csv_path_key_order: tuple = ("matches_csv_path","sql_csv_path")):
+                 groupby: Union[str, List[str], None] = None,
+                 csv_path_key_order: tuple = ("matches_csv_path","sql_csv_path"),
+                 metrics: Optional[List[Tuple[str, Optional[str]]]] = None,
+                 db: Optional[Session] = None):
         super().__init__("TableAggregateAgent")
-        self.op = op.lower().strip()
+        assert op or metrics, "Potreban je op ili metrics."
+        self.op = op.lower().strip() if op else None
         self.column = column
         self.filter = filter or {}
         self.groupby = groupby
+        self.groupbys = [groupby] if isinstance(groupby, str) else list(groupby or [])
         self.csv_path_key_order = csv_path_key_order
-        assert self.op in {"count","sum","avg","min","max"}, "Nepodržana operacija."
+        self.db = db
+        self.single = not metrics
+        if metrics:
+            self.metrics: List[Metric] = [
+                (o.lower().strip(), c, f"{o.lower().strip()}_{c}" if c else o.lower().strip()) for o, c in metrics
+            ]
+        else:
+            # Jedan op: labela ostaje samo op, a count broji redove kao i ranije
+            self.metrics = [(self.op, None if self.op == "count" else column, self.op)]
+        for o, _, _ in self.metrics:
+            parse_op(o)
 
     async def process(self, context: ProcessingContext) -> ProcessingContext:
+        sql_table = context.metadata.get("sql_table")
+        if sql_table and self.db is not None:
+            result = sql_aggregate(self.db, sql_table, self.metrics, self.groupbys, self.filter)
+            if self.single and not self.groupbys and result[self.op] is None:
+                result = {}
+            context.metadata["aggregate"] = result
+            context.metadata.setdefault("aggregate_source", sql_table["name"])
+            return context
+
         p = None
         for k in self.csv_path_key_order:
             p = context.metadata.get(k)
@@ -44,54 +97,102 @@ class TableAggregateAgent(BaseAgent):
         if not path.exists():
             raise FileNotFoundError(f"Ne postoji fajl: {path}")
 
-        if path.suffix.lower()==".csv":
-            df = pd.read_csv(path)
+        # Lijeno učitavanje samo potrebnih kolona (Parquet: projekcija kolona), jednom za sve metrike
+        needed = list(dict.fromkeys(c for c in [*(m[1] for m in self.metrics), *self.groupbys, *self.filter.keys()] if c))
+        df = read_table(path, columns=needed)
+        df = df[self._filter_mask(df)]
+
+        if self.groupbys:
+            result = self._grouped(df)
         else:
-            df = pd.read_excel(path)
-        df.columns = [str(c).strip() for c in df.columns]
+            result = {label: self._scalar(df, op, col) for op, col, label in self.metrics}
+            if self.single and result[self.op] is None:
+                result = {}
+        context.metadata["aggregate"] = result
+        context.metadata.setdefault("aggregate_source", str(path))
+        return context
 
-        # filteri
+    def _filter_mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Svi filteri kao jedna maska - bez kopiranja tabele po filteru."""
+        mask = np.ones(len(df), dtype=bool)
         for col,(op,val) in (self.filter or {}).items():
             if col not in df.columns: continue
             s = df[col]
-            s_num = pd.to_numeric(s, errors="coerce")
-            if op == "==": df = df[s == val]
-            elif op == "!=": df = df[s != val]
-            elif op == "<=": df = df[s_num <= float(val)]
-            elif op == "<":  df = df[s_num <  float(val)]
-            elif op == ">=": df = df[s_num >= float(val)]
-            elif op == ">":  df = df[s_num >  float(val)]
-
-        result = None
-        if self.groupby:
-            if self.groupby not in df.columns:
-                result = []
+            if op in ("==", "!="):
+                m = (s == val) if op == "==" else (s != val)
+            elif op == "ieq":
+                m = s.astype("string").str.strip().str.lower() == str(val).strip().lower()
             else:
-                if self.op=="count":
-                    agg = df.groupby(self.groupby, dropna=False).size().reset_index(name="count")
-                else:
-                    if not self.column or self.column not in df.columns:
-                        result = []
-                    else:
-                        s = pd.to_numeric(df[self.column], errors="coerce")
-                        df2 = df.copy(); df2[self.column]=s
-                        if self.op=="sum": agg = df2.groupby(self.groupby, dropna=False)[self.column].sum().reset_index(name="sum")
-                        elif self.op=="avg": agg = df2.groupby(self.groupby, dropna=False)[self.column].mean().reset_index(name="avg")
-                        elif self.op=="min": agg = df2.groupby(self.groupby, dropna=False)[self.column].min().reset_index(name="min")
-                        elif self.op=="max": agg = df2.groupby(self.groupby, dropna=False)[self.column].max().reset_index(name="max")
-                result = agg.to_dict(orient="records") if result is None else result
-        else:
-            if self.op=="count":
-                result = {"count": int(len(df))}
+                s_num = pd.to_numeric(s, errors="coerce")
+                if op == "<=": m = s_num <= float(val)
+                elif op == "<":  m = s_num <  float(val)
+                elif op == ">=": m = s_num >= float(val)
+                elif op == ">":  m = s_num >  float(val)
+                else: continue
+            mask &= m.fillna(False).to_numpy(dtype=bool)
+        return mask
+
+    @staticmethod
+    def _numeric(df: pd.DataFrame, col: str) -> pd.Series:
+        # float64: nullable Int64/Float64 bi u rezultat unijeli pd.NA
+        return pd.to_numeric(df[col], errors="coerce").astype("float64")
+
+    def _scalar(self, df: pd.DataFrame, op: str, col: Optional[str]) -> Any:
+        kind, q = parse_op(op)
+        if kind == "count":
+            return int(len(df)) if not col else int(df[col].notna().sum()) if col in df.columns else 0
+        if not col or col not in df.columns:
+            return None
+        if kind == "nunique":
+            return int(df[col].nunique())
+        s = self._numeric(df, col)
+        value = s.quantile(q) if kind == "quantile" else getattr(s, AGG_FUNCS[kind])()
+        return float(value) if pd.notna(value) else float("nan")
+
+    def _grouped(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if any(g not in df.columns for g in self.groupbys):
+            return []
+        valid = [(op, col, label) for op, col, label in self.metrics
+                 if (parse_op(op)[0] == "count" and not col) or col in df.columns]
+        if not valid:
+            return []
+
+        # Numeričke kolone se konvertuju jednom, bez kopije cijele tabele
+        work: Dict[str, pd.Series] = {g: df[g] for g in self.groupbys}
+        spec: Dict[str, Tuple[str, str]] = {}
+        quantiles: List[Tuple[str, str, float]] = []
+        for op, col, label in valid:
+            kind, q = parse_op(op)
+            if kind == "count":
+                if col:
+                    spec[label] = (col, "count")
+                    work.setdefault(col, df[col])
+                continue
+            if kind == "nunique":
+                spec[label] = (col, "nunique")
+                work.setdefault(col, df[col])
+                continue
+            num = f"__num__{col}"
+            work.setdefault(num, self._numeric(df, col))
+            if kind == "quantile":
+                quantiles.append((label, num, q))
             else:
-                if not self.column or self.column not in df.columns:
-                    result = {}
-                else:
-                    s = pd.to_numeric(df[self.column], errors="coerce")
-                    if self.op=="sum": result = {"sum": float(np.nansum(s))}
-                    elif self.op=="avg": result = {"avg": float(np.nanmean(s))}
-                    elif self.op=="min": result = {"min": float(np.nanmin(s))}
-                    elif self.op=="max": result = {"max": float(np.nanmax(s))}
-        context.metadata["aggregate"] = result
-        context.metadata.setdefault("aggregate_source", str(path))
-        return context
+                spec[label] = (num, AGG_FUNCS[kind])
+
+        grouped = pd.DataFrame(work).groupby(self.groupbys, dropna=False, sort=True)
+        parts = [grouped.size().rename("__size__")]
+        if spec:
+            parts.append(grouped.agg(**spec))
+        for label, num, q in quantiles:
+            parts.append(grouped[num].quantile(q).rename(label))
+        agg = pd.concat(parts, axis=1)
+
+        for op, col, label in valid:
+            if parse_op(op)[0] == "count" and not col:
+                agg[label] = agg["__size__"]
+        # Metrike nad nepostojećim kolonama ostaju u rezultatu kao None
+        for _, _, label in self.metrics:
+            if label not in agg.columns:
+                agg[label] = None
+        columns = [label for _, _, label in self.metrics]
+        return agg[columns].reset_index().to_dict(orient="records")
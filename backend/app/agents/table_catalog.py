@@ -0,0 +1,45 @@
+from sqlalchemy.orm import Session
+from app.agents.base import BaseAgent
+from app.agents.types import ProcessingContext
+from app.models.table import IngestedTable
+import uuid
+
+
+class TableCatalogAgent(BaseAgent):
+    """
+    Registruje tabele iz kolonarnog store-a (context.tables) u ingested_tables,
+    sa šemom i brojem redova, da ih chat može naći bez čitanja fajlova.
+    """
+    
+    def __init__(self, db: Session):
+        super().__init__("TableCatalogAgent")
+        self.db = db
+    
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        tables = [t for t in context.tables if t.get("table_path")]
+        if not tables:
+            return context
+        
+        document_id = uuid.UUID(context.document_id)
+        table_ids = []
+        for idx, t in enumerate(tables):
+            table_id = uuid.uuid4()
+            table_ids.append(str(table_id))
+            self.db.add(IngestedTable(
+                id=table_id,
+                document_id=document_id,
+                table_index=idx,
+                table_path=t["table_path"],
+                format=t.get("format", "parquet"),
+                page=t.get("page"),
+                sheet=t.get("sheet"),
+                row_count=t.get("rows", 0),
+                column_count=t.get("cols", 0),
+                columns=t.get("schema") or [{"name": c, "dtype": "object"} for c in t.get("columns", [])],
+                numeric_columns=t.get("numeric_columns", []),
+            ))
+        self.db.commit()
+        
+        context.metadata['cataloged_tables'] = len(tables)
+        context.metadata['cataloged_table_ids'] = table_ids
+        return context
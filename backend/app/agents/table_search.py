@@ -1,15 +1,19 @@
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Iterable
-import re
-import pandas as pd
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext
+from sqlalchemy.orm import Session
+from app.services.table_index import get_search_index, combine_masks
+from app.services.table_sql import sql_search, sql_export
 
 class TableSearchAgent(BaseAgent):
     """
-    Pretraga/filtriranje nad CSV/XLSX:
+    Pretraga/filtriranje nad Parquet/CSV/XLSX:
       - equals / contains / numeric filteri po kolonama
       - full-text kroz sve string kolone (case-insensitive)
+    Maske su NumPy nizovi nad keširanim TableSearchIndex-om (services/table_index).
+    Sa db i context.metadata['sql_table'] filteri postaju parametrizovan SQL nad
+    tipizovanom Postgres kopijom tabele (trigram indeks za full-text).
     Rezultat:
       context.metadata['matches_preview'] (list[dict])
       context.metadata['matches_count']   (int)
@@ -26,7 +30,8 @@ class TableSearchAgent(BaseAgent):
                  save_matches_csv: bool = True,
                  out_dir_key: str = "SQL_EXPORT_DIR",
                  case_insensitive: bool = True,
-                 normalize_spaces: bool = True):
+                 normalize_spaces: bool = True,
+                 db: Optional[Session] = None):
         super().__init__("TableSearchAgent")
         self.csv_path_key = csv_path_key
         self.limit = limit
@@ -38,8 +43,13 @@ class TableSearchAgent(BaseAgent):
         self.out_dir_key = out_dir_key
         self.case_insensitive = case_insensitive
         self.normalize_spaces = normalize_spaces
+        self.db = db
 
     async def process(self, context: ProcessingContext) -> ProcessingContext:
+        sql_table = context.metadata.get("sql_table")
+        if sql_table and self.db is not None:
+            return self._process_sql(context, sql_table)
+
         p = context.metadata.get(self.csv_path_key) or context.file_path
         if not p:
             raise ValueError("TableSearchAgent: CSV/XLSX path missing.")
@@ -47,51 +57,16 @@ class TableSearchAgent(BaseAgent):
         if not path.exists():
             raise FileNotFoundError(f"Not found: {path}")
 
-        if path.suffix.lower()==".csv":
-            df = pd.read_csv(path, dtype=str)
-        else:
-            df = pd.read_excel(path, dtype=str)
-
-        df.columns = [str(c).strip() for c in df.columns]
-        df = df.replace({pd.NA: "", None: ""})
-
-        if self.normalize_spaces:
-            df = df.applymap(lambda x: re.sub(r"\s+", " ", x.strip()) if isinstance(x,str) else x)
-
-        df_str = df.applymap(lambda x: x.lower() if isinstance(x,str) else x) if self.case_insensitive else df
-        ft_query = (self.fulltext or "").lower() if self.case_insensitive else (self.fulltext or "")
-        contains = {k: [str(v).lower() for v in vs] for k,vs in (self.contains or {}).items()} if self.case_insensitive else (self.contains or {})
-        equals = {k: str(v).lower() for k,v in (self.equals or {}).items()} if self.case_insensitive else (self.equals or {})
+        # Indeks (normalizovane kolone + token -> redovi) se gradi jednom po tabeli
+        index = get_search_index(path, self.normalize_spaces, self.case_insensitive)
+        masks = [index.equals_mask(col, val) for col, val in self.equals.items()]
+        masks += [index.contains_mask(col, terms) for col, terms in self.contains.items()]
+        masks += [index.numeric_mask(col, op, thr) for col, (op, thr) in self.numeric.items()]
+        if self.fulltext:
+            masks.append(index.fulltext_mask(self.fulltext))
+        mask = combine_masks(masks, index.n_rows)
 
-        mask = pd.Series([True]*len(df_str))
-        for col,val in equals.items():
-            if col in df_str.columns:
-                mask &= (df_str[col] == val)
-        for col,terms in contains.items():
-            if col in df_str.columns and terms:
-                s = df_str[col].fillna("")
-                term_mask = False
-                for t in terms:
-                    term_mask = term_mask | s.str.contains(re.escape(t), na=False)
-                mask &= term_mask
-        for col,(op,thr) in (self.numeric or {}).items():
-            if col in df.columns:
-                s_num = pd.to_numeric(df[col], errors="coerce")
-                t = float(thr)
-                if op=="<=": mask &= (s_num <= t)
-                elif op=="<": mask &= (s_num < t)
-                elif op==">=": mask &= (s_num >= t)
-                elif op==">": mask &= (s_num > t)
-                elif op=="==": mask &= (s_num == t)
-                elif op=="!=": mask &= (s_num != t)
-
-        if ft_query:
-            tokens = [t for t in re.split(r"\s+", ft_query) if t]
-            joined = df_str.apply(lambda r: " ".join([str(v) for v in r.values if isinstance(v,str)]), axis=1)
-            for tok in tokens:
-                mask &= joined.str.contains(re.escape(tok), na=False)
-
-        matches = df[mask].copy()
+        matches = index.display[mask]
         preview = matches.head(self.limit).to_dict(orient="records")
         context.metadata["matches_preview"] = preview
         context.metadata["matches_count"] = int(len(matches))
@@ -104,3 +79,20 @@ class TableSearchAgent(BaseAgent):
             context.metadata["matches_csv_path"] = str(out_path)
 
         return context
+
+    def _process_sql(self, context: ProcessingContext, sql_table: Dict[str, Any]) -> ProcessingContext:
+        count, preview, query = sql_search(
+            self.db, sql_table, fulltext=self.fulltext, contains=self.contains, equals=self.equals,
+            numeric=self.numeric, limit=self.limit, case_insensitive=self.case_insensitive,
+        )
+        context.metadata["matches_preview"] = preview
+        context.metadata["matches_count"] = count
+
+        if self.save_matches_csv:
+            out_dir = Path(context.metadata.get(self.out_dir_key) or "/app/uploads/sql_exports")
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_path = out_dir / "table_search_matches.csv"
+            sql_export(self.db, query, out_path)
+            context.metadata["matches_csv_path"] = str(out_path)
+
+        return context
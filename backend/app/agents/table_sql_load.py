@@ -0,0 +1,40 @@
+from sqlalchemy.orm import Session
+from app.agents.base import BaseAgent
+from app.agents.types import ProcessingContext
+from app.models.table import IngestedTable
+from app.services.table_sql import load_table
+
+
+class TableSqlLoadAgent(BaseAgent):
+    """
+    Učitava katalogizovane tabele u tipizovane Postgres tabele (COPY, batch po batch)
+    da pretraga i agregacije idu kao SQL, bez učitavanja tabele u memoriju API workera.
+    Tabela koja se ne učita ostaje dostupna preko Parquet fajla.
+    """
+
+    def __init__(self, db: Session, enabled: bool = True):
+        super().__init__("TableSqlLoadAgent", enabled=enabled)
+        self.db = db
+
+    async def process(self, context: ProcessingContext) -> ProcessingContext:
+        table_ids = context.metadata.get('cataloged_table_ids', [])
+        if not table_ids:
+            return context
+
+        loaded, errors = 0, []
+        for table in self.db.query(IngestedTable).filter(IngestedTable.id.in_(table_ids)).all():
+            try:
+                sql = load_table(self.db, table.id, table.table_path, table.columns or [])
+                by_name = {c["name"]: c for c in sql["columns"]}
+                table.columns = [{**c, **by_name.get(c["name"], {})} for c in table.columns or []]
+                table.sql_table = sql["name"]
+                self.db.commit()
+                loaded += 1
+            except Exception as e:
+                self.db.rollback()
+                errors.append(f"{table.table_index}: {e}")
+
+        context.metadata['sql_tables'] = loaded
+        if errors:
+            context.metadata['sql_table_errors'] = errors
+        return context
@@ -26,7 +26,7 @@ class TaggingAgent:
             txt = ch.get("content", "")
             meta = {"summary": ch.get("summary", ""), "keywords": [], "topic_label": ""}
             if txt:
-                out = llm_complete(TAG_PROMPT.format(text=txt[:1200]), n=1)[0]
+                out = llm_complete(TAG_PROMPT.format(text=txt[:1200]), n=1, caller="TaggingAgent")[0]
                 try:
                     j = json.loads(out)
                     if isinstance(j, dict):
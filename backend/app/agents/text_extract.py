@@ -3,6 +3,7 @@ from typing import List
 import pandas as pd
 from app.agents.base import BaseAgent
 from app.agents.types import ProcessingContext, DocumentType
+from app.services.table_store import describe_table, write_table
 
 # Optional; agent radi i bez ovih
 try:
@@ -26,6 +27,18 @@ except Exception:
     PyPDF2 = None
 
 
+def _column_info(df: pd.DataFrame) -> dict:
+    """Nazivi kolona i kolone koje su (pretežno) numeričke - za katalog tabela."""
+    numeric = []
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        values = df[col].replace("", pd.NA).dropna()
+        if len(values) and pd.to_numeric(values, errors="coerce").notna().mean() >= 0.8:
+            numeric.append(str(col))
+    return {'columns': [str(c) for c in df.columns], 'numeric_columns': numeric}
+
+
 class TextExtractAgent(BaseAgent):
     def __init__(self):
         super().__init__("TextExtractAgent")
@@ -60,7 +73,7 @@ class TextExtractAgent(BaseAgent):
         md_text = ""
         used_md = False
         images: List[str] = []
-        tables_csv: List[str] = []
+        table_paths: List[str] = []
         
         # A) Markdown iz PDF-a (ako postoji)
         if pymupdf4llm is not None:
@@ -76,7 +89,7 @@ class TextExtractAgent(BaseAgent):
                 if p.is_file():
                     images.append(str(p))
         
-        # C) tabele u CSV (pdfplumber)
+        # C) tabele u kolonarni store (pdfplumber)
         if pdfplumber is not None:
             try:
                 with pdfplumber.open(str(file_path)) as pdf:
@@ -91,16 +104,14 @@ class TextExtractAgent(BaseAgent):
                             except Exception:
                                 max_len = max(len(r) for r in data) if data else 0
                                 df = pd.DataFrame(data, columns=[f"col_{i}" for i in range(max_len)])
-                            csv_path = assets_dir / f"table_{pno}_{ti}.csv"
-                            df.to_csv(csv_path, index=False)
-                            tables_csv.append(str(csv_path))
+                            stored = write_table(df, assets_dir / f"table_{pno}_{ti}")
+                            table_paths.append(stored['table_path'])
                             preview_text = df.head(20).to_string(index=False)
                             context.tables.append({
                                 'page': pno,
-                                'csv_path': str(csv_path),
-                                'rows': int(len(df)),
-                                'cols': int(len(df.columns)),
+                                **stored,
                                 'preview': preview_text,
+                                **_column_info(df),
                             })
             except Exception as e:
                 context.metadata.setdefault('warnings', []).append(f"pdfplumber failed: {e}")
@@ -127,7 +138,7 @@ class TextExtractAgent(BaseAgent):
             context.images.append({'path': img})
         context.metadata.setdefault('pdf', {})
         context.metadata['pdf']['assets_dir'] = str(assets_dir)
-        context.metadata['pdf']['tables_csv'] = tables_csv
+        context.metadata['pdf']['table_paths'] = table_paths
         context.metadata['pdf']['used_md'] = used_md
     
     # ---------- DOCX ----------
@@ -145,7 +156,7 @@ class TextExtractAgent(BaseAgent):
             paragraphs = [p.text for p in doc.paragraphs if p.text]
             context.text_content = ("\n".join(paragraphs)).strip()
 
-            tables_csv: List[str] = []
+            table_paths: List[str] = []
             for ti, table in enumerate(doc.tables):
                 rows = []
                 max_cols = 0
@@ -157,19 +168,17 @@ class TextExtractAgent(BaseAgent):
                 headers = norm[0] if (norm and all(v != "" for v in norm[0])) else None
                 data = norm[1:] if headers else norm
                 df = pd.DataFrame(data, columns=headers if headers else None)
-                csv_path = assets_dir / f"docx_table_{ti}.csv"
-                df.to_csv(csv_path, index=False)
-                tables_csv.append(str(csv_path))
+                stored = write_table(df, assets_dir / f"docx_table_{ti}")
+                table_paths.append(stored["table_path"])
                 preview = df.head(20).to_string(index=False)
                 context.tables.append({
                     "page": None,
-                    "csv_path": str(csv_path),
-                    "rows": int(len(df)),
-                    "cols": int(len(df.columns)),
+                    **stored,
                     "preview": preview,
+                    **_column_info(df),
                 })
             context.metadata.setdefault("docx", {})
-            context.metadata["docx"]["tables_csv"] = tables_csv
+            context.metadata["docx"]["table_paths"] = table_paths
             context.metadata["docx"]["assets_dir"] = str(assets_dir)
         except Exception as e:
             raise Exception(f"DOCX extraction error: {str(e)}")
@@ -179,7 +188,8 @@ class TextExtractAgent(BaseAgent):
         """
         Robusna obrada CSV/XLSX:
         - CSV: auto separator (engine='python'), fallback encoding, on_bad_lines='skip'
-        - XLSX: svi sheetovi -> CSV u .../_extract/assets/
+        - Parquet (SQL export): registruje se u katalog takav kakav jeste (tipovi iz footer-a)
+        - CSV/XLSX: svaka tabela/sheet -> tipizovani Parquet u .../_extract/assets/ (table_store)
         - U context.tables ide preview; text_content dobija kratki spojeni preview
         """
         def _df_preview(df: pd.DataFrame, rows: int = 50) -> str:
@@ -192,6 +202,20 @@ class TextExtractAgent(BaseAgent):
         previews: List[str] = []
         suffix = file_path.suffix.lower()
         try:
+            if suffix == ".parquet":
+                # SQL export (SQLSelectToCSVAgent) je već tipizovan Parquet:
+                # registruje se takav kakav jeste, bez prepisivanja i gubitka tipova
+                df = pd.read_parquet(file_path)
+                preview = _df_preview(df, rows=50)
+                previews.append(preview)
+                context.tables.append({
+                    'page': None,
+                    **describe_table(file_path),
+                    'source_path': str(file_path),
+                    'preview': preview,
+                    **_column_info(df),
+                })
+                return df.replace({pd.NA: "", None: ""}).to_string(index=False)
             if suffix == ".csv":
                 try:
                     df = pd.read_csv(file_path, sep=None, engine="python", on_bad_lines="skip")
@@ -203,12 +227,14 @@ class TextExtractAgent(BaseAgent):
                 df = df.replace({pd.NA: "", None: ""})
                 preview = _df_preview(df, rows=50)
                 previews.append(preview)
+                # Tipizovana kolonarna kopija; upiti više ne parsiraju originalni CSV
+                stored = write_table(df, assets_dir / "csv_table")
                 context.tables.append({
                     'page': None,
-                    'csv_path': str(file_path),
-                    'rows': int(len(df)),
-                    'cols': int(len(df.columns)),
+                    **stored,
+                    'source_path': str(file_path),
                     'preview': preview,
+                    **_column_info(df),
                 })
                 return df.to_string(index=False)
             else:
@@ -221,19 +247,15 @@ class TextExtractAgent(BaseAgent):
                     sdf.columns = [str(c).strip() for c in sdf.columns]
                     sdf = sdf.replace({pd.NA: "", None: ""})
                     safe_sheet = "".join(ch if ch.isalnum() or ch in ("-","_") else "_" for ch in sheet_name)[:40]
-                    csv_path = assets_dir / f"xlsx_{safe_sheet}.csv"
-                    try:
-                        sdf.to_csv(csv_path, index=False)
-                    except Exception:
-                        sdf.to_csv(csv_path, index=False, encoding="utf-8", errors="ignore")
+                    stored = write_table(sdf, assets_dir / f"xlsx_{safe_sheet}")
                     preview = _df_preview(sdf, rows=50)
                     previews.append(f"[SHEET: {sheet_name}]\n{preview}")
                     context.tables.append({
                         'page': None,
-                        'csv_path': str(csv_path),
-                        'rows': int(len(sdf)),
-                        'cols': int(len(sdf.columns)),
+                        'sheet': sheet_name,
+                        **stored,
                         'preview': preview,
+                        **_column_info(sdf),
                     })
                 return ("\n\n".join(previews)).strip()
         except Exception as e:
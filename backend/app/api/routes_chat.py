@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.core.db import get_db
+from app.core.db import get_db, SessionLocal
 from app.core.security import get_current_user
 from app.models.user import User
-from app.schemas.chat import ChatRequest, ChatResponse, SearchRequest, SearchResponse, Citation, Verdict
-from app.services.rag_pipeline import RAGPipeline
+from app.schemas.chat import ChatRequest, ChatResponse, SearchRequest, SearchResponse, Citation, Verdict, StageTrace
+from app.services.rag_pipeline import RAGPipeline, chat_flight, embedding_flight
+from app.services.answer_cache import answer_cache
+from app.agents.rewriter import rewrite_cache
+from app.services.table_cache import table_cache
+from app.services.rate_limiter import llm_rate_limiter
 from app.services.search import SearchService
+from app.services.singleflight import SingleFlight, normalize_query
 
 router = APIRouter(tags=["chat"])
+search_flight = SingleFlight("search")
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -20,7 +26,9 @@ async def chat(
         rag = RAGPipeline(db)
         result = await rag.generate_answer(
             query=request.query,
-            top_k=request.top_k
+            top_k=request.top_k,
+            owner_id=str(current_user.id),
+            deadline_ms=request.deadline_ms
         )
         
         citations = [Citation(**c) for c in result["citations"]]
@@ -34,19 +42,47 @@ async def chat(
             citations=citations,
             query=result["query"],
             verdict=verdict,
-            summary=result.get("summary")
+            summary=result.get("summary"),
+            cached=bool(result.get("cache", {}).get("hit")),
+            stages=[StageTrace(**s) for s in result.get("stages", [])],
+            table=result.get("table")
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/chat/cache/stats")
+async def chat_cache_stats(current_user: User = Depends(get_current_user)):
+    """Hit rate i uštedjena latencija semantičkog keša odgovora, keš rewrites i tabela + koalescencija."""
+    return {
+        **answer_cache.stats(),
+        "rewrite_cache": rewrite_cache.stats(),
+        "table_cache": table_cache.stats(),
+        "singleflight": {f.name: f.stats() for f in (chat_flight, embedding_flight, search_flight)},
+    }
+
+
+@router.get("/chat/llm/stats")
+async def llm_rate_limit_stats(current_user: User = Depends(get_current_user)):
+    """Throttled vrijeme, retry-i i 429 po pozivaocu OpenAI-a (ingest agenti i chat)."""
+    return llm_rate_limiter.stats()
+
+
 @router.post("/search", response_model=SearchResponse)
 async def search(
     request: SearchRequest,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    try:
+    async def run_search() -> SearchResponse:
+        # Zajednička pretraga ima svoju sesiju; sesija zahtjeva koji ju je pokrenuo
+        # se zatvara ako se taj klijent odspoji, a ostali čekači i dalje čekaju rezultat
+        shared_db = SessionLocal()
+        try:
+            return await _search(shared_db)
+        finally:
+            shared_db.close()
+    
+    async def _search(db: Session) -> SearchResponse:
         search_service = SearchService(db)
         results = await search_service.hybrid_search(
             query=request.query,
@@ -75,5 +111,10 @@ async def search(
             results=citations,
             total=len(citations)
         )
+    
+    try:
+        # Identične konkurentne pretrage dijele jedan upit nad bazom
+        key = (normalize_query(request.query), request.top_k, str(current_user.id))
+        return await search_flight.do(key, run_search)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List
+from typing import List, Optional
 from pathlib import Path
-import aiofiles
 import uuid
+from datetime import datetime
 from app.core.db import get_db
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
 from app.models.external_source import IngestJob
+from app.models.chunk import DocumentChunk
+from app.models.table import IngestedTable
 from app.schemas.document import DocumentResponse, DocumentListResponse, AgentLog
 from app.services.pipeline import DocumentPipeline
+from app.services.checkpoints import CheckpointStore
+from app.services.answer_cache import answer_cache
+from app.services.table_sql import drop_unreferenced_tables, drop_replaced_tables, drop_catalog_tables
+from app.services.document_dedup import find_duplicate, clone_document, dedup_metadata, release_clones
+from app.agents.types import AgentResult, AgentStatus
+from app.services.upload_store import save_upload, UploadTooLarge
 from app.core.config import settings
 import os
 
@@ -21,9 +29,12 @@ router = APIRouter(prefix="/documents", tags=["documents"])
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
     file: UploadFile = File(...),
+    replace_of: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    previous = _previous_version(db, replace_of, file.filename, current_user)
+    
     if file.size and file.size > settings.UPLOAD_MAX_SIZE:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
@@ -36,14 +47,22 @@ async def upload_document(
     file_ext = Path(file.filename).suffix
     file_path = Path(settings.UPLOAD_DIR) / f"{file_id}{file_ext}"
     
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        content = await file.read()
-        await out_file.write(content)
+    try:
+        file_size, content_hash = await save_upload(file, file_path)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large"
+        )
+    
+    if previous is not None:
+        return await _reingest_version(db, previous, file, file_path, file_size, content_hash, current_user)
     
     document = Document(
         filename=file.filename,
         file_path=str(file_path),
-        file_size=len(content),
+        file_size=file_size,
+        content_hash=content_hash,
         mime_type=file.content_type,
         status="pending",
         created_by=current_user.id
@@ -60,14 +79,30 @@ async def upload_document(
     db.add(job)
     db.commit()
     
+    duplicate = find_duplicate(db, content_hash, current_user.id)
+    if duplicate is not None:
+        return _clone_duplicate(db, duplicate, document, job)
+    
+    return await _process_document(db, document, job, current_user)
+
+
+async def _process_document(
+    db: Session,
+    document: Document,
+    job: IngestJob,
+    user: User,
+    resume: bool = False
+) -> DocumentResponse:
+    """Pokreni pipeline za dokument i upiši status/logove u dokument i job."""
     try:
         pipeline = DocumentPipeline(db)
         
         context = await pipeline.process_document(
             document_id=str(document.id),
-            file_path=str(file_path),
-            filename=file.filename,
-            user_id=current_user.id
+            file_path=document.file_path,
+            filename=document.filename,
+            user_id=user.id,
+            resume=resume
         )
         
         document.status = "ready"
@@ -77,7 +112,8 @@ async def upload_document(
             "chunk_overlap": context.metadata.get("chunk_overlap", 200),
             "indexed_chunks": context.metadata.get("indexed_chunks", 0),
             "mime_type": context.metadata.get("mime_type", ""),
-            "file_size": context.metadata.get("file_size", 0)
+            "file_size": context.metadata.get("file_size", 0),
+            "tables": context.metadata.get("cataloged_tables", 0)
         }
         
         job.status = "completed"
@@ -90,6 +126,8 @@ async def upload_document(
         db.refresh(job)
         
     except Exception as e:
+        # Agent (npr. IndexingAgent) je mogao ostaviti sesiju u neuspjeloj transakciji
+        db.rollback()
         document.status = "error"
         job.status = "failed"
         job.error = str(e)
@@ -100,20 +138,239 @@ async def upload_document(
             detail=f"Document processing failed: {str(e)}"
         )
     
-    agent_logs = [AgentLog(**log) for log in job.logs] if job.logs else []
+    return _document_response(document, job)
+
+
+def _previous_version(db: Session, replace_of: Optional[str], filename: str, user: User) -> Optional[Document]:
+    """Dokument koji upload zamjenjuje: eksplicitni replace_of ili (uz REINGEST_MATCH_FILENAME) isto ime fajla."""
+    owned = db.query(Document).filter(Document.created_by == user.id)
+    if replace_of:
+        try:
+            previous_id = uuid.UUID(replace_of)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid replace_of")
+        previous = owned.filter(Document.id == previous_id).first()
+        if not previous:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document to replace not found")
+    elif settings.REINGEST_MATCH_FILENAME:
+        previous = owned.filter(
+            Document.filename == filename, Document.status == "ready"
+        ).order_by(Document.created_at.desc()).first()
+    else:
+        return None
+    if previous is not None and previous.status == "processing":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Document is already being processed")
+    return previous
+
+
+async def _reingest_version(
+    db: Session,
+    previous: Document,
+    file: UploadFile,
+    file_path: Path,
+    file_size: int,
+    content_hash: str,
+    user: User
+) -> DocumentResponse:
+    """
+    Nova verzija postojećeg dokumenta: chunk-ovi se porede po hash-u sa prethodnom
+    verzijom i embeduje se samo delta. Dokument zadržava id; u slučaju greške
+    prethodna verzija ostaje kakva je bila.
+
+    Primjena diff-a (ChunkDiffApplyAgent), zamjena kataloga tabela i novi
+    metapodaci idu u jednoj transakciji: prije commit-a se sve može vratiti,
+    a poslije njega je nova verzija kompletna.
+    """
+    job = IngestJob(document_id=previous.id, status="processing")
+    db.add(job)
+    if previous.content_hash == content_hash:
+        # Bajt-identična verzija: nema šta da se re-indeksira
+        file_path.unlink(missing_ok=True)
+        job.status = "completed"
+        job.logs = [AgentResult(
+            agent_name="ChunkDiffAgent",
+            status=AgentStatus.SKIPPED,
+            message="Uploaded version is identical to the current one"
+        ).to_dict()]
+        job.completed_at = db.execute(text("SELECT NOW()")).scalar()
+        db.commit()
+        return _document_response(previous, job)
+    
+    previous_status = previous.status
+    previous.status = "processing"
+    # Klonovi dijele sadržaj ove verzije; najstariji dobija vlastitu kopiju prije izmjene
+    release_clones(db, [previous.id], copy=True)
+    db.commit()
     
+    context = None
+    try:
+        pipeline = DocumentPipeline(db)
+        context = await pipeline.process_document(
+            document_id=str(previous.id),
+            file_path=str(file_path),
+            filename=file.filename,
+            user_id=user.id,
+            incremental=True
+        )
+        apply_result = [r for r in context.agent_results if r.agent_name == "ChunkDiffApplyAgent"][-1]
+        if apply_result.status != AgentStatus.COMPLETED:
+            raise Exception(apply_result.error or "Chunk diff was not applied")
+        
+        drop_replaced_tables(db, previous.id, context.metadata.get("cataloged_table_ids", []))
+        old_path = previous.file_path
+        previous.filename = file.filename
+        previous.file_path = str(file_path)
+        previous.file_size = file_size
+        previous.content_hash = content_hash
+        previous.mime_type = file.content_type
+        previous.status = "ready"
+        previous.updated_at = datetime.utcnow()
+        previous.doc_metadata = {
+            "chunks": context.metadata["total_chunks"],
+            "chunk_size": context.metadata.get("chunk_size", 1000),
+            "chunk_overlap": context.metadata.get("chunk_overlap", 200),
+            "indexed_chunks": context.metadata.get("indexed_chunks", 0),
+            "mime_type": context.metadata.get("mime_type", ""),
+            "file_size": context.metadata.get("file_size", 0),
+            "tables": context.metadata.get("cataloged_tables", 0),
+            "reingest": context.metadata["diff_stats"],
+            "version": (previous.doc_metadata or {}).get("version", 1) + 1
+        }
+        job.status = "completed"
+        job.logs = [result.to_dict() for result in context.agent_results]
+        job.error = None
+        job.completed_at = db.execute(text("SELECT NOW()")).scalar()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        # Primjena diff-a je vraćena rollback-om; uklanja se delta i tabele nove verzije
+        new_ids = (context.metadata.get("chunk_ids") if context else None) or []
+        if new_ids:
+            db.query(DocumentChunk).filter(
+                DocumentChunk.id.in_([uuid.UUID(i) for i in new_ids])
+            ).delete(synchronize_session=False)
+        drop_catalog_tables(db, (context.metadata.get("cataloged_table_ids") if context else None) or [])
+        previous.status = previous_status
+        job.status = "failed"
+        job.error = str(e)
+        if context:
+            job.logs = [result.to_dict() for result in context.agent_results]
+        db.commit()
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Document processing failed: {str(e)}"
+        )
+    finally:
+        answer_cache.invalidate_documents([str(previous.id)])
+    
+    db.refresh(previous)
+    if old_path and old_path != str(file_path):
+        Path(old_path).unlink(missing_ok=True)
+    return _document_response(previous, job)
+
+
+def _document_response(document: Document, job: IngestJob) -> DocumentResponse:
     return DocumentResponse(
         id=document.id,
         filename=document.filename,
         status=document.status,
         mime_type=document.mime_type,
         file_size=document.file_size,
+        content_hash=document.content_hash,
         metadata=document.doc_metadata or {},
         created_at=document.created_at,
-        agent_logs=agent_logs
+        agent_logs=[AgentLog(**log) for log in job.logs] if job.logs else []
     )
 
 
+def _clone_duplicate(db: Session, source: Document, document: Document, job: IngestJob) -> DocumentResponse:
+    """Isti sadržaj je već obrađen: dokument dijeli chunk-ove/embeddinge izvora umjesto pokretanja pipeline-a."""
+    try:
+        counts = clone_document(db, source, document)
+        document.status = "ready"
+        document.doc_metadata = dedup_metadata(source, counts)
+        job.status = "completed"
+        job.logs = [AgentResult(
+            agent_name="DocumentDedup",
+            status=AgentStatus.COMPLETED,
+            message=f"Identical content already processed as {source.id}; sharing its {counts['chunks']} chunks",
+            metadata={"source_document_id": str(source.id), **counts}
+        ).to_dict()]
+        job.completed_at = db.execute(text("SELECT NOW()")).scalar()
+        db.commit()
+        db.refresh(document)
+    except Exception as e:
+        db.rollback()
+        document.status = "error"
+        job.status = "failed"
+        job.error = str(e)
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Document processing failed: {str(e)}"
+        )
+    
+    return DocumentResponse(
+        id=document.id,
+        filename=document.filename,
+        status=document.status,
+        mime_type=document.mime_type,
+        file_size=document.file_size,
+        content_hash=document.content_hash,
+        metadata=document.doc_metadata or {},
+        created_at=document.created_at,
+        agent_logs=[AgentLog(**log) for log in job.logs]
+    )
+
+
+@router.post("/{document_id}/retry", response_model=DocumentResponse)
+async def retry_document(
+    document_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ponovi obradu dokumenta koji je pao. Nastavlja se od posljednjeg checkpointa,
+    pa se plaća samo agent koji je pao (i oni poslije njega).
+    """
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.created_by == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    if document.status != "error":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Document is {document.status}; only failed documents can be retried"
+        )
+    if not document.file_path or not Path(document.file_path).exists():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Uploaded file is no longer available"
+        )
+    
+    if not CheckpointStore(str(document.id)).exists():
+        # Obrada ispočetka: ukloni ono što je prethodni pokušaj stigao da upiše
+        drop_unreferenced_tables(db, [document.id])
+        db.query(IngestedTable).filter(IngestedTable.document_id == document.id).delete(synchronize_session=False)
+        db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
+    
+    document.status = "processing"
+    job = IngestJob(document_id=document.id, status="processing")
+    db.add(job)
+    db.commit()
+    
+    response = await _process_document(db, document, job, current_user, resume=True)
+    answer_cache.invalidate_documents([str(document.id)])
+    return response
+
+
 @router.get("", response_model=DocumentListResponse)
 async def list_documents(
     db: Session = Depends(get_db),
@@ -136,6 +393,7 @@ async def list_documents(
             status=doc.status,
             mime_type=doc.mime_type,
             file_size=doc.file_size,
+            content_hash=doc.content_hash,
             metadata=doc.doc_metadata or {},
             created_at=doc.created_at,
             agent_logs=agent_logs
@@ -175,6 +433,7 @@ async def get_document(
         status=document.status,
         mime_type=document.mime_type,
         file_size=document.file_size,
+        content_hash=document.content_hash,
         metadata=document.doc_metadata or {},
         created_at=document.created_at,
         agent_logs=agent_logs
@@ -205,12 +464,19 @@ async def delete_document(
         except Exception as e:
             print(f"Failed to delete file {document.file_path}: {e}")
     
+    # Podatke izvora preuzima dedup klon (ako postoji), pa ih CASCADE ne briše
+    release_clones(db, [document.id])
+    # SQL kopije tabela nisu pod FK pa ih CASCADE ne briše (dijeljene sa dedup klonom ostaju)
+    drop_unreferenced_tables(db, [document.id])
+    CheckpointStore(str(document.id)).clear()
+    
     # CASCADE brisanje će automatski obrisati:
     # - document_chunks (svi chunk-ovi)
     # - document_relations (sve relacije)
     # - ingest_jobs (sve job-ove)
     db.delete(document)
     db.commit()
+    answer_cache.invalidate_documents([document_id])
     
     return {
         "success": True,
@@ -237,6 +503,9 @@ async def delete_all_documents(
     
     deleted_count = 0
     deleted_files = []
+    deleted_ids = [str(document.id) for document in documents]
+    release_clones(db, deleted_ids)
+    drop_unreferenced_tables(db, deleted_ids)
     
     for document in documents:
         # Brisanje fizičkog fajla
@@ -246,11 +515,13 @@ async def delete_all_documents(
             except Exception as e:
                 print(f"Failed to delete file {document.file_path}: {e}")
         
+        CheckpointStore(str(document.id)).clear()
         deleted_files.append(document.filename)
         db.delete(document)
         deleted_count += 1
     
     db.commit()
+    answer_cache.invalidate_documents(deleted_ids)
     
     return {
         "success": True,
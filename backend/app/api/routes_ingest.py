@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import uuid
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.core.db import get_db
+from app.core.config import settings
+from app.core.db import get_db, SessionLocal
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
+from app.models.chunk import DocumentChunk
 from app.models.external_source import ExternalSource, IngestJob
-from app.schemas.ingest import SQLIngestRequest, SQLIngestResponse
-from app.agents.sql_ingest import PgVectorIngestAgent as SQLIngestAgent
-from app.agents.chunking import ChunkingAgent
-from app.agents.embedding import EmbeddingAgent
-from app.agents.indexing import IndexingAgent
-from app.agents.types import ProcessingContext
+from app.schemas.ingest import SQLIngestRequest, SQLIngestResponse, IngestJobStatusResponse
+from app.agents.sql_select import is_safe_query
+from app.agents.sql_stream_ingest import SQLStreamIngestAgent
+from app.agents.types import ProcessingContext, AgentStatus
+from app.services.answer_cache import answer_cache
+from app.services.engine_registry import engine_registry
+from app.services.sql_sync import run_sync
 
 router = APIRouter(prefix="/ingest", tags=["ingestion"])
 
@@ -19,9 +25,31 @@ router = APIRouter(prefix="/ingest", tags=["ingestion"])
 @router.post("/sql", response_model=SQLIngestResponse)
 async def ingest_from_sql(
     request: SQLIngestRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    if not is_safe_query(request.query):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only SELECT/WITH queries are allowed"
+        )
+    if not (request.connection_string or settings.EXTERNAL_DB_URL):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="connection_string or EXTERNAL_DB_URL is required"
+        )
+    if request.partitions > 1 and not request.partition_column:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="partition_column is required when partitions > 1"
+        )
+    if (request.watermark_column or request.sync_interval_minutes or request.track_deletes) and not request.key_column:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="key_column is required for incremental sync"
+        )
+    
     source = ExternalSource(
         name=request.source_name,
         connection_string=request.connection_string,
@@ -48,59 +76,194 @@ async def ingest_from_sql(
     db.add(job)
     db.commit()
     
+    if request.key_column:
+        # Sync izvor: prvi ingest je sync bez watermark-a (svi redovi su novi)
+        source.source_metadata = {
+            "sync": {
+                "document_id": str(document.id),
+                "key_column": request.key_column,
+                "watermark_column": request.watermark_column,
+                "interval_minutes": request.sync_interval_minutes,
+                "track_deletes": request.track_deletes
+            }
+        }
+        db.commit()
+        background_tasks.add_task(run_sync, source.id, job.id)
+        return SQLIngestResponse(
+            document_id=document.id,
+            job_id=job.id,
+            status="processing",
+            message=f"SQL sync started; progress at /ingest/jobs/{job.id}"
+        )
+    
+    background_tasks.add_task(
+        _run_sql_ingest,
+        document_id=document.id,
+        job_id=job.id,
+        source_id=source.id,
+        source_url=request.connection_string or settings.EXTERNAL_DB_URL,
+        query=request.query,
+        partitioning={
+            "partition_column": request.partition_column,
+            "partitions": request.partitions,
+            "partition_mode": request.partition_mode
+        }
+    )
+    
+    return SQLIngestResponse(
+        document_id=document.id,
+        job_id=job.id,
+        status="processing",
+        message=f"SQL ingestion started; progress at /ingest/jobs/{job.id}"
+    )
+
+
+def _run_sql_ingest(document_id: uuid.UUID, job_id: uuid.UUID, source_id: uuid.UUID, source_url: str, query: str,
+                    partitioning: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Pozadinski streaming ingest (threadpool): vlastita sesija, napredak se
+    upisuje u IngestJob.progress nakon svakog batch-a.
+    """
+    db = SessionLocal()
     try:
+        document = db.get(Document, document_id)
+        job = db.get(IngestJob, job_id)
+        source = db.get(ExternalSource, source_id)
+        # Izvori sa istim connection string-om dijele pool; limit konekcija se može zadati po izvoru
+        max_connections = (source.source_metadata or {}).get("max_connections") if source else None
+
+        def on_progress(stats):
+            job.progress = dict(stats)
+            db.commit()
+
         context = ProcessingContext(
-            document_id=str(document.id),
+            document_id=str(document_id),
             file_path="",
-            filename=f"SQL:{request.source_name}"
+            filename=document.filename
         )
-        
-        sql_agent = SQLIngestAgent(
-            connection_string=request.connection_string,
-            query=request.query
+        agent = SQLStreamIngestAgent(
+            db,
+            source_url=source_url,
+            query=query,
+            on_progress=on_progress,
+            max_connections=max_connections,
+            **(partitioning or {})
         )
-        context = await sql_agent.execute(context)
-        
-        chunking_agent = ChunkingAgent()
-        context = await chunking_agent.execute(context)
+        context = asyncio.run(agent.execute(context))
+        result = context.agent_results[-1]
         
-        embedding_agent = EmbeddingAgent()
-        context = await embedding_agent.execute(context)
-        
-        indexing_agent = IndexingAgent(db)
-        context = await indexing_agent.execute(context)
-        
-        document.status = "ready"
-        if not document.doc_metadata:
-            document.doc_metadata = {}
-        document.doc_metadata.update({
-            "chunks": len(context.chunks),
-            "rows_fetched": context.metadata.get("sql_rows_fetched", 0),
-            "indexed_chunks": context.metadata.get('indexed_chunks', 0)
-        })
-        
-        job.status = "completed"
-        job.logs = [result.to_dict() for result in context.agent_results]
+        if result.status == AgentStatus.FAILED:
+            # Djelimično upisani batch-evi se brišu da nepotpun izvor ne ulazi u pretragu
+            db.rollback()
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+            document.status = "error"
+            job.status = "failed"
+            job.error = result.error
+            job.progress = {**(job.progress or {}), "state": "failed"}
+        else:
+            document.status = "ready"
+            document.doc_metadata = {
+                **(document.doc_metadata or {}),
+                "chunks": context.metadata.get("indexed_chunks", 0),
+                "rows_fetched": context.metadata.get("sql_rows_fetched", 0),
+                "indexed_chunks": context.metadata.get("indexed_chunks", 0),
+                "rows_per_sec": context.metadata.get("sql_rows_per_sec", 0.0)
+            }
+            job.status = "completed"
+            job.error = None
+        job.logs = [r.to_dict() for r in context.agent_results]
         job.completed_at = db.execute(text("SELECT NOW()")).scalar()
-        
         db.commit()
-        db.refresh(document)
-        db.refresh(job)
-        
-        return SQLIngestResponse(
-            document_id=document.id,
-            job_id=job.id,
-            status="completed",
-            message=f"Successfully ingested {context.metadata.get('sql_rows_fetched', 0)} rows"
-        )
-        
+        answer_cache.invalidate_documents([str(document_id)])
     except Exception as e:
-        document.status = "error"
-        job.status = "failed"
-        job.error = str(e)
+        db.rollback()
+        db.query(Document).filter(Document.id == document_id).update({"status": "error"})
+        db.query(IngestJob).filter(IngestJob.id == job_id).update({"status": "failed", "error": str(e)})
         db.commit()
-        
+    finally:
+        db.close()
+
+
+@router.post("/sources/{source_id}/sync", response_model=SQLIngestResponse)
+async def sync_source(
+    source_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    source = db.query(ExternalSource).filter(
+        ExternalSource.id == source_id,
+        ExternalSource.created_by == current_user.id
+    ).first()
+    sync = (source.source_metadata or {}).get("sync") if source else None
+    
+    if not sync or not sync.get("document_id"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sync source not found"
+        )
+    
+    job = IngestJob(
+        document_id=uuid.UUID(sync["document_id"]),
+        status="processing"
+    )
+    db.add(job)
+    db.commit()
+    
+    background_tasks.add_task(run_sync, source.id, job.id)
+    
+    return SQLIngestResponse(
+        document_id=job.document_id,
+        job_id=job.id,
+        status="processing",
+        message=f"SQL sync started; progress at /ingest/jobs/{job.id}"
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatusResponse)
+async def get_ingest_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = db.query(IngestJob).join(Document, IngestJob.document_id == Document.id).filter(
+        IngestJob.id == job_id,
+        Document.created_by == current_user.id
+    ).first()
+    
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"SQL ingestion failed: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ingest job not found"
         )
+    
+    return IngestJobStatusResponse(
+        job_id=job.id,
+        document_id=job.document_id,
+        status=job.status,
+        progress=job.progress or {},
+        error=job.error,
+        started_at=job.started_at,
+        completed_at=job.completed_at
+    )
+
+
+@router.get("/engines")
+async def ingest_engine_stats(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stanje dijeljenih pool-ova eksternih SQL izvora (bez lozinki u URL-u).
+
+    Prikazuju se samo pool-ovi izvora koje je korisnik kreirao, da host,
+    baza i korisničko ime tuđih izvora ne budu vidljivi.
+    """
+    engine_registry.evict_idle()
+    rows = db.query(ExternalSource.connection_string).filter(
+        ExternalSource.created_by == current_user.id
+    ).all()
+    urls = {conn or settings.EXTERNAL_DB_URL for (conn,) in rows}
+    urls.discard(None)
+    urls.discard("")
+    return engine_registry.stats(urls=urls)
@@ -23,6 +23,49 @@ class Settings(BaseSettings):
     RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "5"))
     AGENT_REWRITES: int = int(os.getenv("AGENT_REWRITES", "2"))
     JUDGE_STRICTNESS: str = os.getenv("JUDGE_STRICTNESS", "medium")
+    JUDGE_HEURISTIC_ENABLED: bool = os.getenv("JUDGE_HEURISTIC_ENABLED", "true").lower() == "true"
+    REWRITE_MIN_QUERY_WORDS: int = int(os.getenv("REWRITE_MIN_QUERY_WORDS", "3"))
+    REWRITE_CACHE_MAX_ENTRIES: int = int(os.getenv("REWRITE_CACHE_MAX_ENTRIES", "2000"))
+    # LLMDensePrepAgent: chunk-ovi po promptu, paralelni pozivi i keš izlaza
+    DENSE_PREP_BATCH_SIZE: int = int(os.getenv("DENSE_PREP_BATCH_SIZE", "8"))
+    DENSE_PREP_BATCH_CHARS: int = int(os.getenv("DENSE_PREP_BATCH_CHARS", "12000"))
+    DENSE_PREP_CONCURRENCY: int = int(os.getenv("DENSE_PREP_CONCURRENCY", "4"))
+    DENSE_PREP_CACHE_MAX_ENTRIES: int = int(os.getenv("DENSE_PREP_CACHE_MAX_ENTRIES", "20000"))
+
+    # OpenAI rate limit (token bucket po modelu, dijeljen kroz Postgres) i retry/backoff
+    LLM_RATE_LIMIT_BACKEND: str = os.getenv("LLM_RATE_LIMIT_BACKEND", "postgres")  # postgres|local|off
+    LLM_RATE_LIMIT_SHARED_COOLDOWN_SECONDS: float = float(os.getenv("LLM_RATE_LIMIT_SHARED_COOLDOWN_SECONDS", "30"))  # lokalni bucket-i nakon greške Postgresa
+    LLM_RATE_LIMITS: str = os.getenv("LLM_RATE_LIMITS", "gpt-4o-mini=500:200000,text-embedding-3-small=3000:1000000")
+    LLM_DEFAULT_RPM: int = int(os.getenv("LLM_DEFAULT_RPM", "500"))
+    LLM_DEFAULT_TPM: int = int(os.getenv("LLM_DEFAULT_TPM", "200000"))
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "400"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+    # MMR diverzifikacija (opciono)
+    RAG_MMR_ENABLED: bool = os.getenv("RAG_MMR_ENABLED", "false").lower() == "true"
+    RAG_MMR_LAMBDA: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+    RAG_MMR_CANDIDATES: int = int(os.getenv("RAG_MMR_CANDIDATES", "40"))
+
+    # Rano generisanje: ne čekaj rewrites ako originalni upit ima dovoljno dobar hit
+    RAG_EARLY_GENERATION_ENABLED: bool = os.getenv("RAG_EARLY_GENERATION_ENABLED", "false").lower() == "true"
+    RAG_EARLY_GENERATION_SCORE: float = float(os.getenv("RAG_EARLY_GENERATION_SCORE", "0.8"))
+
+    # Semantički keš odgovora
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+    # Keš tabela (TableSearchAgent / TableAggregateAgent)
+    TABLE_CACHE_MAX_MB: int = int(os.getenv("TABLE_CACHE_MAX_MB", "256"))
+
+    # Tipizovane Postgres kopije tabela (COPY pri ingestu, SQL pushdown u chatu)
+    TABLE_SQL_ENABLED: bool = os.getenv("TABLE_SQL_ENABLED", "true").lower() == "true"
+    TABLE_SQL_SCHEMA: str = os.getenv("TABLE_SQL_SCHEMA", "doc_tables")
+    TABLE_SQL_BATCH_ROWS: int = int(os.getenv("TABLE_SQL_BATCH_ROWS", "50000"))
+    TABLE_SQL_INDEXED_COLUMNS: int = int(os.getenv("TABLE_SQL_INDEXED_COLUMNS", "8"))
 
 
     # Ingest/pipeline
@@ -33,10 +76,35 @@ class Settings(BaseSettings):
     EXTERNAL_DB_URL: Optional[str] = os.getenv("EXTERNAL_DB_URL")
     SQL_INGEST_QUERY: Optional[str] = os.getenv("SQL_INGEST_QUERY")
     SQL_INGEST_BATCH_SIZE: int = int(os.getenv("SQL_INGEST_BATCH_SIZE", "500"))
+    # Streaming SQL ingest: redova po fetch-u sa server-side kursora, znakova po chunk-u, 0 = bez limita
+    SQL_STREAM_BATCH_ROWS: int = int(os.getenv("SQL_STREAM_BATCH_ROWS", "2000"))
+    SQL_STREAM_CHUNK_CHARS: int = int(os.getenv("SQL_STREAM_CHUNK_CHARS", "1000"))
+    SQL_STREAM_MAX_ROWS: int = int(os.getenv("SQL_STREAM_MAX_ROWS", "0"))
+    SQL_STREAM_PARTITION_RETRIES: int = int(os.getenv("SQL_STREAM_PARTITION_RETRIES", "2"))
+    # SQL export (SQLSelectToCSVAgent): parquet ili csv, kompresija i veličina row group-e
+    SQL_EXPORT_FORMAT: str = os.getenv("SQL_EXPORT_FORMAT", "parquet")
+    SQL_EXPORT_COMPRESSION: str = os.getenv("SQL_EXPORT_COMPRESSION", "zstd")
+    SQL_EXPORT_ROW_GROUP_ROWS: int = int(os.getenv("SQL_EXPORT_ROW_GROUP_ROWS", "100000"))
+    # Dijeljeni pool-ovi eksternih izvora: konekcija po izvoru, zatvaranje neaktivnih engine-a
+    EXTERNAL_POOL_MAX_CONNECTIONS: int = int(os.getenv("EXTERNAL_POOL_MAX_CONNECTIONS", "5"))
+    EXTERNAL_POOL_IDLE_SECONDS: int = int(os.getenv("EXTERNAL_POOL_IDLE_SECONDS", "600"))
+    EXTERNAL_POOL_TIMEOUT_SECONDS: int = int(os.getenv("EXTERNAL_POOL_TIMEOUT_SECONDS", "30"))
+    # Inkrementalni sync izvora (watermark + hash redova) i periodični scheduler
+    SQL_SYNC_SCHEDULER_ENABLED: bool = os.getenv("SQL_SYNC_SCHEDULER_ENABLED", "true").lower() == "true"
+    SQL_SYNC_POLL_SECONDS: int = int(os.getenv("SQL_SYNC_POLL_SECONDS", "60"))
     
 
+    # Dedup uploada po SHA-256 sadržaja (kopiranje chunk-ova umjesto ponovne obrade)
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_CROSS_OWNER: bool = os.getenv("DEDUP_CROSS_OWNER", "false").lower() == "true"
+    # Upload sa istim imenom fajla kao postojeći dokument = nova verzija (inače samo uz replace_of)
+    REINGEST_MATCH_FILENAME: bool = os.getenv("REINGEST_MATCH_FILENAME", "false").lower() == "true"
+    # Checkpointi po agentu (UPLOAD_DIR/checkpoints) za nastavak obrade nakon greške
+    PIPELINE_CHECKPOINTS_ENABLED: bool = os.getenv("PIPELINE_CHECKPOINTS_ENABLED", "true").lower() == "true"
+
     # Upload
     UPLOAD_MAX_SIZE: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
     UPLOAD_DIR: str = "uploads"
 
     class Config:
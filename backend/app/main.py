@@ -3,6 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import routes_auth, routes_documents, routes_chat, routes_ingest
 from app.core.config import settings
+from app.services.engine_registry import engine_registry
+from app.services.sql_sync import sync_scheduler
 
 app = FastAPI(
     title="Multi-RAG API",
@@ -33,6 +35,16 @@ app.include_router(routes_documents.router, prefix=API_PREFIX)
 app.include_router(routes_chat.router,      prefix=API_PREFIX)
 app.include_router(routes_ingest.router,    prefix=API_PREFIX)
 
+@app.on_event("startup")
+async def start_sql_sync_scheduler():
+    if settings.SQL_SYNC_SCHEDULER_ENABLED:
+        sync_scheduler.start()
+
+@app.on_event("shutdown")
+async def close_external_engines():
+    await sync_scheduler.stop()
+    engine_registry.dispose_all()
+
 @app.get(f"{API_PREFIX}/health")
 async def health_check():
     return {"status": "ok", "service": "Multi-RAG API"}
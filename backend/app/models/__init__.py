@@ -3,6 +3,8 @@ from app.models.document import Document
 from app.models.chunk import DocumentChunk
 from app.models.relation import DocumentRelation
 from app.models.external_source import ExternalSource, IngestJob
+from app.models.entity import DocumentEntity
+from app.models.table import IngestedTable
 
 __all__ = [
     "User",
@@ -10,5 +12,7 @@ __all__ = [
     "DocumentChunk",
     "DocumentRelation",
     "ExternalSource",
-    "IngestJob"
+    "IngestJob",
+    "DocumentEntity",
+    "IngestedTable"
 ]
@@ -16,11 +16,16 @@ class Document(Base):
     file_path = Column(Text, nullable=True)
     file_size = Column(Integer, nullable=True)
     mime_type = Column(String(100), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
     doc_metadata = Column("metadata", JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Pomjera se kada se sadržaj promijeni (re-ingest, SQL sync); ulazi u verziju korpusa keša odgovora
+    updated_at = Column(DateTime, default=datetime.utcnow)
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="documents")
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     relations = relationship("DocumentRelation", back_populates="document", cascade="all, delete-orphan")
     ingest_jobs = relationship("IngestJob", back_populates="document", cascade="all, delete-orphan")
+    entities = relationship("DocumentEntity", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    tables = relationship("IngestedTable", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
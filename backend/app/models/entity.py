@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+
+from app.core.db import Base
+
+
+class DocumentEntity(Base):
+    __tablename__ = "document_entities"
+    __table_args__ = (
+        # B-tree za exact-match lookup (normalized_value, entity_type)
+        Index("idx_entities_value_type", "normalized_value", "entity_type"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    chunk_id = Column(UUID(as_uuid=True), ForeignKey("document_chunks.id", ondelete="CASCADE"), nullable=True)
+    entity_type = Column(String(50), nullable=False)
+    normalized_value = Column(String(255), nullable=False)
+    raw_value = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    document = relationship("Document", back_populates="entities")
@@ -29,6 +29,7 @@ class IngestJob(Base):
     status = Column(String(50), default="pending", index=True)
     logs = Column(JSON, default=list)
     error = Column(Text, nullable=True)
+    progress = Column(JSON, default=dict)
     started_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
 
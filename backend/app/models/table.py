@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, JSON
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+
+from app.core.db import Base
+
+
+class IngestedTable(Base):
+    """Katalog tabela u kolonarnom store-u (Parquet/CSV) sa šemom i brojem redova."""
+    __tablename__ = "ingested_tables"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    table_index = Column(Integer, nullable=False, default=0)
+    table_path = Column(Text, nullable=False)
+    format = Column(String(20), nullable=False, default="parquet")
+    page = Column(Integer, nullable=True)
+    sheet = Column(String(255), nullable=True)
+    row_count = Column(Integer, nullable=False, default=0)
+    column_count = Column(Integer, nullable=False, default=0)
+    columns = Column(JSON, default=list)          # [{"name": ..., "dtype": ..., "sql_name"?, "sql_type"?}]
+    numeric_columns = Column(JSON, default=list)
+    sql_table = Column(Text, nullable=True)         # tipizovana Postgres kopija (schema.t_<id>), ako je učitana
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    document = relationship("Document", back_populates="tables")
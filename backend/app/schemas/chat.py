@@ -26,6 +26,7 @@ class SearchResponse(BaseModel):
 class ChatRequest(BaseModel):
     query: str
     top_k: int = 5
+    deadline_ms: Optional[int] = None  # best-effort: opcione faze se preskaču, generacija se uvijek izvršava
 
 
 class Verdict(BaseModel):
@@ -33,6 +34,17 @@ class Verdict(BaseModel):
     ok: bool = True
     needs_more: bool = False
     notes: Optional[str] = None
+    tier: Optional[str] = None  # "heuristic", "llm" ili "table"
+    confidence: Optional[float] = None
+
+
+class StageTrace(BaseModel):
+    """Trag jedne faze pipeline-a (completed/skipped/timeout/failed/hit/miss)."""
+    stage: str
+    status: str
+    duration_ms: float = 0.0
+    reason: Optional[str] = None
+    error: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -41,3 +53,6 @@ class ChatResponse(BaseModel):
     query: str
     verdict: Optional[Verdict] = None
     summary: Optional[str] = None
+    cached: bool = False
+    stages: List[StageTrace] = []
+    table: Optional[Dict[str, Any]] = None  # rezultat direktne agregacije/pretrage nad tabelom
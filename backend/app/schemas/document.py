@@ -25,6 +25,7 @@ class DocumentResponse(BaseModel):
     status: str
     mime_type: Optional[str] = None
     file_size: Optional[int] = None
+    content_hash: Optional[str] = None
     metadata: Dict[str, Any] = {}
     created_at: datetime
     agent_logs: Optional[List[AgentLog]] = []
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any, Literal
+from datetime import datetime
 import uuid
 
 
@@ -7,6 +8,15 @@ class SQLIngestRequest(BaseModel):
     source_name: str
     query: str
     connection_string: Optional[str] = None
+    # Inkrementalni sync: ključ reda je obavezan, watermark i interval su opcioni
+    key_column: Optional[str] = None
+    watermark_column: Optional[str] = None
+    sync_interval_minutes: Optional[int] = None
+    track_deletes: bool = False
+    # Paralelno čitanje velikih izvora: N key-range ili hash particija po koloni
+    partition_column: Optional[str] = None
+    partitions: int = 1
+    partition_mode: Literal["range", "hash"] = "range"
 
 
 class SQLIngestResponse(BaseModel):
@@ -14,3 +24,13 @@ class SQLIngestResponse(BaseModel):
     job_id: uuid.UUID
     status: str
     message: str
+
+
+class IngestJobStatusResponse(BaseModel):
+    job_id: uuid.UUID
+    document_id: uuid.UUID
+    status: str
+    progress: Dict[str, Any] = {}
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
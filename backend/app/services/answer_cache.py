@@ -0,0 +1,138 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from app.core.config import settings
+
+
+@dataclass
+class CacheEntry:
+    """Keširani odgovor sa embeddingom upita i skupom citiranih dokumenata."""
+    owner_scope: str
+    corpus_version: str
+    vector: np.ndarray
+    result: Dict[str, Any]
+    document_ids: Set[str]
+    latency_ms: float
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    Semantički keš odgovora za RAGPipeline.
+
+    Pogodak je prethodni odgovor čiji je embedding upita unutar praga
+    kosinusne sličnosti, a owner scope i verzija korpusa se poklapaju.
+    Zapisi koji citiraju obrisani/izmijenjeni dokument se izbacuju.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: int = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "latency_saved_ms": 0.0}
+
+    def lookup(self, query_vec: List[float], owner_scope: str, corpus_version: str) -> Optional[Dict[str, Any]]:
+        """Vrati kopiju keširanog rezultata ili None."""
+        q = self._normalize(query_vec)
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._expire()
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.owner_scope == owner_scope and entry.corpus_version == corpus_version
+            ]
+            if candidates:
+                sims = np.vstack([entry.vector for _, entry in candidates]) @ q
+                best = int(np.argmax(sims))
+                if float(sims[best]) >= self.threshold:
+                    key, entry = candidates[best]
+                    entry.hits += 1
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["latency_saved_ms"] += entry.latency_ms
+                    result = copy.deepcopy(entry.result)
+                    result["cache"] = {"hit": True, "similarity": round(float(sims[best]), 4)}
+                    return result
+            self._stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        query_vec: List[float],
+        owner_scope: str,
+        corpus_version: str,
+        result: Dict[str, Any],
+        latency_ms: float,
+    ) -> None:
+        """Upiši odgovor u keš (LRU izbacivanje preko max_entries)."""
+        document_ids = {str(c.get("document_id")) for c in result.get("citations", []) if c.get("document_id")}
+        entry = CacheEntry(
+            owner_scope=owner_scope,
+            corpus_version=corpus_version,
+            vector=self._normalize(query_vec),
+            result=copy.deepcopy(result),
+            document_ids=document_ids,
+            latency_ms=latency_ms,
+        )
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Izbaci sve zapise koji citiraju neki od navedenih dokumenata."""
+        ids = {str(d) for d in document_ids}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.document_ids & ids]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidated"] += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **self._stats,
+                "latency_saved_ms": round(self._stats["latency_saved_ms"], 1),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+            }
+
+    # -------- helpers --------
+    def _expire(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        stale = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in stale:
+            del self._entries[key]
+
+    @staticmethod
+    def _normalize(vec: List[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        return v / (np.linalg.norm(v) + 1e-12)
+
+
+answer_cache = SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.agents.types import DocumentType, ProcessingContext
+from app.core.config import settings
+
+# Polja konteksta koja se čuvaju; embeddings idu odvojeno kao float32 .npy
+STATE_FIELDS = ("mime_type", "text_content", "chunks", "tables", "images", "relations")
+EMBEDDINGS_KEY = "embeddings"
+
+
+def _unserializable(data: Dict[str, Any], prefix: str = "") -> List[str]:
+    """Putanje (npr. metadata.aggregate) do vrijednosti koje json ne može upisati."""
+    bad = []
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            bad.extend(_unserializable(value, f"{path}.") if isinstance(value, dict) else [path])
+    return bad
+
+
+class CheckpointStore:
+    """
+    Checkpointi DocumentPipeline-a za jedan dokument:
+    UPLOAD_DIR/checkpoints/<document_id>/{manifest.json, context.json, embeddings.npy}.
+
+    Poslije svakog uspješnog agenta upisuje se kumulativno stanje konteksta
+    (tekst, chunk-ovi, dense-prep tekstovi, metadata) i lista završenih agenata.
+    Embeddingi se upisuju jednom, kao kompaktan float32 niz (pgvector ih i tako
+    čuva kao float4). Upis je atomičan (tmp + os.replace), pa prekid usred
+    upisa ostavlja prethodni checkpoint. Stanje mora biti čist JSON: vrijednost
+    koja to nije diže TypeError umjesto da se tiho upiše kao string.
+    """
+
+    def __init__(self, document_id: str, root: Optional[str] = None):
+        self.dir = Path(root or Path(settings.UPLOAD_DIR) / "checkpoints") / str(document_id)
+
+    @staticmethod
+    def _source_key(file_path: str) -> str:
+        # Checkpoint važi samo za isti fajl; nova verzija ili izmijenjen fajl kreće ispočetka
+        path = Path(file_path)
+        size = path.stat().st_size if path.exists() else -1
+        return f"{path}:{size}"
+
+    def _write_json(self, name: str, data: Dict[str, Any]) -> None:
+        # Bez default=str: vrijednost koja nije JSON (UUID, datetime, numpy, ...) bi se
+        # tiho pretvorila u string i vratila iz checkpointa pogrešnog tipa
+        try:
+            payload = json.dumps(data, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            raise TypeError(f"Checkpoint {name}: polja nisu JSON-serijabilna: {', '.join(_unserializable(data))} ({e})") from e
+        tmp = self.dir / f"{name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self.dir / name)
+
+    def _read_json(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.dir / name, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, context: ProcessingContext, completed: List[str]) -> None:
+        """
+        Upiši stanje konteksta nakon uspješnog agenta.
+
+        Args:
+            context: kontekst poslije agenta
+            completed: nazivi agenata završenih do sada (redom)
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._read_json("manifest.json") or {}
+        embeddings = context.metadata.get(EMBEDDINGS_KEY)
+        has_embeddings = manifest.get("embeddings", 0)
+        if embeddings and has_embeddings != len(embeddings):
+            tmp = self.dir / "embeddings.tmp.npy"
+            np.save(tmp, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp, self.dir / "embeddings.npy")
+            has_embeddings = len(embeddings)
+
+        state = {name: getattr(context, name) for name in STATE_FIELDS}
+        state["document_type"] = context.document_type.value
+        state["metadata"] = {k: v for k, v in context.metadata.items() if k != EMBEDDINGS_KEY}
+        self._write_json("context.json", state)
+        # Manifest posljednji: pokazuje samo na stanje koje je kompletno upisano
+        self._write_json("manifest.json", {
+            "source": self._source_key(context.file_path),
+            "completed": completed,
+            "embeddings": has_embeddings,
+        })
+
+    def load(self, document_id: str, file_path: str, filename: str) -> Optional[Tuple[List[str], ProcessingContext]]:
+        """
+        Učitaj checkpoint za nastavak obrade.
+
+        Returns:
+            (završeni agenti, rekonstruisani kontekst) ili None ako checkpoint
+            ne postoji ili je za drugi fajl
+        """
+        manifest = self._read_json("manifest.json")
+        state = self._read_json("context.json")
+        if not manifest or not state or manifest.get("source") != self._source_key(file_path):
+            return None
+
+        context = ProcessingContext(document_id=document_id, file_path=file_path, filename=filename)
+        for name in STATE_FIELDS:
+            setattr(context, name, state[name])
+        context.document_type = DocumentType(state["document_type"])
+        context.metadata = state["metadata"]
+        if manifest.get("embeddings"):
+            context.metadata[EMBEDDINGS_KEY] = np.load(self.dir / "embeddings.npy").tolist()
+        return manifest["completed"], context
+
+    def exists(self) -> bool:
+        return (self.dir / "manifest.json").exists()
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
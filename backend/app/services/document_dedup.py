@@ -0,0 +1,156 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Table, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.chunk import DocumentChunk
+from app.models.document import Document
+from app.models.entity import DocumentEntity
+from app.models.relation import DocumentRelation
+from app.models.table import IngestedTable
+
+
+def find_duplicate(db: Session, content_hash: Optional[str], owner_id: uuid.UUID) -> Optional[Document]:
+    """
+    Obrađen dokument sa istim SHA-256 sadržajem.
+
+    Prvo se traži kod istog vlasnika; tuđi dokumenti samo uz DEDUP_CROSS_OWNER.
+    Ako je pronađeni dokument i sam klon, vraća se njegov izvor (klonovi ne lančaju).
+
+    Args:
+        db: Sesija
+        content_hash: SHA-256 uploadovanih bajtova
+        owner_id: vlasnik novog uploada
+
+    Returns:
+        Izvorni dokument ili None
+    """
+    if not settings.DEDUP_ENABLED or not content_hash:
+        return None
+    base = db.query(Document).filter(Document.content_hash == content_hash, Document.status == "ready")
+    doc = base.filter(Document.created_by == owner_id).order_by(Document.created_at.asc()).first()
+    if doc is None and settings.DEDUP_CROSS_OWNER:
+        doc = base.order_by(Document.created_at.asc()).first()
+    root = (doc.doc_metadata or {}).get("deduplicated_from") if doc is not None else None
+    if root:
+        doc = db.get(Document, uuid.UUID(root)) or doc
+    return doc
+
+
+_SHARED_MODELS = {
+    "chunks": DocumentChunk,
+    "entities": DocumentEntity,
+    "relations": DocumentRelation,
+    "tables": IngestedTable,
+}
+
+
+def clone_document(db: Session, source: Document, target: Document) -> Dict[str, int]:
+    """
+    Veži novi dokument za već obrađeni izvor (bez ekstrakcije i embeddinga).
+
+    Ništa se ne kopira: chunk-ovi, entiteti, relacije i tabele ostaju samo na
+    izvoru, a klon ga referencira preko doc_metadata['deduplicated_from']
+    (dedup_metadata). Tako globalna pretraga ne vraća isti chunk više puta.
+    Kad se izvor briše ili dobija novu verziju, podatke preuzima klon (release_clones).
+
+    Returns:
+        Broj dijeljenih redova po vrsti
+    """
+    return {
+        name: db.query(model).filter(model.document_id == source.id).count()
+        for name, model in _SHARED_MODELS.items()
+    }
+
+
+def clones_of(db: Session, source_id: Any) -> List[Document]:
+    """Klonovi izvora, najstariji prvi."""
+    return (
+        db.query(Document)
+        .filter(Document.doc_metadata["deduplicated_from"].as_string() == str(source_id))
+        .order_by(Document.created_at.asc())
+        .all()
+    )
+
+
+def _copy_rows(db: Session, table: Table, source_id: uuid.UUID, target_id: uuid.UUID,
+               overrides: Dict[str, str], joins: str = "") -> int:
+    """INSERT ... SELECT svih kolona tabele za jedan dokument; id/document_id (i overrides) se zamjenjuju."""
+    values = {"id": "uuid_generate_v4()", "document_id": ":target", **overrides}
+    cols = [c.name for c in table.columns]
+    select = ", ".join(values.get(c, f"src.{c}") for c in cols)
+    result = db.execute(
+        text(f"INSERT INTO {table.name} ({', '.join(cols)}) SELECT {select} FROM {table.name} src {joins} WHERE src.document_id = :source"),
+        {"source": source_id, "target": target_id}
+    )
+    return result.rowcount
+
+
+def _copy_document(db: Session, source_id: uuid.UUID, target_id: uuid.UUID) -> None:
+    """Server-side kopija obrađenih podataka; entiteti se vežu za nove chunk-ove po chunk_index-u."""
+    _copy_rows(db, DocumentChunk.__table__, source_id, target_id, {"created_at": "NOW()"})
+    _copy_rows(
+        db, DocumentEntity.__table__, source_id, target_id,
+        {"chunk_id": "nc.id", "created_at": "NOW()"},
+        joins=(
+            "LEFT JOIN document_chunks oc ON oc.id = src.chunk_id "
+            "LEFT JOIN document_chunks nc ON nc.document_id = :target AND nc.chunk_index = oc.chunk_index"
+        )
+    )
+    _copy_rows(db, DocumentRelation.__table__, source_id, target_id, {"created_at": "NOW()"})
+    _copy_rows(db, IngestedTable.__table__, source_id, target_id, {"created_at": "NOW()"})
+
+
+def release_clones(db: Session, document_ids: List[Any], copy: bool = False) -> Dict[str, str]:
+    """
+    Izvori koji se brišu (ili mijenjaju sadržaj) predaju podatke svom najstarijem
+    klonu koji ostaje; ostali klonovi se prevezuju na njega.
+
+    Args:
+        db: Sesija (commit radi pozivalac)
+        document_ids: izvori koji odlaze
+        copy: False pri brisanju (redovi se prebacuju na klon, bez kopiranja);
+              True pri novoj verziji izvora (klon dobija kopiju trenutnog sadržaja)
+
+    Returns:
+        {izvor: klon koji je preuzeo podatke}
+    """
+    leaving = {str(i) for i in document_ids}
+    heirs: Dict[str, str] = {}
+    for source_id in leaving:
+        clones = [c for c in clones_of(db, source_id) if str(c.id) not in leaving]
+        if not clones:
+            continue
+        heir, rest = clones[0], clones[1:]
+        if copy:
+            _copy_document(db, uuid.UUID(source_id), heir.id)
+        else:
+            for model in _SHARED_MODELS.values():
+                db.query(model).filter(model.document_id == uuid.UUID(source_id)).update(
+                    {model.document_id: heir.id}, synchronize_session=False
+                )
+        heir.doc_metadata = {
+            k: v for k, v in (heir.doc_metadata or {}).items() if k not in ("deduplicated_from", "shared")
+        }
+        heir.updated_at = datetime.utcnow()
+        for clone in rest:
+            clone.doc_metadata = {**(clone.doc_metadata or {}), "deduplicated_from": str(heir.id)}
+        heirs[source_id] = str(heir.id)
+    db.flush()
+    for source_id in heirs:
+        # Kolekcije izvora (chunks, ...) su možda učitane prije prebacivanja;
+        # ORM cascade pri brisanju ne smije dirati redove koji sada pripadaju klonu
+        db.expire(db.get(Document, uuid.UUID(source_id)))
+    return heirs
+
+
+def dedup_metadata(source: Document, counts: Dict[str, Any]) -> Dict[str, Any]:
+    """doc_metadata klona: metadata izvora + referenca na izvor čije podatke dijeli."""
+    return {
+        **(source.doc_metadata or {}),
+        "deduplicated_from": str(source.id),
+        "shared": counts,
+    }
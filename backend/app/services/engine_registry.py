@@ -0,0 +1,162 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+
+@dataclass
+class EngineEntry:
+    """Engine jednog eksternog izvora sa podacima za eviction i statistiku."""
+    url: str
+    engine: Engine
+    max_connections: int
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    uses: int = 0
+
+
+class EngineRegistry:
+    """
+    Dijeljeni registar SQLAlchemy engine-a za eksterne SQL izvore.
+
+    Engine se pravi lijeno, jednom po izvoru (ExternalSource id ili URL),
+    sa ograničenim poolom (max_connections po izvoru) i pool_pre_ping
+    health check-om pri svakom checkout-u. Engine bez aktivnih konekcija
+    koji nije korišten idle_seconds se zatvara (dispose) i izbacuje.
+    """
+
+    def __init__(self, max_connections: int = 5, idle_seconds: int = 600, pool_timeout: int = 30, pool_recycle: int = 1800):
+        self.max_connections = max_connections
+        self.idle_seconds = idle_seconds
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self._entries: Dict[str, EngineEntry] = {}
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0, "replaced": 0}
+
+    def get_engine(self, url: str, key: Optional[str] = None, max_connections: Optional[int] = None) -> Engine:
+        """
+        Vrati dijeljeni engine za izvor; pravi ga pri prvom pozivu.
+
+        Args:
+            url: SQLAlchemy connection string izvora
+            key: stabilan ključ izvora (npr. ExternalSource.id); default je sam URL
+            max_connections: gornja granica konekcija za ovaj izvor
+
+        Returns:
+            Engine sa ograničenim poolom
+        """
+        key = str(key or url)
+        now = time.time()
+        stale: List[Engine] = []
+        with self._lock:
+            stale.extend(self._pop_idle(now, keep=key))
+            entry = self._entries.get(key)
+            if entry is not None and entry.url != url:
+                # Izvor je promijenio connection string: stari pool se gasi
+                stale.append(self._entries.pop(key).engine)
+                self._stats["replaced"] += 1
+                entry = None
+            if entry is None:
+                limit = max_connections or self.max_connections
+                entry = EngineEntry(url=url, engine=self._create(url, limit), max_connections=limit)
+                self._entries[key] = entry
+                self._stats["created"] += 1
+            else:
+                self._stats["reused"] += 1
+            entry.last_used = now
+            entry.uses += 1
+        for engine in stale:
+            engine.dispose()
+        return entry.engine
+
+    def check(self, key: str) -> bool:
+        """Health check izvora (SELECT 1); False ako izvor nije registrovan ili ne odgovara."""
+        with self._lock:
+            entry = self._entries.get(str(key))
+        if entry is None:
+            return False
+        try:
+            with entry.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def evict_idle(self) -> int:
+        """Zatvori engine-e koji su neaktivni duže od idle_seconds; vraća broj izbačenih."""
+        with self._lock:
+            stale = self._pop_idle(time.time())
+        for engine in stale:
+            engine.dispose()
+        return len(stale)
+
+    def dispose(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(key), None)
+        if entry is not None:
+            entry.engine.dispose()
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.engine.dispose()
+
+    def stats(self, urls: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Brojači registra i stanje pool-ova; sa urls samo izvori sa tim connection string-ovima."""
+        with self._lock:
+            sources = []
+            for key, entry in self._entries.items():
+                if urls is not None and entry.url not in urls:
+                    continue
+                pool = entry.engine.pool
+                sources.append({
+                    "url": entry.engine.url.render_as_string(hide_password=True),
+                    "dialect": entry.engine.dialect.name,
+                    "max_connections": entry.max_connections,
+                    "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                    "uses": entry.uses,
+                    "idle_s": round(time.time() - entry.last_used, 1),
+                })
+            return {**self._stats, "engines": len(self._entries), "sources": sources}
+
+    def _create(self, url: str, limit: int) -> Engine:
+        try:
+            return create_engine(
+                url,
+                pool_size=limit,
+                max_overflow=0,
+                pool_timeout=self.pool_timeout,
+                pool_recycle=self.pool_recycle,
+                pool_pre_ping=True,
+            )
+        except TypeError:
+            # Dijalekti sa poolom bez pool_size/max_overflow (npr. SQLite in-memory)
+            return create_engine(url, pool_pre_ping=True)
+
+    def _pop_idle(self, now: float, keep: Optional[str] = None) -> List[Engine]:
+        """Izvadi neaktivne engine-e (poziva se pod lock-om); dispose radi pozivalac."""
+        stale = []
+        for key, entry in list(self._entries.items()):
+            if key == keep or now - entry.last_used < self.idle_seconds:
+                continue
+            pool = entry.engine.pool
+            if hasattr(pool, "checkedout") and pool.checkedout() > 0:
+                continue
+            stale.append(self._entries.pop(key).engine)
+            self._stats["evicted"] += 1
+        return stale
+
+
+engine_registry = EngineRegistry(
+    max_connections=settings.EXTERNAL_POOL_MAX_CONNECTIONS,
+    idle_seconds=settings.EXTERNAL_POOL_IDLE_SECONDS,
+    pool_timeout=settings.EXTERNAL_POOL_TIMEOUT_SECONDS,
+)
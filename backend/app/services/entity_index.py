@@ -0,0 +1,109 @@
+import re
+from datetime import datetime
+from typing import List, Set, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.agents.ingest.meta import ID_PATTERNS, DATE_PATTERNS, MONEY_PATTERN
+from app.models.entity import DocumentEntity
+
+# Tipovi za koje exact-match u potpunosti zamjenjuje vektorsku pretragu; datumi i
+# iznosi su prečesti da bi sami odredili chunk, pa ne ulaze u lookup
+ID_ENTITY_TYPES = tuple(ID_PATTERNS.keys())
+
+_DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%Y.%m.%d", "%Y/%m/%d", "%d.%m.%y")
+_CURRENCY = {"€": "EUR", "$": "USD", "BAM": "KM"}
+
+Entity = Tuple[str, str, str]  # (entity_type, normalized_value, raw_value)
+
+
+def normalize_entity(entity_type: str, value: str) -> str:
+    """
+    Kanonski oblik entiteta, isti za dokument i upit.
+
+    Args:
+        entity_type: jmbg, doc_id, email, date ili money
+        value: Sirova vrijednost iz teksta
+
+    Returns:
+        Normalizovana vrijednost (npr. "INV-2024-001" -> "INV2024001", datum -> ISO)
+    """
+    value = value.strip()
+    if entity_type == "doc_id":
+        return re.sub(r"[-/\s]", "", value).upper()
+    if entity_type == "email":
+        return value.lower()
+    if entity_type == "date":
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return re.sub(r"\D", "", value)
+    if entity_type == "money":
+        m = re.match(r"([\d.,]+)\s*(.*)", value)
+        if not m:
+            return value.upper()
+        number, currency = m.group(1), m.group(2).upper()
+        decimals = ""
+        dec = re.search(r"[.,](\d{1,2})$", number)
+        if dec:
+            decimals = dec.group(1).rstrip("0")
+            number = number[:dec.start()]
+        amount = re.sub(r"\D", "", number) + (f".{decimals}" if decimals else "")
+        return f"{amount}{_CURRENCY.get(currency, currency)}"
+    return value
+
+
+def extract_entities(text: str) -> Set[Entity]:
+    """
+    Pronađi entitete u tekstu istim obrascima kao MetaAgent.
+
+    Args:
+        text: Tekst chunk-a ili upit
+
+    Returns:
+        Skup (entity_type, normalized_value, raw_value)
+    """
+    found: Set[Entity] = set()
+    for entity_type, pattern in ID_PATTERNS.items():
+        for m in pattern.finditer(text):
+            found.add((entity_type, normalize_entity(entity_type, m.group(0)), m.group(0)))
+    for pattern in DATE_PATTERNS:
+        for m in pattern.finditer(text):
+            found.add(("date", normalize_entity("date", m.group(0)), m.group(0)))
+    for m in MONEY_PATTERN.finditer(text):
+        found.add(("money", normalize_entity("money", m.group(0)), m.group(0)))
+    # Prazne i predugačke vrijednosti ne idu u indeks
+    return {e for e in found if e[1] and len(e[1]) <= 255}
+
+
+def has_id_entity(query: str) -> bool:
+    """Da li upit sadrži ID (JMBG, ID dokumenta, email) za exact-match fast path."""
+    return any(t in ID_ENTITY_TYPES for t, _, _ in extract_entities(query))
+
+
+def lookup_chunks(db: Session, query: str, limit: int) -> List[Tuple[str, float]]:
+    """
+    B-tree lookup chunk-ova koji sadrže ID-eve iz upita (JMBG, ID dokumenta, email).
+    Datumi i iznosi iz upita se ne traže: chunk koji dijeli samo datum sa upitom
+    nije exact-match i ne smije zamijeniti vektorsku pretragu.
+
+    Returns:
+        Lista (chunk_id, score) gdje je score udio ID-eva upita pronađenih u chunk-u
+    """
+    keys = {(t, v) for t, v, _ in extract_entities(query) if t in ID_ENTITY_TYPES}
+    if not keys:
+        return []
+    matched = func.count(func.distinct(DocumentEntity.normalized_value))
+    rows = (
+        db.query(DocumentEntity.chunk_id, matched.label("matched"))
+        .filter(tuple_(DocumentEntity.entity_type, DocumentEntity.normalized_value).in_(list(keys)))
+        .filter(DocumentEntity.chunk_id.isnot(None))
+        .group_by(DocumentEntity.chunk_id)
+        .order_by(matched.desc())
+        .limit(limit)
+        .all()
+    )
+    return [(row.chunk_id, row.matched / len(keys)) for row in rows]
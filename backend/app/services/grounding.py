@@ -0,0 +1,112 @@
+import re
+from typing import Any, Dict, List, Optional, Set
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# Riječ sa velikim početnim slovom koja nije na početku rečenice
+_ENTITY_RE = re.compile(r"(?<![.!?:]\s)(?<!^)\b[A-ZČĆŽŠĐ][\wčćžšđ]{2,}", re.UNICODE | re.MULTILINE)
+
+# Fraze kojima generator priznaje da u kontekstu nema odgovora
+REFUSAL_MARKERS = (
+    "nema dovoljno informacija",
+    "nemam dovoljno informacija",
+    "kontekst ne sadrži",
+    "nije navedeno u kontekstu",
+    "ne mogu odgovoriti",
+)
+
+# Težine signala u ocjeni utemeljenosti (nedostajući signali se izostavljaju)
+SIGNAL_WEIGHTS = {"lexical": 0.4, "bigram": 0.25, "numeric": 0.2, "entity": 0.15}
+# Težine unutar člana kvaliteta pretrage: najbolji score i izraženost prvog hita po RRF-u
+RETRIEVAL_WEIGHTS = {"retrieval": 0.75, "rrf_margin": 0.25}
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if not t.isdigit()]
+
+
+def _coverage(needles: Set[Any], haystack: Set[Any]) -> Optional[float]:
+    if not needles:
+        return None
+    return len(needles & haystack) / len(needles)
+
+
+def _normalize_number(n: str) -> str:
+    return n.replace(".", "").replace(",", "")
+
+
+def grounding_signals(answer: str, hits: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """
+    Izračunaj signale utemeljenosti odgovora u citiranom kontekstu bez LLM-a.
+
+    Args:
+        answer: Generisani odgovor
+        hits: Retrieved hitovi sa 'content', 'score' i opciono 'rrf_score'
+
+    Returns:
+        Dict sa lexical, bigram, numeric, entity (udio pokriven kontekstom ili
+        None ako u odgovoru nema takvih elemenata), retrieval (najbolji score)
+        i rrf_margin (prednost prvog hita nad drugim po RRF-u)
+    """
+    context = "\n".join(h.get("content", "") or "" for h in hits)
+    context_lower = context.lower()
+
+    answer_tokens = _tokens(answer)
+    context_tokens = _tokens(context)
+    context_vocab = set(context_tokens)
+
+    content_words = {t for t in answer_tokens if len(t) >= 3}
+    answer_bigrams = set(zip(answer_tokens, answer_tokens[1:]))
+    context_bigrams = set(zip(context_tokens, context_tokens[1:]))
+
+    numbers = {_normalize_number(n) for n in _NUMBER_RE.findall(answer)}
+    context_numbers = {_normalize_number(n) for n in _NUMBER_RE.findall(context)}
+
+    entities = {e.lower() for e in _ENTITY_RE.findall(answer)}
+    entity_cov = None
+    if entities:
+        entity_cov = sum(1 for e in entities if e in context_lower) / len(entities)
+
+    scores = [float(h.get("score") or 0.0) for h in hits]
+    rrf = sorted((float(h.get("rrf_score") or 0.0) for h in hits), reverse=True)
+    rrf_margin = None
+    if len(rrf) >= 2 and rrf[0] > 0:
+        rrf_margin = (rrf[0] - rrf[1]) / rrf[0]
+
+    return {
+        "lexical": _coverage(content_words, context_vocab),
+        "bigram": _coverage(answer_bigrams, context_bigrams),
+        "numeric": _coverage(numbers, context_numbers),
+        "entity": entity_cov,
+        "retrieval": max(0.0, min(1.0, max(scores))) if scores else 0.0,
+        "rrf_margin": rrf_margin,
+    }
+
+
+def grounding_confidence(signals: Dict[str, Optional[float]]) -> float:
+    """
+    Kombinuj signale u jednu ocjenu 0-1 (80% utemeljenost, 20% kvalitet pretrage).
+
+    Kvalitet pretrage je 75% najbolji score i 25% rrf_margin (RETRIEVAL_WEIGHTS);
+    bez rrf_margin (manje od dva hita) računa se samo score.
+    """
+    grounded = _weighted(signals, SIGNAL_WEIGHTS)
+    signals = {**signals, "retrieval": signals.get("retrieval") or 0.0}
+    return 0.8 * grounded + 0.2 * _weighted(signals, RETRIEVAL_WEIGHTS)
+
+
+def _weighted(signals: Dict[str, Optional[float]], weights: Dict[str, float]) -> float:
+    """Ponderisan prosjek prisutnih signala (nedostajući se izostavljaju)."""
+    total = weight = 0.0
+    for name, w in weights.items():
+        value = signals.get(name)
+        if value is not None:
+            total += w * value
+            weight += w
+    return total / weight if weight else 0.0
+
+
+def is_refusal(answer: str) -> bool:
+    """Da li generator eksplicitno kaže da kontekst nema odgovor."""
+    text = answer.lower()
+    return any(marker in text for marker in REFUSAL_MARKERS)
@@ -1,11 +1,17 @@
-from typing import List, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional
 from app.core.config import settings
+from app.services.rate_limiter import llm_rate_limiter, backoff_delay, retry_after_seconds
 
 try:
-    from openai import OpenAI
-    _client = OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+    from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+    # Retry-e radi call_with_limits (dijeljeni limiter + backoff), ne SDK
+    _client = OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0) if settings.OPENAI_API_KEY else None
+    RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 except Exception:
     _client = None
+    RateLimitError = None
+    RETRYABLE_ERRORS = ()
 
 
 def get_llm_client():
@@ -13,7 +19,101 @@ def get_llm_client():
     return _client
 
 
-def llm_complete(prompt: str, model: Optional[str] = None, n: int = 1) -> List[str]:
+def estimate_tokens(*texts: str) -> int:
+    """Gruba procjena broja tokena (~4 znaka po tokenu) za rezervaciju u limiteru."""
+    return sum(len(t or "") for t in texts) // 4 + 1
+
+
+def call_with_limits(call: Callable[[], Any], model: str, tokens: int, caller: str) -> Any:
+    """
+    Izvrši OpenAI poziv kroz dijeljeni rate limiter, sa retry-em i backoff-om.
+
+    Prije svakog pokušaja rezerviše se kapacitet (RPM/TPM bucket modela);
+    x-ratelimit-* headeri odgovora i retry-after kod 429 blokiraju model za
+    sve workere. Ponavljaju se 429, timeout, greške konekcije i 5xx.
+
+    Args:
+        call: funkcija koja radi `.with_raw_response` poziv
+        model: naziv modela (ključ limita)
+        tokens: procijenjeni tokeni (prompt + odgovor)
+        caller: ko poziva (metrika throttled vremena)
+
+    Returns:
+        Parsiran odgovor SDK-a
+    """
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        llm_rate_limiter.acquire(model, tokens, caller)
+        try:
+            raw = call()
+        except RETRYABLE_ERRORS as e:
+            rate_limited = RateLimitError is not None and isinstance(e, RateLimitError)
+            if attempt >= settings.LLM_MAX_RETRIES:
+                llm_rate_limiter.record(caller, errors=1, rate_limited=int(rate_limited))
+                raise
+            response = getattr(e, "response", None)
+            headers = getattr(response, "headers", None)
+            delay = backoff_delay(attempt, retry_after_seconds(headers))
+            if rate_limited:
+                llm_rate_limiter.penalize(model, delay)
+            llm_rate_limiter.record(caller, retries=1, backoff_s=delay, rate_limited=int(rate_limited))
+            time.sleep(delay)
+            continue
+        except Exception:
+            llm_rate_limiter.record(caller, errors=1)
+            raise
+        llm_rate_limiter.observe_headers(model, raw.headers)
+        resp = raw.parse()
+        usage = getattr(resp, "usage", None)
+        llm_rate_limiter.settle(model, tokens, getattr(usage, "total_tokens", None))
+        return resp
+
+
+def chat_completion(messages: List[Dict[str, str]], model: Optional[str] = None,
+                    caller: str = "chat", **kwargs) -> Any:
+    """
+    chat.completions.create kroz limiter/retry sloj.
+
+    Args:
+        messages: poruke
+        model: Model name (default: settings.CHAT_MODEL)
+        caller: ko poziva (metrika)
+        **kwargs: ostali parametri (temperature, max_tokens, n, response_format, ...)
+
+    Returns:
+        ChatCompletion odgovor SDK-a
+    """
+    if _client is None:
+        raise Exception("OpenAI client is not configured")
+    model = model or settings.CHAT_MODEL
+    completion = kwargs.get("max_tokens") or settings.LLM_COMPLETION_TOKENS_ESTIMATE
+    tokens = estimate_tokens(*(m.get("content", "") for m in messages)) + completion * kwargs.get("n", 1)
+    return call_with_limits(
+        lambda: _client.chat.completions.with_raw_response.create(model=model, messages=messages, **kwargs),
+        model, tokens, caller
+    )
+
+
+def create_embeddings(texts: List[str], model: Optional[str] = None, caller: str = "embeddings") -> List[List[float]]:
+    """
+    Embeddinzi za listu tekstova (jedan API poziv) kroz limiter/retry sloj, u redoslijedu ulaza.
+
+    Args:
+        texts: tekstovi
+        model: Model name (default: settings.EMBEDDINGS_MODEL)
+        caller: ko poziva (metrika)
+    """
+    if _client is None:
+        raise Exception("OpenAI client is not configured")
+    model = model or settings.EMBEDDINGS_MODEL
+    resp = call_with_limits(
+        lambda: _client.embeddings.with_raw_response.create(model=model, input=texts),
+        model, estimate_tokens(*texts), caller
+    )
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def llm_complete(prompt: str, model: Optional[str] = None, n: int = 1, json_mode: bool = False,
+                 caller: str = "llm_complete") -> List[str]:
     """
     Vrati listu n završetaka. Ako OpenAI nije dostupan, vrati stub odgovore.
     
@@ -21,6 +121,8 @@ def llm_complete(prompt: str, model: Optional[str] = None, n: int = 1) -> List[s
         prompt: Prompt za LLM
         model: Model name (default: settings.CHAT_MODEL)
         n: Broj completion-a koji treba generisati
+        json_mode: Traži JSON objekat kao izlaz (response_format)
+        caller: Ko poziva (metrika rate limitera)
     
     Returns:
         Lista stringova sa odgovorima
@@ -30,11 +132,14 @@ def llm_complete(prompt: str, model: Optional[str] = None, n: int = 1) -> List[s
         # Fallback za razvoj
         return [f"[STUB:{model}] {prompt[:200]} ..."] * n
 
-    resp = _client.chat.completions.create(
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    resp = chat_completion(
+        [{"role": "user", "content": prompt}],
         model=model,
-        messages=[{"role": "user", "content": prompt}],
+        caller=caller,
         n=n,
         temperature=0.2,
+        **extra,
     )
     outs = []
     for choice in resp.choices:
@@ -6,8 +6,24 @@ from app.agents.chunking import ChunkingAgent
 from app.agents.llm_dense_prep import LLMDensePrepAgent
 from app.agents.embedding import EmbeddingAgent
 from app.agents.indexing import IndexingAgent
-from app.agents.types import ProcessingContext
+from app.agents.entity_index import EntityIndexAgent
+from app.agents.table_catalog import TableCatalogAgent
+from app.agents.table_sql_load import TableSqlLoadAgent
+from app.agents.chunk_diff import ChunkDiffAgent, ChunkDiffApplyAgent
+from app.agents.types import AgentResult, AgentStatus, ProcessingContext
 from app.core.config import settings
+from app.services.checkpoints import CheckpointStore
+
+# Bez ovih koraka dalja obrada nema smisla: pipeline staje, a checkpoint ostaje za retry
+REQUIRED_AGENTS = ("TextExtractAgent", "ChunkingAgent", "EmbeddingAgent", "IndexingAgent")
+
+
+class PipelineStageError(Exception):
+    """Obavezan agent nije uspio; obrada se može nastaviti od njega (resume=True)."""
+
+    def __init__(self, stage: str, error: str):
+        super().__init__(f"{stage} failed: {error}")
+        self.stage = stage
 
 
 class DocumentPipeline:
@@ -21,6 +37,16 @@ class DocumentPipeline:
     5. LLMDensePrepAgent - Priprema chunk-ove za LLM dense retrieval (NOVO)
     6. EmbeddingAgent - Generiše OpenAI embeddings
     7. IndexingAgent - Upisuje chunk-ove u bazu sa embeddings
+    8. EntityIndexAgent - Indeksira ID-eve, datume i iznose za exact-match pretragu
+    9. TableCatalogAgent - Registruje ekstraktovane tabele (Parquet) u katalog
+    10. TableSqlLoadAgent - Učitava tabele u tipizovane Postgres tabele (COPY) za SQL pushdown
+
+    Verzionisani re-ingest (incremental=True) dodaje ChunkDiffAgent poslije chunking-a
+    (koraci 5-8 rade samo nad novim chunk-ovima) i ChunkDiffApplyAgent na kraj; primjenu
+    diff-a commit-uje pozivalac zajedno sa zamjenom kataloga tabela.
+
+    Poslije svakog uspješnog agenta stanje se čuva u CheckpointStore; ponovljena
+    obrada (resume=True) preskače završene agente i kreće od onog koji je pao.
     """
     
     def __init__(self, db: Session):
@@ -34,17 +60,27 @@ class DocumentPipeline:
         self.llm_dense_prep_agent = LLMDensePrepAgent(enabled=True)  # NOVO
         self.embedding_agent = EmbeddingAgent()
         self.indexing_agent = IndexingAgent(db=self.db)
+        self.entity_index_agent = EntityIndexAgent(db=self.db)
+        self.table_catalog_agent = TableCatalogAgent(db=self.db)
+        self.table_sql_load_agent = TableSqlLoadAgent(db=self.db, enabled=settings.TABLE_SQL_ENABLED)
+        self.chunk_diff_agent = ChunkDiffAgent(db=self.db)
+        self.chunk_diff_apply_agent = ChunkDiffApplyAgent(db=self.db)
     
     async def process_document(
         self,
         document_id: str,
         file_path: str,
         filename: str,
-        user_id: int
+        user_id: int,
+        incremental: bool = False,
+        resume: bool = False
     ) -> ProcessingContext:
         """
         Procesira dokument kroz pipeline.
         Vraća ProcessingContext sa svim rezultatima i logovima.
+        incremental=True: nova verzija postojećeg dokumenta, embeduje se samo delta chunk-ova.
+        resume=True: nastavak od posljednjeg checkpointa (ako postoji za isti fajl).
+        Pad obaveznog agenta (REQUIRED_AGENTS) diže PipelineStageError.
         """
         
         # Create context
@@ -54,13 +90,55 @@ class DocumentPipeline:
             filename=filename
         )
         
+        stages = [
+            self.mime_detect_agent,
+            self.text_extract_agent,
+            self.ocr_agent,
+            self.chunking_agent,
+            *([self.chunk_diff_agent] if incremental else []),
+            self.llm_dense_prep_agent,   # NOVO
+            self.embedding_agent,
+            self.indexing_agent,
+            self.entity_index_agent,
+            self.table_catalog_agent,
+            self.table_sql_load_agent,
+            # Posljednji: table agenti commit-uju/rollback-uju sesiju, a primjena diff-a ostaje otvorena
+            *([self.chunk_diff_apply_agent] if incremental else []),
+        ]
+        
+        # Verzionisani re-ingest mijenja postojeće redove, pa se ne nastavlja iz checkpointa
+        checkpoints = CheckpointStore(document_id) if settings.PIPELINE_CHECKPOINTS_ENABLED and not incremental else None
+        completed = []
+        if checkpoints and resume:
+            restored = checkpoints.load(document_id, file_path, filename)
+            if restored:
+                completed, context = restored
+        
         # Execute pipeline (sequential)
-        context = await self.mime_detect_agent.execute(context)
-        context = await self.text_extract_agent.execute(context)
-        context = await self.ocr_agent.execute(context)
-        context = await self.chunking_agent.execute(context)
-        context = await self.llm_dense_prep_agent.execute(context)   # NOVO
-        context = await self.embedding_agent.execute(context)
-        context = await self.indexing_agent.execute(context)
+        for agent in stages:
+            if agent.name in completed:
+                context.add_result(AgentResult(
+                    agent_name=agent.name,
+                    status=AgentStatus.SKIPPED,
+                    message=f"{agent.name} restored from checkpoint"
+                ))
+                continue
+            
+            context = await agent.execute(context)
+            result = context.get_latest_result()
+            
+            if agent is self.chunk_diff_agent and 'chunk_diff' not in context.metadata:
+                # Bez diff-a bi se svi chunk-ovi dodali uz stare; prethodna verzija ostaje netaknuta
+                raise Exception(f"Chunk diff failed: {result.error}")
+            if result.status == AgentStatus.FAILED:
+                if agent.name in REQUIRED_AGENTS:
+                    raise PipelineStageError(agent.name, result.error)
+                # Checkpoint pokriva samo neprekinut niz uspješnih agenata
+                checkpoints = None
+            elif checkpoints:
+                completed.append(agent.name)
+                checkpoints.save(context, completed)
         
+        if not incremental:
+            CheckpointStore(document_id).clear()
         return context
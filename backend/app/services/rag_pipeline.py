@@ -1,14 +1,26 @@
+import asyncio
+import json
+import time
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from openai import OpenAI
+from sqlalchemy import text
+from typing import List, Dict, Any, Tuple
 from app.models.document import Document
+from app.models.table import IngestedTable
 from app.core.config import settings
-from app.services.search import SearchService, rrf_merge
-from app.agents.planner import PlannerAgent
+from app.core.db import SessionLocal
+from app.services.search import SearchService, rrf_merge, mmr_select
+from app.services.answer_cache import answer_cache
+from app.services.llm_client import get_llm_client, create_embeddings
+from app.services.singleflight import SingleFlight, normalize_query
+from app.services.table_router import looks_tabular, format_aggregate, format_matches
+from app.agents.planner import PlannerAgent, STAGE_COST_MS
 from app.agents.rewriter import RewriterAgent
 from app.agents.generation import GenerationAgent
 from app.agents.judge import JudgeAgent
 from app.agents.summarizer import SummarizerAgent
+from app.agents.table_aggregate import TableAggregateAgent
+from app.agents.table_search import TableSearchAgent
+from app.agents.types import ProcessingContext, AgentStatus
 
 # Inicijalizacija agenata
 planner = PlannerAgent()
@@ -17,19 +29,49 @@ generator = GenerationAgent()
 judge = JudgeAgent()
 summarizer = SummarizerAgent()
 
+# Koalescencija identičnih konkurentnih zahtjeva (po procesu)
+chat_flight = SingleFlight("chat")
+embedding_flight = SingleFlight("embedding")
+
+# Izmjereno trajanje faza (EWMA, ms) - planner ga koristi za budžet latencije
+stage_costs_ms: Dict[str, float] = dict(STAGE_COST_MS)
+
+NO_ANSWER_IN_BUDGET = "Odgovor nije generisan u zadatom vremenskom budžetu. Pogledaj izvore ispod."
+
+
+class _Deadline:
+    """Budžet latencije zahtjeva; bez deadline_ms sve faze su dozvoljene."""
+
+    def __init__(self, deadline_ms: int | None):
+        self.enabled = deadline_ms is not None
+        self.expires_at = time.perf_counter() + deadline_ms / 1000 if self.enabled else None
+
+    def remaining_ms(self) -> float:
+        if not self.enabled:
+            return float("inf")
+        return (self.expires_at - time.perf_counter()) * 1000
+
+    def allows(self, cost_ms: float) -> bool:
+        return self.remaining_ms() >= cost_ms
+
+    def timeout_s(self, reserve_ms: float = 0.0) -> float | None:
+        if not self.enabled:
+            return None
+        return (self.remaining_ms() - reserve_ms) / 1000
+
 
 class RAGPipeline:
     def __init__(self, db: Session):
         self.db = db
         self.search_service = SearchService(db)
-        self.client = None
-        if settings.OPENAI_API_KEY:
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_llm_client() if settings.OPENAI_API_KEY else None
     
     async def generate_answer(
         self,
         query: str,
-        top_k: int | None = None
+        top_k: int | None = None,
+        owner_id: str | None = None,
+        deadline_ms: int | None = None
     ) -> Dict[str, Any]:
         """
         Multi-agent RAG pipeline za generisanje odgovora.
@@ -38,61 +80,146 @@ class RAGPipeline:
         Args:
             query: Korisnikov upit
             top_k: Broj rezultata za pretragu (default: settings.RAG_TOP_K)
+            owner_id: Korisnik u čijem opsegu se kešira odgovor
+            deadline_ms: Opcioni budžet latencije; faze koje ne stanu se preskaču
         
         Returns:
-            Dict sa answer, citations (sources), verdict, i summary
+            Dict sa answer, citations (sources), verdict, stages i summary
         """
         if not self.client:
             raise Exception("OpenAI API key not configured")
         
         top_k = top_k or settings.RAG_TOP_K
+        # Identični konkurentni zahtjevi dijele jedno izvršavanje pipeline-a
+        key = (normalize_query(query), top_k, owner_id, deadline_ms)
+        return await chat_flight.do(
+            key, lambda: self._generate_shared(query, top_k, owner_id, deadline_ms)
+        )
+    
+    @staticmethod
+    async def _generate_shared(
+        query: str,
+        top_k: int,
+        owner_id: str | None,
+        deadline_ms: int | None
+    ) -> Dict[str, Any]:
+        """
+        Zajedničko izvršavanje za sve čekače u chat_flight-u. Ima svoju sesiju:
+        sesija prvog zahtjeva se zatvara ako se njegov klijent odspoji, dok
+        izvršavanje (pod shield-om) i ostali čekači nastavljaju.
+        """
+        db = SessionLocal()
+        try:
+            return await RAGPipeline(db)._generate_answer(query, top_k, owner_id, deadline_ms)
+        finally:
+            db.close()
+    
+    async def _generate_answer(
+        self,
+        query: str,
+        top_k: int,
+        owner_id: str | None,
+        deadline_ms: int | None
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        deadline = _Deadline(deadline_ms)
+        stages: List[Dict[str, Any]] = []
+        
+        # 0) CACHE - Semantički keš po embeddingu upita i verziji korpusa
+        t0 = time.perf_counter()
+        query_vec = await self._get_embedding(query)
+        self._record(stages, "embedding", "completed", t0)
+        cache_scope = f"{owner_id or '*'}:{top_k}"
+        corpus_version = ""
+        if settings.ANSWER_CACHE_ENABLED:
+            t0 = time.perf_counter()
+            corpus_version = self._corpus_version()
+            cached = answer_cache.lookup(query_vec, cache_scope, corpus_version)
+            self._record(stages, "cache", "hit" if cached is not None else "miss", t0)
+            if cached is not None:
+                cached["query"] = query
+                cached["stages"] = stages
+                return cached
         
         # Inicijalizuj kontekst za agente
         ctx: Dict[str, Any] = {
             "query": query,
-            "rewrites_count": settings.AGENT_REWRITES
+            "rewrites_count": settings.AGENT_REWRITES,
+            "deadline_ms": deadline.remaining_ms() if deadline.enabled else None,
+            "stage_costs_ms": dict(stage_costs_ms),
         }
+        if looks_tabular(query):
+            ctx["tables"] = self._table_catalog(owner_id)
 
-        # 1) PLAN - Planner odlučuje strategiju
+        # 1) PLAN - Planner odlučuje strategiju (i šta stane u budžet)
         ctx = planner.run(ctx)
+        plan = ctx["plan"]
 
-        # 2) REWRITES - Generiši dodatne query varijante
-        ctx = rewriter.run(ctx)
+        # TABLE - Agregacija/pretraga direktno nad tabelom, bez retrieval-a i LLM-a;
+        # ako ne uspije, nastavlja se klasični RAG
+        if plan.get("use_table"):
+            t0 = time.perf_counter()
+            result = await self._answer_from_table(plan["table_query"])
+            self._record(stages, "table", "completed" if result else "failed", t0)
+            if result is not None:
+                result["query"] = query
+                result["stages"] = stages
+                return self._finish(result, query_vec, cache_scope, corpus_version, started)
 
-        # 3) RETRIEVAL - Federated search sa RRF
-        queries = [ctx["query"]] + ctx.get("rewrites", [])
-        result_sets: List[List[Dict[str, Any]]] = []
-        
-        for q in queries:
-            q_vec = await self._get_embedding(q)
-            hits = await self._search_and_convert(q_vec, top_k)
-            result_sets.append(hits)
+        # 2) EXACT MATCH - ID upiti (JMBG, ID dokumenta, email) idu preko indeksa entiteta
+        exact_hits: List[Dict[str, Any]] = []
+        if plan.get("exact_match"):
+            t0 = time.perf_counter()
+            exact_hits = self._to_hits(await self.search_service.entity_search(query, self._fetch_k(top_k)))
+            self._record(stages, "entity_lookup", "hit" if exact_hits else "miss", t0)
+
+        # 3) REWRITES + RETRIEVAL (vektorska pretraga se preskače ako exact match uspije)
+        ctx["rewrites"] = []
+        if exact_hits:
+            result_sets, vectors = [exact_hits], [query_vec]
+            self._record(stages, "retrieval", "skipped", reason="exact_match")
+        else:
+            result_sets, vectors = await self._speculative_retrieve(ctx, query_vec, top_k, deadline, stages)
 
-        # RRF merge svih rezultata
+        # RRF merge svih rezultata (+ opciono MMR diverzifikacija)
         merged = rrf_merge(result_sets)
-        ctx["retrieval"] = {"hits": merged[:top_k], "top_k": top_k}
+        ctx["retrieval"] = {"hits": self._select_hits(query_vec, merged, top_k), "top_k": top_k}
 
-        # 4) GENERATE - Generiši odgovor
-        ctx = generator.run(ctx)
+        # 4) GENERATE - Generiši odgovor (obavezna faza; dobija ostatak budžeta)
+        out = await self._run_agent("generation", generator, ctx, deadline, stages, required=True)
+        ctx["answer"] = out.get("answer", "") if out is not None else NO_ANSWER_IN_BUDGET
 
         # 5) JUDGE - Evaluacija kvaliteta + eventualna iteracija
-        ctx = judge.run(ctx)
+        if plan["judge"] and out is not None:
+            verdict_ctx = await self._run_agent("judge", judge, ctx, deadline, stages)
+            if verdict_ctx is not None:
+                ctx["verdict"] = verdict_ctx.get("verdict")
+        else:
+            self._record(stages, "judge", "skipped")
 
         # Opciona iteracija ako judge kaže da treba više konteksta
         iteration = 0
-        while ctx.get("verdict", {}).get("needs_more") and iteration < 2:
+        per_iteration = (self._cost("embedding") + self._cost("retrieval")
+                         + self._cost("generation") + self._cost("judge"))
+        while (ctx.get("verdict", {}).get("needs_more")
+               and iteration < plan["max_iterations"]
+               and deadline.allows(per_iteration)):
             iteration += 1
             more_k = min(ctx["retrieval"]["top_k"] + 5, 20)
-            extra_sets = []
-            for q in queries:
-                q_vec = await self._get_embedding(q)
-                hits = await self._search_and_convert(q_vec, more_k)
-                extra_sets.append(hits)
+            extra_sets = await self._retrieve(vectors, more_k, deadline, stages)
             
             merged = rrf_merge(result_sets + extra_sets)
-            ctx["retrieval"] = {"hits": merged[:more_k], "top_k": more_k}
-            ctx = generator.run(ctx)
-            ctx = judge.run(ctx)
+            candidate = dict(ctx)
+            candidate["retrieval"] = {"hits": self._select_hits(query_vec, merged, more_k), "top_k": more_k}
+            out = await self._run_agent("generation", generator, candidate, deadline, stages)
+            if out is None:
+                break  # zadrži najbolji odgovor do sada
+            candidate["answer"] = out.get("answer", "")
+            verdict_ctx = await self._run_agent("judge", judge, candidate, deadline, stages)
+            if verdict_ctx is None:
+                break
+            candidate["verdict"] = verdict_ctx.get("verdict")
+            ctx = candidate
 
         # 6) SUMMARIZE - Opcioni sažetak (možeš aktivirati po potrebi)
         # ctx = summarizer.run(ctx)
@@ -100,14 +227,316 @@ class RAGPipeline:
         # Konvertuj hits u citations format (backward compatibility)
         citations = self._convert_hits_to_citations(ctx["retrieval"]["hits"])
 
-        return {
+        # Bez presude (judge preskočen, istekao ili pao) odgovor nije ocijenjen: verdict ostaje None
+        verdict = ctx.get("verdict")
+        result = {
             "answer": ctx.get("answer", ""),
             "citations": citations,  # Backward compatible
             "sources": citations,    # Novi alias
             "query": query,
-            "verdict": ctx.get("verdict", {"ok": True, "needs_more": False}),
+            "verdict": verdict,
+            "stages": stages,
             # "summary": ctx.get("summary")  # Odkomentiraj ako koristiš summarizer
         }
+
+        return self._finish(result, query_vec, cache_scope, corpus_version, started)
+    
+    def _finish(
+        self,
+        result: Dict[str, Any],
+        query_vec: List[float],
+        cache_scope: str,
+        corpus_version: str,
+        started: float
+    ) -> Dict[str, Any]:
+        """
+        Upiši rezultat u keš. Ne keširaju se odgovori degradirani zbog budžeta
+        latencije ili greške, niti odgovori bez stvarne presude judge-a.
+        """
+        degraded = result.get("verdict") is None or any(
+            s["status"] in ("timeout", "skipped_deadline", "failed") for s in result["stages"]
+        )
+        if settings.ANSWER_CACHE_ENABLED and not degraded:
+            latency_ms = (time.perf_counter() - started) * 1000
+            answer_cache.store(query_vec, cache_scope, corpus_version, result, latency_ms)
+        return result
+    
+    def _table_catalog(self, owner_id: str | None) -> List[Dict[str, Any]]:
+        """Tabele iz kataloga (ingested_tables) za dokumente dostupne korisniku."""
+        q = (
+            self.db.query(IngestedTable, Document.filename)
+            .join(Document, IngestedTable.document_id == Document.id)
+            .filter(Document.status == "ready")
+        )
+        if owner_id:
+            q = q.filter(Document.created_by == owner_id)
+        return [
+            {
+                "table_path": t.table_path,
+                "rows": t.row_count,
+                "columns": [c["name"] for c in t.columns or []],
+                "numeric_columns": t.numeric_columns or [],
+                "document_id": str(t.document_id),
+                "filename": filename,
+                # Tipizovana Postgres kopija: agenti tada rade SQL pushdown umjesto čitanja fajla
+                "sql_table": {"name": t.sql_table, "columns": t.columns} if t.sql_table else None,
+            }
+            for t, filename in q.all()
+        ]
+    
+    async def _answer_from_table(self, tq: Dict[str, Any]) -> Dict[str, Any] | None:
+        """
+        Izvrši TableAggregateAgent/TableSearchAgent nad mapiranom tabelom i vrati
+        deterministički odgovor, ili None ako tabela nije upotrebljiva.
+        """
+        table = tq["table"]
+        pctx = ProcessingContext(
+            document_id=table["document_id"],
+            file_path=table["table_path"],
+            filename=table.get("filename") or ""
+        )
+        if table.get("sql_table"):
+            pctx.metadata["sql_table"] = table["sql_table"]
+        filters = {c: ("ieq", v) for c, v in (tq.get("filters") or {}).items()}
+        count_guard = bool(filters) and not tq["groupby"]
+        if tq["kind"] == "aggregate" and count_guard:
+            # Uz filter se broje i redovi: vrijednost koja ne postoji u tabeli ne smije dati "0"
+            agent = TableAggregateAgent(metrics=[(tq["op"], tq["column"]), ("count", None)], filter=filters, db=self.db)
+        elif tq["kind"] == "aggregate":
+            agent = TableAggregateAgent(op=tq["op"], column=tq["column"], groupby=tq["groupby"],
+                                        filter=filters, db=self.db)
+        else:
+            agent = TableSearchAgent(fulltext=tq["fulltext"], limit=10, save_matches_csv=False, db=self.db)
+        
+        # Pandas obrada / SQL upit su blokirajući; izvršava se u threadu sa vlastitim event loop-om
+        pctx = await asyncio.to_thread(lambda: asyncio.run(agent.execute(pctx)))
+        last = pctx.get_latest_result()
+        if last is None or last.status != AgentStatus.COMPLETED:
+            return None
+        
+        if tq["kind"] == "aggregate":
+            data = pctx.metadata.get("aggregate")
+            if count_guard and data:
+                if not data.get("count"):
+                    return None
+                label = tq["op"] if tq["op"] == "count" else f"{tq['op']}_{tq['column']}"
+                data = {tq["op"]: data.get(label)}
+            if not data:
+                return None
+            answer = format_aggregate(tq, data)
+        else:
+            data = pctx.metadata.get("matches_preview") or []
+            answer = format_matches(tq, pctx.metadata.get("matches_count", 0), data)
+        
+        return {
+            "answer": answer,
+            "citations": [],
+            "sources": [],
+            "verdict": {"ok": True, "needs_more": False, "notes": "deterministički rezultat iz tabele", "tier": "table"},
+            "table": {
+                "document_id": table["document_id"],
+                "filename": table.get("filename"),
+                "kind": tq["kind"],
+                "op": tq["op"],
+                "column": tq["column"],
+                "groupby": tq["groupby"],
+                "filters": tq.get("filters") or {},
+                "fulltext": tq["fulltext"],
+                # numpy tipovi -> JSON-serijalizabilni
+                "result": json.loads(json.dumps(data, default=lambda o: o.item() if hasattr(o, "item") else str(o))),
+            },
+        }
+    
+    async def _speculative_retrieve(
+        self,
+        ctx: Dict[str, Any],
+        query_vec: List[float],
+        top_k: int,
+        deadline: "_Deadline",
+        stages: List[Dict[str, Any]]
+    ) -> Tuple[List[List[Dict[str, Any]]], List[List[float]]]:
+        """
+        LLM rewrite teče paralelno sa pretragom originalnog upita, koji ne zavisi
+        od rewrites; rezultati rewrites se dodaju kad stignu.
+        Vraća (result_sets, vektori upita) za RRF i naredne iteracije.
+        """
+        plan = ctx["plan"]
+        rewrite_task = None
+        if plan["rewrites"] > 0:
+            reserve = self._cost("embedding") + self._cost("retrieval") + self._cost("generation")
+            rewrite_task = asyncio.ensure_future(
+                self._run_agent("rewriter", rewriter, ctx, deadline, stages, reserve_ms=reserve)
+            )
+        else:
+            self._record(stages, "rewriter", "skipped", reason=plan.get("rewrite_skip_reason"))
+
+        vectors = [query_vec]
+        try:
+            result_sets = await self._retrieve(vectors, top_k, deadline, stages)
+            if rewrite_task is not None:
+                if self._confident(result_sets[0]):
+                    # Originalni hitovi su dovoljno dobri - generiši bez čekanja rewrites
+                    rewrite_task.cancel()
+                    self._record(stages, "rewriter", "skipped_confident")
+                else:
+                    out = await rewrite_task
+                    if out is not None:
+                        ctx["rewrites"] = out.get("rewrites", [])
+                        rewrite_vecs = await self._embed_rewrites(ctx["rewrites"], deadline, stages)
+                        vectors += rewrite_vecs
+                        result_sets += await self._retrieve(
+                            rewrite_vecs, top_k, deadline, stages, required_first=False
+                        )
+        finally:
+            if rewrite_task is not None and not rewrite_task.done():
+                rewrite_task.cancel()
+        return result_sets, vectors
+    
+    async def _retrieve(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        deadline: "_Deadline",
+        stages: List[Dict[str, Any]],
+        required_first: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Vektorska pretraga za svaki embedding. Originalni upit je obavezan;
+        ostali se preskaču ako ne stanu u budžet uz generisanje.
+        """
+        result_sets: List[List[Dict[str, Any]]] = []
+        for i, vec in enumerate(vectors):
+            if (i > 0 or not required_first) and not deadline.allows(
+                self._cost("retrieval") + self._cost("generation")
+            ):
+                self._record(stages, "retrieval", "skipped_deadline")
+                break
+            t0 = time.perf_counter()
+            hits = await self._search_and_convert(vec, self._fetch_k(top_k))
+            result_sets.append(hits)
+            self._record(stages, "retrieval", "completed", t0)
+        return result_sets
+    
+    async def _embed_rewrites(
+        self,
+        rewrites: List[str],
+        deadline: "_Deadline",
+        stages: List[Dict[str, Any]]
+    ) -> List[List[float]]:
+        """Embeddinzi svih rewrites u jednom batch pozivu (ako stanu u budžet)."""
+        if not rewrites:
+            return []
+        if not deadline.allows(self._cost("embedding") + self._cost("retrieval") + self._cost("generation")):
+            self._record(stages, "embedding", "skipped_deadline")
+            return []
+        t0 = time.perf_counter()
+        vectors = await self._get_embeddings(rewrites)
+        self._record(stages, "embedding", "completed", t0)
+        return vectors
+    
+    @staticmethod
+    def _confident(hits: List[Dict[str, Any]]) -> bool:
+        """Da li su originalni hitovi dovoljno dobri za generisanje bez rewrites."""
+        if not settings.RAG_EARLY_GENERATION_ENABLED or not hits:
+            return False
+        return max(h.get("score", 0.0) for h in hits) >= settings.RAG_EARLY_GENERATION_SCORE
+    
+    async def _run_agent(
+        self,
+        stage: str,
+        agent: Any,
+        ctx: Dict[str, Any],
+        deadline: "_Deadline",
+        stages: List[Dict[str, Any]],
+        required: bool = False,
+        reserve_ms: float = 0.0
+    ) -> Dict[str, Any] | None:
+        """
+        Pokreni LLM agenta u threadu, ograničeno preostalim budžetom.
+        Agent radi nad kopijom konteksta, pa prekinuta faza ne mijenja ctx.
+        Vraća izlazni kontekst ili None ako je faza preskočena/istekla/pala.
+        
+        Deadline je best-effort: obavezna faza (required) se ne preskače i dobija
+        najmanje dvostruko procijenjeno trajanje (EWMA), i kada je budžet već
+        potrošen, jer bi otkazana generacija platila pretragu i LLM poziv
+        (thread nastavlja) bez odgovora.
+        """
+        timeout = deadline.timeout_s(reserve_ms)
+        if timeout is not None and required:
+            timeout = max(timeout, 2 * self._cost(stage) / 1000)
+        if timeout is not None and timeout <= 0 and not required:
+            self._record(stages, stage, "skipped_deadline")
+            return None
+        
+        t0 = time.perf_counter()
+        try:
+            call = asyncio.to_thread(agent.run, dict(ctx))
+            if timeout is None:
+                out = await call
+            else:
+                out = await asyncio.wait_for(call, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._record(stages, stage, "timeout", t0)
+            return None
+        except Exception as e:
+            if required:
+                raise
+            self._record(stages, stage, "failed", t0, error=str(e))
+            return None
+        
+        self._record(stages, stage, "completed", t0)
+        return out
+    
+    def _record(
+        self,
+        stages: List[Dict[str, Any]],
+        stage: str,
+        status: str,
+        started: float | None = None,
+        **extra: Any
+    ) -> None:
+        """Zapiši fazu u trace i ažuriraj procjenu trajanja (EWMA)."""
+        duration_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        stages.append({"stage": stage, "status": status, "duration_ms": round(duration_ms, 1), **extra})
+        if status == "completed" and stage in stage_costs_ms:
+            stage_costs_ms[stage] = 0.8 * stage_costs_ms[stage] + 0.2 * duration_ms
+    
+    @staticmethod
+    def _cost(stage: str) -> float:
+        return stage_costs_ms.get(stage, STAGE_COST_MS.get(stage, 0.0))
+    
+    def _corpus_version(self) -> str:
+        """
+        Verzija korpusa: mijenja se sa svakim dodanim ili obrisanim dokumentom i
+        sa svakom promjenom sadržaja (re-ingest, SQL sync pomjeraju updated_at).
+        Čita se iz baze, pa je ista u svim workerima.
+        """
+        row = self.db.execute(text(
+            "SELECT COUNT(*) AS n, MAX(COALESCE(updated_at, created_at)) AS last FROM documents WHERE status = 'ready'"
+        )).first()
+        if row is None:
+            return "0"
+        return f"{row.n}:{row.last.isoformat() if row.last else ''}"
+    
+    def _fetch_k(self, top_k: int) -> int:
+        """Broj kandidata po upitu; sa MMR-om dohvatamo širi skup za diverzifikaciju."""
+        if settings.RAG_MMR_ENABLED:
+            return max(top_k, settings.RAG_MMR_CANDIDATES)
+        return top_k
+    
+    def _select_hits(
+        self,
+        query_vec: List[float],
+        merged: List[Dict[str, Any]],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """Odaberi finalnih top_k hitova iz RRF rezultata (MMR ako je uključen)."""
+        if settings.RAG_MMR_ENABLED and query_vec:
+            selected = mmr_select(query_vec, merged, top_k, settings.RAG_MMR_LAMBDA)
+        else:
+            selected = merged[:top_k]
+        # Embedding je potreban samo za MMR; ne nosimo ga dalje kroz pipeline
+        return [{k: v for k, v in hit.items() if k != "embedding"} for hit in selected]
     
     async def _search_and_convert(self, embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
         """
@@ -118,7 +547,10 @@ class RAGPipeline:
             query_embedding=embedding,
             top_k=top_k
         )
-        
+        return self._to_hits(search_results)
+    
+    def _to_hits(self, search_results: List[Tuple[Any, float]]) -> List[Dict[str, Any]]:
+        """Konvertuj (chunk, score) parove u hit dict-ove."""
         hits = []
         for chunk, score in search_results:
             # Konvertuj metadata u dict ako je potrebno
@@ -135,7 +567,8 @@ class RAGPipeline:
                 "filename": chunk.document.filename if chunk.document else "Unknown",
                 "content": chunk.content,
                 "score": float(score),
-                "metadata": meta
+                "metadata": meta,
+                "embedding": chunk.embedding if settings.RAG_MMR_ENABLED else None
             })
         return hits
     
@@ -166,11 +599,24 @@ class RAGPipeline:
             base = [float(b) / 255.0 - 0.5 for b in hash_digest]  # 32 floata
             return (base * 48)[:1536]  # Repeat do 1536 dim
         
+        # Identični konkurentni embedding pozivi dijele jedan API poziv
+        key = (settings.EMBEDDINGS_MODEL, text)
+        return await embedding_flight.do(key, lambda: asyncio.to_thread(self._embed_sync, text))
+    
+    async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embeddinzi za više tekstova jednim API pozivom."""
+        if not self.client:
+            return [await self._get_embedding(t) for t in texts]
+        return await asyncio.to_thread(self._embed_many_sync, texts)
+    
+    def _embed_many_sync(self, texts: List[str]) -> List[List[float]]:
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=settings.EMBEDDINGS_MODEL
-            )
-            return response.data[0].embedding
+            return create_embeddings(texts, model=settings.EMBEDDINGS_MODEL, caller="RAGPipeline")
+        except Exception as e:
+            raise Exception(f"Failed to get embedding: {str(e)}")
+    
+    def _embed_sync(self, text: str) -> List[float]:
+        try:
+            return create_embeddings([text], model=settings.EMBEDDINGS_MODEL, caller="RAGPipeline")[0]
         except Exception as e:
             raise Exception(f"Failed to get embedding: {str(e)}")
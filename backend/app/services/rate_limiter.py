@@ -0,0 +1,286 @@
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Limiti po modelu iz "model=rpm:tpm,model2=rpm:tpm".
+
+    Args:
+        spec: vrijednost LLM_RATE_LIMITS
+
+    Returns:
+        {model: (zahtjeva u minuti, tokena u minuti)}; 0 = bez limita
+    """
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        model, values = part.split("=", 1)
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset header ("20ms", "1s", "6m0s", "1h2m3.5s") ili broj sekundi -> sekunde."""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Koliko server traži da se čeka (retry-after-ms / retry-after), ako je naveo."""
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Eksponencijalni backoff sa punim jitter-om; retry-after servera ima prednost.
+
+    Args:
+        attempt: redni broj ponovljenog pokušaja (0 = prvi retry)
+        retry_after: sekunde iz retry-after headera
+
+    Returns:
+        Sekunde čekanja prije sljedećeg pokušaja
+    """
+    base = settings.LLM_BACKOFF_BASE_SECONDS
+    if retry_after is not None:
+        # Jitter razbija sinhronizovane retry-e workera koji su dobili isti header
+        return min(settings.LLM_BACKOFF_MAX_SECONDS, retry_after) + random.uniform(0, base)
+    return random.uniform(0, min(settings.LLM_BACKOFF_MAX_SECONDS, base * (2 ** attempt)))
+
+
+class _LocalBuckets:
+    """Token bucket-i u memoriji procesa (fallback kada Postgres nije dostupan)."""
+
+    def __init__(self):
+        self._state: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, bucket: str, capacity: float, rate: float, cost: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, blocked_until = self._state.get(bucket, (capacity, now, 0.0))
+            tokens = min(capacity, tokens + (now - updated) * rate) - cost
+            self._state[bucket] = [tokens, now, blocked_until]
+            return max(0.0, -tokens / rate, blocked_until - now)
+
+    def block(self, bucket: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.setdefault(bucket, [0.0, now, 0.0])
+            state[2] = max(state[2], now + seconds)
+
+    def adjust(self, bucket: str, delta: float) -> None:
+        with self._lock:
+            if bucket in self._state:
+                self._state[bucket][0] -= delta
+
+
+class _PostgresBuckets:
+    """
+    Token bucket-i dijeljeni između workera: stanje je jedan red po bucket-u u
+    llm_rate_buckets, a rezervacija je jedan atomičan upsert (row lock), pa
+    workeri ne mogu zajedno potrošiti isti kapacitet.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def reserve(self, bucket: str, capacity: float, rate: float, cost: float) -> float:
+        with self.engine.begin() as conn:
+            tokens, blocked = conn.execute(
+                text("""
+                    INSERT INTO llm_rate_buckets (bucket, tokens, updated_at)
+                    VALUES (:b, :cap - :cost, clock_timestamp())
+                    ON CONFLICT (bucket) DO UPDATE SET
+                        tokens = LEAST(:cap, llm_rate_buckets.tokens
+                                 + EXTRACT(EPOCH FROM clock_timestamp() - llm_rate_buckets.updated_at) * :rate) - :cost,
+                        updated_at = clock_timestamp()
+                    RETURNING tokens, EXTRACT(EPOCH FROM blocked_until - clock_timestamp())
+                """),
+                {"b": bucket, "cap": capacity, "rate": rate, "cost": cost}
+            ).one()
+        return max(0.0, -float(tokens) / rate, float(blocked or 0.0))
+
+    def block(self, bucket: str, seconds: float) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    UPDATE llm_rate_buckets
+                    SET blocked_until = GREATEST(COALESCE(blocked_until, clock_timestamp()),
+                                                 clock_timestamp() + make_interval(secs => :s))
+                    WHERE bucket = :b
+                """),
+                {"b": bucket, "s": seconds}
+            )
+
+    def adjust(self, bucket: str, delta: float) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE llm_rate_buckets SET tokens = tokens - :d WHERE bucket = :b"), {"b": bucket, "d": delta})
+
+
+class LLMRateLimiter:
+    """
+    Centralni limiter za OpenAI pozive: po modelu jedan bucket za zahtjeve (RPM)
+    i jedan za tokene (TPM). Rezervacija ide unaprijed (procjena tokena), a
+    nakon odgovora se koriguje stvarnom potrošnjom (usage). Kada headeri
+    odgovora kažu da je kvota potrošena, ili server vrati 429 sa retry-after,
+    bucket se blokira do reseta za sve workere.
+    Čekanje i retry-i se bilježe po pozivaocu.
+
+    Ako Postgres nije dostupan, limiter shared_cooldown sekundi radi samo nad
+    lokalnim bucket-ima, da svaki poziv ne plaća connection timeout.
+    """
+
+    def __init__(self, backend: str = "postgres", limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                 default_rpm: int = 0, default_tpm: int = 0, shared_cooldown: float = 30.0):
+        self.backend = backend
+        self.limits = limits or {}
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self._local = _LocalBuckets()
+        self._shared = None
+        if backend == "postgres":
+            from app.core.db import engine
+            self._shared = _PostgresBuckets(engine)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "calls": 0, "throttled_s": 0.0, "backoff_s": 0.0, "retries": 0, "rate_limited": 0, "errors": 0
+        })
+        self._shared_failures = 0
+        self.shared_cooldown = shared_cooldown
+        self._shared_down_until = 0.0
+
+    def _limits_for(self, model: str) -> Tuple[int, int]:
+        return self.limits.get(model, (self.default_rpm, self.default_tpm))
+
+    def _buckets(self):
+        if self._shared is not None and time.monotonic() >= self._shared_down_until:
+            return self._shared
+        return self._local
+
+    def _call(self, method: str, *args) -> Any:
+        """Poziv shared backend-a; ako Postgres nije dostupan, limit se drži lokalno do isteka cooldown-a."""
+        buckets = self._buckets()
+        try:
+            return getattr(buckets, method)(*args)
+        except Exception as e:
+            if buckets is self._local:
+                raise
+            with self._lock:
+                self._shared_failures += 1
+                self._shared_down_until = time.monotonic() + self.shared_cooldown
+            print(f"LLM rate limiter: shared state unavailable, using local buckets for "
+                  f"{self.shared_cooldown:g}s ({e})")
+            return getattr(self._local, method)(*args)
+
+    def acquire(self, model: str, tokens: int, caller: str) -> float:
+        """
+        Rezerviši kapacitet za jedan poziv i sačekaj ako ga trenutno nema.
+
+        Args:
+            model: naziv modela
+            tokens: procijenjeni tokeni poziva (prompt + odgovor)
+            caller: ko poziva (metrika)
+
+        Returns:
+            Sekunde provedene u čekanju
+        """
+        if self.backend == "off":
+            self.record(caller, calls=1)
+            return 0.0
+        rpm, tpm = self._limits_for(model)
+        wait = 0.0
+        if rpm > 0:
+            wait = max(wait, self._call("reserve", f"{model}:requests", float(rpm), rpm / 60.0, 1.0))
+        if tpm > 0:
+            wait = max(wait, self._call("reserve", f"{model}:tokens", float(tpm), tpm / 60.0, float(tokens)))
+        if wait > 0:
+            time.sleep(wait)
+        self.record(caller, calls=1, throttled_s=wait)
+        return wait
+
+    def settle(self, model: str, estimated: int, actual: Optional[int]) -> None:
+        """Koriguj token bucket za razliku stvarne (usage) i procijenjene potrošnje."""
+        if self.backend == "off" or not actual or self._limits_for(model)[1] <= 0:
+            return
+        if actual != estimated:
+            self._call("adjust", f"{model}:tokens", float(actual - estimated))
+
+    def observe_headers(self, model: str, headers: Optional[Mapping[str, str]]) -> None:
+        """x-ratelimit-* headeri: kada je kvota na nuli, blokiraj bucket do reseta."""
+        if self.backend == "off" or not headers:
+            return
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            try:
+                exhausted = remaining is not None and int(remaining) <= 0
+            except ValueError:
+                exhausted = False
+            if exhausted and reset:
+                self._call("block", f"{model}:{kind}", reset)
+
+    def penalize(self, model: str, seconds: float) -> None:
+        """429 od servera: zaustavi sve pozive modela na traženo vrijeme."""
+        if self.backend == "off" or seconds <= 0:
+            return
+        for kind in ("requests", "tokens"):
+            self._call("block", f"{model}:{kind}", seconds)
+
+    def record(self, caller: str, **counters: float) -> None:
+        with self._lock:
+            stats = self._stats[caller]
+            for key, value in counters.items():
+                stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            callers = {
+                name: {k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()}
+                for name, s in self._stats.items()
+            }
+            return {
+                "backend": self.backend,
+                "shared_failures": self._shared_failures,
+                "shared_available": self._shared is not None and time.monotonic() >= self._shared_down_until,
+                "callers": callers,
+            }
+
+
+llm_rate_limiter = LLMRateLimiter(
+    backend=settings.LLM_RATE_LIMIT_BACKEND,
+    limits=parse_limits(settings.LLM_RATE_LIMITS),
+    default_rpm=settings.LLM_DEFAULT_RPM,
+    default_tpm=settings.LLM_DEFAULT_TPM,
+    shared_cooldown=settings.LLM_RATE_LIMIT_SHARED_COOLDOWN_SECONDS
+)
@@ -1,9 +1,12 @@
+import asyncio
 from sqlalchemy.orm import Session
 from sqlalchemy import text, func, select, desc
 from typing import List, Tuple, Dict, Any
 from app.models.chunk import DocumentChunk
 from app.models.document import Document
+from app.services.entity_index import has_id_entity, lookup_chunks
 from pgvector.sqlalchemy import Vector
+import numpy as np
 import uuid
 
 
@@ -16,7 +19,7 @@ def rrf_merge(result_sets: List[List[Dict]], k: int = 60) -> List[Dict]:
         k: RRF parametar (default 60)
     
     Returns:
-        Ujedinjena lista dict-ova sortirana po RRF score-u
+        Ujedinjena lista dict-ova sortirana po RRF score-u (polje "rrf_score")
     """
     scores: dict[str, float] = {}
     keep: dict[str, Dict] = {}
@@ -31,7 +34,67 @@ def rrf_merge(result_sets: List[List[Dict]], k: int = 60) -> List[Dict]:
     
     # Sort po zbirnim score
     merged_ids = sorted(scores.keys(), key=lambda x: scores[x], reverse=True)
-    return [keep[cid] for cid in merged_ids]
+    return [{**keep[cid], "rrf_score": scores[cid]} for cid in merged_ids]
+
+
+def _as_matrix(vectors: List[Any]) -> np.ndarray:
+    """Pretvori listu vektora (list/ndarray/pgvector string) u float32 matricu."""
+    rows = []
+    for v in vectors:
+        if isinstance(v, str):
+            v = [float(x) for x in v.strip("[]").split(",") if x.strip()]
+        rows.append(np.asarray(v, dtype=np.float32))
+    return np.vstack(rows)
+
+
+def mmr_select(
+    query_embedding: List[float],
+    hits: List[Dict],
+    top_k: int,
+    lambda_mult: float = 0.7,
+) -> List[Dict]:
+    """
+    Maximal Marginal Relevance - bira raznovrstan top_k iz kandidata.
+
+    Relevantnost i međusobna sličnost se računaju jednom kao NumPy matrice
+    (kosinusna sličnost nad normalizovanim vektorima), a greedy izbor samo
+    ažurira vektor maksimalne sličnosti sa već izabranim kandidatima.
+
+    Args:
+        query_embedding: Embedding upita
+        hits: Kandidati; svaki hit treba da ima "embedding" polje
+        top_k: Broj hitova koji se vraćaju
+        lambda_mult: 1.0 = čista relevantnost, 0.0 = čista raznovrsnost
+
+    Returns:
+        Lista od najviše top_k hitova u MMR redoslijedu
+    """
+    usable = [h for h in hits if h.get("embedding") is not None]
+    if len(usable) <= top_k or top_k <= 0:
+        return hits[:top_k]
+
+    cand = _as_matrix([h["embedding"] for h in usable])
+    cand /= np.linalg.norm(cand, axis=1, keepdims=True) + 1e-12
+    q = np.asarray(query_embedding, dtype=np.float32)
+    q /= np.linalg.norm(q) + 1e-12
+
+    relevance = cand @ q
+    similarity = cand @ cand.T
+
+    selected: List[int] = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    available = np.ones(len(usable), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < top_k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(max_sim, similarity[idx], out=max_sim)
+
+    return [usable[i] for i in selected]
 
 
 class SearchService:
@@ -46,13 +109,37 @@ class SearchService:
     ) -> List[Tuple[DocumentChunk, float]]:
         results = []
         
+        # Blokirajući DB upit ide u thread da ne blokira event loop; sesija se
+        # i dalje koristi sekvencijalno (jedna pretraga po sesiji u isto vrijeme)
+        if query and has_id_entity(query):
+            # Fast path: ID upiti se rješavaju B-tree lookup-om nad document_entities
+            results = await self.entity_search(query, top_k)
+            if results:
+                return results
+        
         if query_embedding:
-            results = self._vector_search(query_embedding, top_k)
+            results = await asyncio.to_thread(self._vector_search, query_embedding, top_k)
         else:
-            results = self._text_search(query, top_k)
+            results = await asyncio.to_thread(self._text_search, query, top_k)
         
         return results
     
+    async def entity_search(self, query: str, top_k: int = 5) -> List[Tuple[DocumentChunk, float]]:
+        """Exact-match pretraga po ID-evima iz upita (JMBG, ID dokumenta, email)."""
+        return await asyncio.to_thread(self._entity_search, query, top_k)
+    
+    def _entity_search(self, query: str, top_k: int) -> List[Tuple[DocumentChunk, float]]:
+        matches = lookup_chunks(self.db, query, top_k)
+        if not matches:
+            return []
+        by_id = {
+            chunk.id: chunk
+            for chunk in self.db.query(DocumentChunk).filter(
+                DocumentChunk.id.in_([chunk_id for chunk_id, _ in matches])
+            ).all()
+        }
+        return [(by_id[chunk_id], score) for chunk_id, score in matches if chunk_id in by_id]
+    
     def _vector_search(self, embedding: List[float], top_k: int) -> List[Tuple[DocumentChunk, float]]:
         from pgvector.sqlalchemy import Vector
         
@@ -67,14 +154,23 @@ class SearchService:
             LIMIT :top_k
         """)
         
-        result = self.db.execute(query_sql, {"embedding": embedding_str, "top_k": top_k})
-        
+        rows = self.db.execute(query_sql, {"embedding": embedding_str, "top_k": top_k}).fetchall()
+        if not rows:
+            return []
+
+        # Jedan upit za sve kandidate (uključuje i embedding kolonu za MMR)
+        ids = [row.id for row in rows]
+        by_id = {
+            chunk.id: chunk
+            for chunk in self.db.query(DocumentChunk).filter(DocumentChunk.id.in_(ids)).all()
+        }
+
         chunks_with_scores = []
-        for row in result:
-            chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == row.id).first()
+        for row in rows:
+            chunk = by_id.get(row.id)
             if chunk:
                 chunks_with_scores.append((chunk, float(row.similarity)))
-        
+
         return chunks_with_scores
     
     def _text_search(self, query: str, top_k: int) -> List[Tuple[DocumentChunk, float]]:
@@ -0,0 +1,48 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_query(query: str) -> str:
+    """Normalizuj upit za ključ koalescencije (mala slova, sažeti razmaci)."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class SingleFlight:
+    """
+    Koalescencija identičnih konkurentnih poziva (single-flight).
+
+    Prvi poziv za dati ključ pokreće izvršavanje; svi ostali koji stignu
+    dok je ono u toku čekaju isti rezultat (ili isti izuzetak). Nakon
+    završetka ključ se oslobađa - ovo nije keš.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self._stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._release(k, t))
+        else:
+            self._stats["shared"] += 1
+        # shield: otkazivanje jednog čekača ne prekida zajedničko izvršavanje
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "inflight": len(self._inflight)}
+
+    def _release(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Izbjegni "exception was never retrieved" kada su svi čekači otkazani
+        if not task.cancelled():
+            task.exception()
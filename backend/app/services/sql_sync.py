@@ -0,0 +1,191 @@
+import asyncio
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from app.agents.sql_sync import SQLSyncAgent
+from app.agents.types import AgentStatus, ProcessingContext
+from app.core.config import settings
+from app.core.db import SessionLocal, engine
+from app.models.document import Document
+from app.models.external_source import ExternalSource, IngestJob
+from app.services.answer_cache import answer_cache
+
+
+def _lock_key(source_id: uuid.UUID) -> int:
+    """Stabilan 32-bitni ključ za pg advisory lock po izvoru."""
+    return zlib.crc32(f"sql_sync:{source_id}".encode("utf-8"))
+
+
+def run_sync(source_id: uuid.UUID, job_id: Optional[uuid.UUID] = None) -> Dict[str, Any]:
+    """
+    Jedan inkrementalni sync izvora (blokirajuće; poziva se iz threadpool-a).
+
+    Advisory lock na posebnoj konekciji sprječava da dva workera/scheduler-a
+    sinkronizuju isti izvor istovremeno. Watermark se pomjera tek nakon
+    uspješnog synca, pa ponovljeni sync nakon greške ponovo čita istu deltu
+    (nepromijenjeni redovi se preskaču po hash-u).
+
+    Args:
+        source_id: ExternalSource.id
+        job_id: postojeći IngestJob (iz API poziva); inače se pravi novi
+
+    Returns:
+        Rezultat synca (status, brojači, watermark)
+    """
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _lock_key(source_id)}).scalar()
+        lock_conn.commit()
+        if not locked:
+            if job_id:
+                _close_job(job_id, "skipped", "sync already running")
+            return {"status": "skipped", "reason": "sync already running"}
+        try:
+            return _run_locked(source_id, job_id)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _lock_key(source_id)})
+            lock_conn.commit()
+
+
+def _close_job(job_id: uuid.UUID, job_status: str, error: Optional[str]) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IngestJob).filter(IngestJob.id == job_id).update({"status": job_status, "error": error})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_locked(source_id: uuid.UUID, job_id: Optional[uuid.UUID]) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        source = db.get(ExternalSource, source_id)
+        meta = dict(source.source_metadata or {}) if source else {}
+        sync = dict(meta.get("sync") or {})
+        document = db.get(Document, uuid.UUID(sync["document_id"])) if sync.get("document_id") else None
+        if not source or not document:
+            if job_id:
+                _close_job(job_id, "failed", "source or document not found")
+            return {"status": "skipped", "reason": "source or document not found"}
+
+        job = db.get(IngestJob, job_id) if job_id else None
+        if job is None:
+            job = IngestJob(document_id=document.id, status="processing")
+            db.add(job)
+            db.commit()
+
+        def on_progress(stats):
+            job.progress = dict(stats)
+            db.commit()
+
+        agent = SQLSyncAgent(
+            db,
+            source_url=source.connection_string or settings.EXTERNAL_DB_URL,
+            query=source.query,
+            sync_config=sync,
+            max_connections=meta.get("max_connections"),
+            on_progress=on_progress
+        )
+        context = ProcessingContext(document_id=str(document.id), file_path="", filename=document.filename)
+        context = asyncio.run(agent.execute(context))
+        result = context.agent_results[-1]
+        now = db.execute(text("SELECT NOW()::timestamp")).scalar()
+
+        job.logs = [r.to_dict() for r in context.agent_results]
+        job.completed_at = now
+        if result.status == AgentStatus.FAILED:
+            job.status = "failed"
+            job.error = result.error
+            sync["last_error"] = result.error
+            if document.status != "ready":
+                document.status = "error"
+            outcome = {"status": "failed", "error": result.error}
+        else:
+            stats = context.metadata["sync_stats"]
+            job.status = "completed"
+            job.error = None
+            sync.update({"watermark": context.metadata.get("sync_watermark"), "last_stats": stats, "last_error": None})
+            document.status = "ready"
+            if stats.get("inserted") or stats.get("updated") or stats.get("deleted"):
+                document.updated_at = datetime.utcnow()
+            document.doc_metadata = {
+                **(document.doc_metadata or {}),
+                "chunks": db.execute(
+                    text("SELECT COUNT(*) FROM document_chunks WHERE document_id = :d"), {"d": document.id}
+                ).scalar(),
+                "last_sync_at": now.isoformat(),
+            }
+            outcome = {"status": "completed", **stats, "watermark": sync["watermark"]}
+        # Neuspjeli sync se ne ponavlja odmah, nego u sljedećem intervalu
+        sync["last_sync_at"] = now.isoformat()
+        source.source_metadata = {**meta, "sync": sync}
+        db.commit()
+
+        if outcome["status"] == "completed" and (outcome["inserted"] or outcome["updated"] or outcome["deleted"]):
+            answer_cache.invalidate_documents([str(document.id)])
+        return outcome
+    finally:
+        db.close()
+
+
+def due_sources(now: datetime) -> list:
+    """Izvori sa sync konfiguracijom čiji je interval istekao."""
+    db = SessionLocal()
+    try:
+        due = []
+        for source in db.query(ExternalSource).all():
+            sync = (source.source_metadata or {}).get("sync") or {}
+            interval = sync.get("interval_minutes")
+            if not interval or not sync.get("document_id"):
+                continue
+            last = sync.get("last_sync_at")
+            if last is None or datetime.fromisoformat(last) + timedelta(minutes=interval) <= now:
+                due.append(source.id)
+        return due
+    finally:
+        db.close()
+
+
+def _db_now() -> datetime:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT NOW()::timestamp")).scalar()
+
+
+class SyncScheduler:
+    """Periodični inkrementalni sync izvora sa podešenim interval_minutes."""
+
+    def __init__(self, poll_seconds: int = 60):
+        self.poll_seconds = poll_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # last_sync_at se upisuje po satu baze, pa se i rok računa po njemu
+                now = await asyncio.to_thread(_db_now)
+                for source_id in await asyncio.to_thread(due_sources, now):
+                    await asyncio.to_thread(run_sync, source_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"SQL sync scheduler error: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+
+sync_scheduler = SyncScheduler(poll_seconds=settings.SQL_SYNC_POLL_SECONDS)
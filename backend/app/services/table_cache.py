@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+
+Signature = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _nbytes(value: Any) -> int:
+    """Procjena memorije keširane vrijednosti."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(getattr(value, "nbytes", None), int):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class TableCache:
+    """
+    Procesni LRU keš tabela i izvedenih oblika (normalizovan frame, tekst redova).
+
+    Ključ je (putanja, mtime, veličina) + oblik; izmjena fajla automatski
+    poništava sve njegove zapise. Ograničen je ukupnom memorijom, ne brojem zapisa;
+    potpis fajla se čuva samo dok fajl ima bar jedan zapis u kešu.
+    Keširane vrijednosti se dijele između poziva i ne smiju se mijenjati; vrijednost
+    koja lijeno raste (npr. TableSearchIndex) javlja novu veličinu preko resize().
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int]]" = OrderedDict()
+        self._signatures: Dict[str, Signature] = {}
+        self._path_entries: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidated": 0}
+
+    def get(self, path: Path, form: Hashable) -> Any:
+        """Keširana vrijednost ili None (zapis izmijenjenog fajla se odbacuje)."""
+        key, signature = self._key(path, form)
+        with self._lock:
+            self._check_signature(key[0], signature)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, path: Path, form: Hashable, value: Any) -> None:
+        """Keširaj vrijednost; najstariji zapisi se izbacuju dok se ne uklopi u max_bytes."""
+        key, signature = self._key(path, form)
+        size = _nbytes(value)
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            # Fajl se promijenio od učitavanja - ne keširaj zastarjelu vrijednost
+            if self._signatures.get(key[0]) not in (None, signature):
+                return
+            self._signatures[key[0]] = signature
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            else:
+                self._path_entries[key[0]] = self._path_entries.get(key[0], 0) + 1
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def resize(self, path: Path, form: Hashable) -> None:
+        """Ponovo izmjeri zapis čija je vrijednost narasla nakon keširanja i izbaci višak."""
+        key = (str(Path(path).resolve()), form)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            size = _nbytes(entry[0])
+            self._bytes += size - entry[1]
+            self._entries[key] = (entry[0], size)
+            if size > self.max_bytes:
+                self._pop(key)
+            self._evict()
+
+    def get_or_load(self, path: Path, form: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Vrati keširani oblik tabele ili ga izračunaj loader-om i keširaj.
+
+        Args:
+            path: Fajl tabele
+            form: Oznaka oblika, npr. ("col", "iznos", False) ili ("row_text", True)
+            loader: Funkcija bez argumenata koja računa vrijednost
+
+        Returns:
+            Keširana ili novoizračunata vrijednost
+        """
+        value = self.get(path, form)
+        if value is None:
+            # Učitavanje van lock-a; paralelni promašaji na istom ključu samo dupliraju posao
+            signature = self._key(path, form)[1]
+            value = loader()
+            # Fajl se promijenio tokom učitavanja - ne keširaj zastarjelu vrijednost
+            if self._key(path, form)[1] == signature:
+                self.put(path, form, value)
+        return value
+
+    def invalidate(self, path: Path) -> None:
+        """Izbaci sve zapise za dati fajl."""
+        with self._lock:
+            self._drop(str(Path(path).resolve()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+            self._path_entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "tables": len({path for path, _ in self._entries}),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # -------- helpers --------
+    @staticmethod
+    def _key(path: Path, form: Hashable) -> Tuple[Tuple[str, Hashable], Signature]:
+        resolved = Path(path).resolve()
+        st = os.stat(resolved)
+        return (str(resolved), form), (st.st_mtime_ns, st.st_size)
+
+    def _check_signature(self, path: str, signature: Signature) -> None:
+        current = self._signatures.get(path)
+        if current is not None and current != signature:
+            self._drop(path)
+            self._stats["invalidated"] += 1
+
+    def _pop(self, key: Tuple[str, Hashable]) -> None:
+        """Izbaci jedan zapis; sa zadnjim zapisom fajla odlazi i njegov potpis."""
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+        remaining = self._path_entries.get(key[0], 1) - 1
+        if remaining > 0:
+            self._path_entries[key[0]] = remaining
+        else:
+            self._path_entries.pop(key[0], None)
+            self._signatures.pop(key[0], None)
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            self._pop(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _drop(self, path: str) -> None:
+        for key in [k for k in self._entries if k[0] == path]:
+            self._pop(key)
+        self._signatures.pop(path, None)
+
+
+table_cache = TableCache(max_bytes=settings.TABLE_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,179 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.table_cache import table_cache
+from app.services.table_store import read_table
+
+NUMERIC_OPS = {
+    "<=": np.less_equal, "<": np.less, ">=": np.greater_equal,
+    ">": np.greater, "==": np.equal, "!=": np.not_equal,
+}
+
+
+class TableSearchIndex:
+    """
+    Vektorizovani indeks jedne tabele za TableSearchAgent.
+
+    Gradi se jednom po tabeli (keš po putanji, mtime i veličini):
+      - display: tabela kao tekst, sa sažetim razmacima
+      - columns: normalizovane (po potrebi lowercase) kolone kao NumPy nizovi
+      - invertovani indeks token -> vrijednosti ćelija -> redovi za full-text
+
+    Token upita nema razmaka, pa se pojavljuje u tekstu reda samo unutar
+    jednog tokena tog reda; podstring pretraga nad rječnikom tokena daje
+    isti rezultat kao pretraga nad spojenim tekstom reda.
+    """
+
+    def __init__(self, df: pd.DataFrame, normalize_spaces: bool = True, case_insensitive: bool = True):
+        self.case_insensitive = case_insensitive
+        self.n_rows = len(df)
+        display: Dict[str, np.ndarray] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        cell_codes: List[np.ndarray] = []
+        cell_values: List[np.ndarray] = []
+        # Normalizacija se radi nad jedinstvenim vrijednostima kolone, ne nad svakom ćelijom
+        for col in df.columns:
+            codes, uniques = pd.factorize(df[col].astype(str).to_numpy(dtype=object))
+            s = pd.Series(uniques, dtype=object)
+            if normalize_spaces:
+                s = s.str.strip().str.replace(r"\s+", " ", regex=True)
+            lowered = (s.str.lower() if case_insensitive else s).to_numpy(dtype=object)
+            display[col] = s.to_numpy(dtype=object)[codes]
+            self.columns[col] = lowered[codes]
+            cell_codes.append(codes)
+            cell_values.append(lowered)
+        self.display = pd.DataFrame(display, index=pd.RangeIndex(self.n_rows), columns=list(df.columns))
+        self._numeric: Dict[str, np.ndarray] = {}
+        # Poziva se kad numerički pogled naraste, da keš ponovo izmjeri indeks
+        self.on_resize: Optional[Callable[[], None]] = None
+        self._build_inverted_index(cell_codes, cell_values)
+
+    # -------- upiti --------
+    def all_rows(self) -> np.ndarray:
+        return np.ones(self.n_rows, dtype=bool)
+
+    def equals_mask(self, column: str, value: Any) -> Optional[np.ndarray]:
+        """Maska redova gdje je kolona jednaka vrijednosti; None za nepoznatu kolonu."""
+        values = self.columns.get(column)
+        if values is None:
+            return None
+        return values == self._norm(value)
+
+    def contains_mask(self, column: str, terms: Iterable[Any]) -> Optional[np.ndarray]:
+        """Maska redova gdje kolona sadrži bilo koji od termina."""
+        values = self.columns.get(column)
+        terms = [self._norm(t) for t in terms]
+        if values is None or not terms:
+            return None
+        s = pd.Series(values, copy=False)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for term in terms:
+            mask |= s.str.contains(term, regex=False).to_numpy(dtype=bool)
+        return mask
+
+    def numeric_mask(self, column: str, op: str, threshold: float) -> Optional[np.ndarray]:
+        """Maska numeričkog poređenja (NaN prolazi samo za "!=", kao u pandas-u)."""
+        if column not in self.columns or op not in NUMERIC_OPS:
+            return None
+        nums = self._numeric.get(column)
+        if nums is None:
+            nums = pd.to_numeric(self.display[column], errors="coerce").to_numpy(dtype=float)
+            self._numeric[column] = nums
+            if self.on_resize is not None:
+                self.on_resize()
+        with np.errstate(invalid="ignore"):
+            return NUMERIC_OPS[op](nums, float(threshold))
+
+    def fulltext_mask(self, query: str) -> np.ndarray:
+        """Redovi koji sadrže svaki token upita (podstring, AND)."""
+        mask = self.all_rows()
+        for token in self._norm(query).split():
+            if not mask.any():
+                break
+            mask &= self._token_rows(token)
+        return mask
+
+    @property
+    def nbytes(self) -> int:
+        total = int(self.display.memory_usage(deep=True).sum())
+        total += sum(int(pd.Series(v, copy=False).memory_usage(deep=True)) for v in self.columns.values())
+        total += int(self._vocab.memory_usage(deep=True))
+        total += sum(int(a.nbytes) for a in (self._token_offsets, self._token_values, self._value_offsets, self._value_rows))
+        total += sum(int(v.nbytes) for v in self._numeric.values())
+        return total
+
+    # -------- helpers --------
+    def _norm(self, value: Any) -> str:
+        text = str(value)
+        return text.lower() if self.case_insensitive else text
+
+    def _build_inverted_index(self, cell_codes: List[np.ndarray], cell_values: List[np.ndarray]) -> None:
+        """
+        Dvonivojski indeks: token -> jedinstvene vrijednosti ćelija -> redovi.
+        Tokenizuju se samo jedinstvene vrijednosti; redovi po vrijednosti su sortirani nizovi.
+        """
+        # Globalni id vrijednosti = pomak kolone + kod unutar kolone
+        shifts = np.cumsum([0] + [len(v) for v in cell_values])
+        n_values = int(shifts[-1])
+        values = np.concatenate(cell_values) if cell_values else np.empty(0, dtype=object)
+        value_ids = np.concatenate([c.astype(np.int64) + shifts[i] for i, c in enumerate(cell_codes)]) \
+            if cell_codes else np.empty(0, dtype=np.int64)
+        rows = np.tile(np.arange(self.n_rows, dtype=np.int32), len(cell_codes))
+        order = np.argsort(value_ids, kind="stable")
+        self._value_rows = rows[order]
+        self._value_offsets = np.concatenate(([0], np.cumsum(np.bincount(value_ids, minlength=n_values)))).astype(np.int64)
+
+        tokens = pd.Series(values, dtype=object).str.split().explode().dropna()
+        pairs = pd.DataFrame({"token": tokens.to_numpy(dtype=object), "value": tokens.index.to_numpy(dtype=np.int64)})
+        pairs = pairs.drop_duplicates()
+        codes, vocab = pd.factorize(pairs["token"])
+        order = np.argsort(codes, kind="stable")
+        self._token_values = pairs["value"].to_numpy(dtype=np.int64)[order]
+        self._token_offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(vocab))))).astype(np.int64)
+        self._vocab = pd.Series(np.asarray(vocab, dtype=object), dtype=object)
+
+    def _token_rows(self, token: str) -> np.ndarray:
+        mask = np.zeros(self.n_rows, dtype=bool)
+        token_ids = np.flatnonzero(self._vocab.str.contains(token, regex=False).to_numpy(dtype=bool))
+        if len(token_ids):
+            value_ids = np.unique(_gather(self._token_offsets, self._token_values, token_ids))
+            mask[_gather(self._value_offsets, self._value_rows, value_ids)] = True
+        return mask
+
+
+def _gather(offsets: np.ndarray, data: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Spoji segmente data[offsets[i]:offsets[i+1]] za sve ids bez Python petlje."""
+    starts = offsets[ids]
+    lengths = offsets[ids + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return data[:0]
+    # Indeks unutar izlaza -> pozicija u data: početak segmenta + pomak unutar segmenta
+    segment_starts = np.cumsum(lengths) - lengths
+    positions = np.arange(total, dtype=np.int64) - np.repeat(segment_starts - starts, lengths)
+    return data[positions]
+
+
+def get_search_index(path: Path, normalize_spaces: bool = True, case_insensitive: bool = True) -> TableSearchIndex:
+    """Indeks tabele iz table_cache-a; gradi se samo pri prvom upitu ili nakon izmjene fajla."""
+    path = Path(path)
+    form = ("search_index", normalize_spaces, case_insensitive)
+
+    def build() -> TableSearchIndex:
+        index = TableSearchIndex(read_table(path, as_text=True), normalize_spaces, case_insensitive)
+        index.on_resize = lambda: table_cache.resize(path, form)
+        return index
+
+    return table_cache.get_or_load(path, form, build)
+
+
+def combine_masks(masks: List[Optional[np.ndarray]], n_rows: int) -> np.ndarray:
+    """AND svih maski; None (nepoznata kolona) se ignoriše kao i ranije."""
+    mask = np.ones(n_rows, dtype=bool)
+    for m in masks:
+        if m is not None:
+            mask &= m
+    return mask
@@ -0,0 +1,250 @@
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Ključne riječi agregacija (bosanski + engleski); redoslijed određuje prioritet.
+# Riječ se poredi cijela; "*" na kraju označava osnovu koja pokriva sve padežne
+# oblike ("ukupn*" -> ukupno, ukupna, ...). Kratke riječi ("min", "sum") se nikad
+# ne porede kao prefiks da ne bi pogodile "ministarstvo" ili "sumnja".
+AGGREGATE_KEYWORDS = {
+    "sum": ("ukupn*", "ukupan", "zbir", "zbira", "zbiru", "zbirno", "suma", "sumu", "sume", "sum",
+            "total", "totals"),
+    "avg": ("prosje*", "prosek", "proseka", "prosecan", "prosecno", "prosecna", "prosecni",
+            "average", "avg", "mean"),
+    "max": ("najvec*", "maksimum*", "maksimaln*", "max", "maximum", "highest", "largest"),
+    "min": ("najmanj*", "minimum*", "minimaln*", "min", "lowest", "smallest"),
+    "count": ("koliko ima", "broj", "broja", "broju", "count", "how many"),
+}
+GROUPBY_MARKERS = ("po", "by", "per", "prema", "za svaki", "za svaku", "for each")
+SEARCH_MARKERS = ("izlistaj", "prikazi redove", "prikazi sve", "pronadji redove", "nadji redove", "list rows", "show rows")
+COUNT_NOUNS = ("redova", "zapisa", "stavki", "rows", "records")
+
+_STOPWORDS = {
+    "koliko", "ima", "iznosi", "je", "su", "sve", "svih", "iz", "za", "u", "na", "od", "do", "sa", "i",
+    "tabeli", "tabele", "tabela", "gdje", "koji", "koja", "koje", "the", "of", "in", "by", "what", "is",
+    "kolika", "koliki", "kolike", "sta", "sto", "bio", "bila", "bilo", "mi", "daj", "izracunaj",
+    "for", "and", "with", "all", "each", "are", "was", "calculate", "svaki", "svaku", "per", "prema",
+}
+
+
+def _fold(text: str) -> str:
+    """Mala slova bez dijakritike (č/ć -> c, đ -> dj, ...)."""
+    text = text.lower().replace("đ", "dj")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", _fold(text))
+
+
+def _word_tokens(text: str) -> List[Tuple[str, str]]:
+    """Tokeni upita (kao _tokens) uz originalnu riječ iz koje su nastali (za vrijednosti filtera)."""
+    return [(t, word) for word in re.findall(r"[^\W_]+", text) for t in _tokens(word)]
+
+
+def _stem_match(a: str, b: str) -> bool:
+    """Podudaranje oblika riječi ("gradu" ~ "grad", "cities" ~ "city")."""
+    if len(a) < 3 or len(b) < 3:
+        return False
+    common = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        common += 1
+    return common >= max(3, min(len(a), len(b)) - 1)
+
+
+def _column_positions(query_tokens: List[str], column: str) -> List[int]:
+    """Pozicije tokena upita koji odgovaraju nekom tokenu naziva kolone."""
+    col_tokens = [t for t in _tokens(column) if len(t) >= 3 and t not in _STOPWORDS]
+    # Nepostojano a: "kupac" -> "kupca", "iznosilac" -> "iznosioca"
+    col_tokens += [t[:-2] + t[-1] for t in col_tokens if len(t) >= 5 and t[-2] == "a"]
+    return [i for i, qt in enumerate(query_tokens) if any(_stem_match(qt, ct) for ct in col_tokens)]
+
+
+def _keyword_hit(key: str, folded: str, tokens: List[str]) -> bool:
+    """Cijela riječ/fraza ili, za ključeve sa "*", token koji počinje osnovom."""
+    if " " in key:
+        return re.search(rf"\b{re.escape(key)}\b", folded) is not None
+    if key.endswith("*"):
+        return any(t.startswith(key[:-1]) for t in tokens)
+    return key in tokens
+
+
+def looks_tabular(query: str) -> bool:
+    """Jeftina provjera prije učitavanja kataloga tabela."""
+    folded = _fold(query)
+    return _detect_op(folded, _tokens(query)) is not None or any(m in folded for m in SEARCH_MARKERS)
+
+
+def _detect_op(folded: str, tokens: List[str]) -> Optional[str]:
+    for op, keys in AGGREGATE_KEYWORDS.items():
+        if any(_keyword_hit(key, folded, tokens) for key in keys):
+            return op
+    return None
+
+
+def _keyword_positions(tokens: List[str]) -> Set[int]:
+    """Pozicije tokena koji pripadaju ključnim riječima agregacije."""
+    found: Set[int] = set()
+    for keys in AGGREGATE_KEYWORDS.values():
+        for key in keys:
+            if " " in key:
+                parts = key.split()
+                for i in range(len(tokens) - len(parts) + 1):
+                    if tokens[i:i + len(parts)] == parts:
+                        found.update(range(i, i + len(parts)))
+            else:
+                found.update(i for i, t in enumerate(tokens) if _keyword_hit(key, "", [t]))
+    return found
+
+
+def _detect_filters(tokens: List[Tuple[str, str]], used: Set[int],
+                    mentioned: Dict[str, List[int]], candidates: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Vrijednosti filtera: riječi koje stoje odmah iza pomenute tekstualne kolone
+    ("za grad Sarajevo" -> {grad: "Sarajevo"}). Ako ostane sadržajna riječ koja
+    nije ni kolona, ni ključna riječ, ni vrijednost uz kolonu, vraća None:
+    upit ima uslov koji se ne može primijeniti, pa ide na RAG umjesto da vrati
+    agregat nad cijelom tabelom.
+    """
+    filters: Dict[str, str] = {}
+    assigned: Set[int] = set()
+    for col in candidates:
+        for pos in mentioned.get(col, []):
+            i = pos + 1
+            while i < len(tokens) and tokens[i][0] in _STOPWORDS and i not in used:
+                i += 1
+            words: List[str] = []
+            while i < len(tokens) and i not in used and tokens[i][0] not in _STOPWORDS:
+                if not words or words[-1] != tokens[i][1]:
+                    words.append(tokens[i][1])
+                assigned.add(i)
+                i += 1
+            if words and col not in filters:
+                filters[col] = " ".join(words)
+    leftover = [i for i, (t, _) in enumerate(tokens)
+                if i not in used and i not in assigned and t not in _STOPWORDS]
+    return None if leftover else filters
+
+
+def _detect_groupby(query_tokens: List[str], folded: str, columns: List[str]) -> Optional[str]:
+    for marker in GROUPBY_MARKERS:
+        for m in re.finditer(rf"\b{re.escape(marker)}\s+([a-z0-9_]+)(?:\s+([a-z0-9_]+))?", folded):
+            following = [t for t in m.groups() if t]
+            for col in columns:
+                if _column_positions(following, col):
+                    return col
+    return None
+
+
+def detect_table_intent(query: str, tables: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Prepoznaj agregacijsko ili tabelarno pitanje i mapiraj ga na ingestovanu tabelu.
+
+    Args:
+        query: Korisnikov upit
+        tables: Katalog tabela; svaka sa 'table_path', 'columns', 'numeric_columns',
+                'rows', 'document_id' i 'filename'
+
+    Returns:
+        Dict sa kind ("aggregate"|"search"), table, op, column, groupby, filters
+        ({kolona: vrijednost}), fulltext ili None ako upit nije tabelarni
+    """
+    folded = _fold(query)
+    word_tokens = _word_tokens(query)
+    tokens = [t for t, _ in word_tokens]
+    op = _detect_op(folded, tokens)
+    wants_rows = any(m in folded for m in SEARCH_MARKERS)
+    if op is None and not wants_rows:
+        return None
+
+    best = None
+    for table in tables:
+        columns = [str(c) for c in table.get("columns") or []]
+        if not columns or not table.get("table_path"):
+            continue
+        mentioned = {c: _column_positions(tokens, c) for c in columns}
+        mentioned = {c: pos for c, pos in mentioned.items() if pos}
+        if not mentioned:
+            continue
+
+        intent: Dict[str, Any] = {"table": table, "kind": "aggregate" if op else "search",
+                                  "op": op, "column": None, "groupby": None, "filters": {}, "fulltext": None}
+        if op:
+            groupby = _detect_groupby(tokens, folded, columns)
+            numeric = [c for c in table.get("numeric_columns") or [] if c in mentioned and c != groupby]
+            numeric.sort(key=lambda c: mentioned[c][0])
+            if op == "count":
+                if not groupby and not any(n in folded for n in COUNT_NOUNS):
+                    continue
+            elif not numeric:
+                continue
+            intent["groupby"] = groupby
+            intent["column"] = numeric[0] if numeric and op != "count" else None
+            used = {i for pos in mentioned.values() for i in pos} | _keyword_positions(tokens)
+            used |= {i for i, t in enumerate(tokens) if t in COUNT_NOUNS or t in GROUPBY_MARKERS}
+            # Naziv tabele/fajla u upitu ("u tabeli prodaja") nije uslov
+            used |= set(_column_positions(tokens, re.sub(r"\.\w+$", "", str(table.get("filename") or ""))))
+            numeric_all = set(table.get("numeric_columns") or [])
+            text_columns = [c for c in mentioned if c not in numeric_all and c != groupby]
+            filters = _detect_filters(word_tokens, used, mentioned, text_columns)
+            if filters is None:
+                continue
+            intent["filters"] = filters
+        else:
+            used = {i for pos in mentioned.values() for i in pos}
+            marker_tokens = set(_tokens(" ".join(SEARCH_MARKERS)))
+            terms = [t for i, t in enumerate(tokens)
+                     if i not in used and len(t) >= 3 and t not in _STOPWORDS and t not in marker_tokens]
+            if not terms:
+                continue
+            intent["fulltext"] = " ".join(terms)
+
+        score = (len(mentioned), int(table.get("rows") or 0))
+        if best is None or score > best[0]:
+            best = (score, intent)
+    return best[1] if best else None
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float) and value != value:
+        return "n/a"
+    if isinstance(value, float):
+        return f"{value:,.2f}".replace(",", " ") if value != int(value) else f"{int(value):,}".replace(",", " ")
+    if isinstance(value, int):
+        return f"{value:,}".replace(",", " ")
+    return str(value)
+
+
+OP_LABELS = {"sum": "Ukupno", "avg": "Prosjek", "min": "Minimum", "max": "Maksimum", "count": "Broj redova"}
+
+
+def format_aggregate(intent: Dict[str, Any], result: Any, max_rows: int = 20) -> str:
+    """Deterministički tekstualni odgovor iz rezultata TableAggregateAgent-a."""
+    op = intent["op"]
+    label = OP_LABELS[op] + (f" ({intent['column']})" if intent.get("column") else "")
+    if intent.get("filters"):
+        label += ", " + ", ".join(f"{c} = {v}" for c, v in intent["filters"].items())
+    source = intent["table"].get("filename") or "tabela"
+    if intent.get("groupby"):
+        rows = sorted(result or [], key=lambda r: (r.get(op) is None, -(r.get(op) or 0)))
+        lines = [f"{label} po '{intent['groupby']}' — izvor: {source}"]
+        for r in rows[:max_rows]:
+            lines.append(f"- {_fmt(r.get(intent['groupby']))}: {_fmt(r.get(op))}")
+        if len(rows) > max_rows:
+            lines.append(f"... još {len(rows) - max_rows} grupa")
+        return "\n".join(lines)
+    return f"{label}: {_fmt((result or {}).get(op))} — izvor: {source}"
+
+
+def format_matches(intent: Dict[str, Any], count: int, preview: List[Dict[str, Any]], max_rows: int = 10) -> str:
+    """Deterministički odgovor iz rezultata TableSearchAgent-a."""
+    source = intent["table"].get("filename") or "tabela"
+    lines = [f"Pronađeno redova: {count} (pretraga: '{intent['fulltext']}') — izvor: {source}"]
+    for row in preview[:max_rows]:
+        lines.append("- " + ", ".join(f"{k}: {v}" for k, v in row.items() if v not in ("", None)))
+    if count > max_rows:
+        lines.append(f"... još {count - max_rows} redova")
+    return "\n".join(lines)
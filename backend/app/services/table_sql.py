@@ -0,0 +1,461 @@
+import csv
+import io
+import re
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.agents.ingest.meta import DATE_PATTERNS
+from app.core.config import settings
+from app.services.table_store import PARQUET_AVAILABLE, pq
+
+# Fizički nazivi kolona su generisani (c_0, c_1, ...) - originalni nazivi žive u katalogu,
+# pa korisnički input nikad ne ulazi u SQL kao identifikator
+ROW_ID = "_row_id"
+ROW_TEXT = "_row_text"
+NUMERIC_SQL_TYPES = ("BIGINT", "DOUBLE PRECISION", "NUMERIC")
+NUMERIC_TEXT_RE = r"^\s*-?\d+(\.\d+)?([eE][-+]?\d+)?\s*$"
+
+SQL_OPS = {"<=": "<=", "<": "<", ">=": ">=", ">": ">", "==": "=", "!=": "IS DISTINCT FROM"}
+
+
+def sql_type(dtype: str, semantic: Optional[str] = None) -> str:
+    """
+    Postgres tip kolone iz dtype-a table store-a i (opciono) tipa koji je predložio TableAgent.
+
+    Args:
+        dtype: pandas dtype iz šeme (Int64, Float64, string, date, decimal, ...)
+        semantic: text|number|date|currency|boolean (TableAgent column_types)
+
+    Returns:
+        SQL tip kolone
+    """
+    d = (dtype or "").lower()
+    if d.startswith(("int", "uint")):
+        return "BIGINT"
+    if d.startswith("float"):
+        return "DOUBLE PRECISION"
+    if d.startswith("decimal"):
+        return "NUMERIC"
+    if d.startswith("bool"):
+        return "BOOLEAN"
+    if d.startswith("datetime"):
+        return "TIMESTAMP"
+    if d == "date" or semantic == "date":
+        return "DATE"
+    return "TEXT"
+
+
+def qualified_name(table_id: Any) -> str:
+    return f'{settings.TABLE_SQL_SCHEMA}.t_{str(table_id).replace("-", "")}'
+
+
+def _date_columns(path: Path, schema: List[Dict[str, Any]]) -> List[str]:
+    """Tekst kolone koje su u cijelosti datumi (TableAgent hint ili uzorak liči na datum)."""
+    text_cols = [c["name"] for c in schema if sql_type(c.get("dtype")) == "TEXT"]
+    if not text_cols:
+        return []
+    sample = next(_iter_batches(path, 50, columns=text_cols), pd.DataFrame())
+    candidates = []
+    for col in schema:
+        name = col["name"]
+        if name not in sample.columns:
+            continue
+        values = [v for v in sample[name].astype("string").fillna("") if v]
+        looks_like_date = bool(values) and all(any(p.fullmatch(v) for p in DATE_PATTERNS) for v in values)
+        if col.get("semantic") == "date" or looks_like_date:
+            candidates.append(name)
+    # Potvrda nad cijelom kolonom, batch po batch
+    dates = []
+    for name in candidates:
+        ok = False
+        for batch in _iter_batches(path, settings.TABLE_SQL_BATCH_ROWS, columns=[name]):
+            s = batch[name].astype("string").fillna("")
+            non_empty = s[s != ""]
+            if len(non_empty) and _parse_dates(non_empty).isna().any():
+                ok = False
+                break
+            ok = ok or bool(len(non_empty))
+        if ok:
+            dates.append(name)
+    return dates
+
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    return pd.to_datetime(s, dayfirst=True, errors="coerce", format="mixed")
+
+
+def _iter_batches(path: Path, batch_rows: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Tabela u batch-evima - ni ingest ni COPY ne drže cijelu tabelu u memoriji."""
+    suffix = path.suffix.lower()
+    if suffix == ".parquet" and PARQUET_AVAILABLE:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.to_pandas()
+    elif suffix == ".csv":
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=batch_rows, usecols=columns)
+    else:
+        yield pd.read_excel(path, dtype=str, keep_default_na=False, usecols=columns)
+
+
+def _copy_rows(cursor, statement: str, buf: io.StringIO) -> None:
+    """COPY FROM STDIN za psycopg2 (copy_expert) i psycopg 3 (cursor.copy)."""
+    buf.seek(0)
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(statement, buf)
+    else:
+        with cursor.copy(statement) as copy:
+            copy.write(buf.getvalue())
+
+
+def load_table(db: Session, table_id: Any, table_path: str, schema: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Kreiraj tipizovanu Postgres tabelu i napuni je COPY-jem iz table store-a.
+
+    Args:
+        db: SQLAlchemy sesija (COPY ide kroz njenu konekciju i transakciju)
+        table_id: ID zapisa u ingested_tables (određuje ime tabele)
+        table_path: Parquet/CSV fajl iz table store-a
+        schema: [{name, dtype, semantic?}] iz kataloga
+
+    Returns:
+        Dict sa 'name' (schema.tabela), 'columns' ([{name, sql_name, sql_type}]) i 'rows'
+    """
+    path = Path(table_path)
+    dates = set(_date_columns(path, schema))
+    columns = [
+        {"name": c["name"], "sql_name": f"c_{i}",
+         "sql_type": "DATE" if c["name"] in dates else sql_type(c.get("dtype"), c.get("semantic"))}
+        for i, c in enumerate(schema)
+    ]
+    name = qualified_name(table_id)
+    ddl = ", ".join(f'{c["sql_name"]} {c["sql_type"]}' for c in columns)
+    db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {settings.TABLE_SQL_SCHEMA}"))
+    db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    db.execute(text(f"CREATE TABLE {name} ({ROW_ID} BIGINT PRIMARY KEY, {ddl}{', ' if ddl else ''}{ROW_TEXT} TEXT)"))
+
+    target = ", ".join([ROW_ID, *(c["sql_name"] for c in columns), ROW_TEXT])
+    statement = f"COPY {name} ({target}) FROM STDIN WITH (FORMAT csv, NULL '')"
+    cursor = db.connection().connection.cursor()
+    rows = 0
+    try:
+        for batch in _iter_batches(path, settings.TABLE_SQL_BATCH_ROWS):
+            out = pd.DataFrame({ROW_ID: range(rows, rows + len(batch))})
+            cells = []
+            for col in columns:
+                s = batch[col["name"]].astype("string").fillna("") if col["name"] in batch.columns \
+                    else pd.Series([""] * len(batch), dtype="string")
+                cells.append(s.reset_index(drop=True))
+                if col["sql_type"] == "DATE":
+                    parsed = _parse_dates(s.reset_index(drop=True).replace("", pd.NA))
+                    out[col["sql_name"]] = parsed.dt.strftime("%Y-%m-%d").fillna("")
+                else:
+                    out[col["sql_name"]] = s.reset_index(drop=True)
+            # Tekst reda kao u TableSearchIndex-u: sažeti razmaci, mala slova
+            row_text = cells[0].str.cat(cells[1:], sep=" ") if cells else pd.Series([""] * len(batch), dtype="string")
+            out[ROW_TEXT] = row_text.str.replace(r"\s+", " ", regex=True).str.strip().str.lower()
+            buf = io.StringIO()
+            out.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+            _copy_rows(cursor, statement, buf)
+            rows += len(batch)
+    finally:
+        cursor.close()
+
+    # Indeksi poslije punjenja (brže od održavanja tokom COPY-ja)
+    short = name.split(".")[-1]
+    db.execute(text(f"CREATE INDEX IF NOT EXISTS {short}_rowtext_trgm ON {name} USING gin ({ROW_TEXT} gin_trgm_ops)"))
+    for col in columns[:settings.TABLE_SQL_INDEXED_COLUMNS]:
+        # Tekst kolone se porede case-insensitive (lower(c) = :v), ostale direktno
+        expr = f'(lower({col["sql_name"]}))' if col["sql_type"] == "TEXT" else col["sql_name"]
+        db.execute(text(f'CREATE INDEX IF NOT EXISTS {short}_{col["sql_name"]} ON {name} ({expr})'))
+    db.execute(text(f"ANALYZE {name}"))
+    return {"name": name, "columns": columns, "rows": rows}
+
+
+def drop_table(db: Session, name: Optional[str]) -> None:
+    """Obriši SQL kopiju tabele (ime dolazi iz kataloga, ne od korisnika)."""
+    if name and re.fullmatch(rf"{re.escape(settings.TABLE_SQL_SCHEMA)}\.t_[0-9a-f]{{32}}", name):
+        db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+
+
+def drop_unreferenced_tables(db: Session, document_ids: List[Any]) -> None:
+    """
+    Obriši SQL kopije tabela datih dokumenata koje ne referencira nijedan drugi
+    dokument (dedup klonovi dijele kopiju sa izvorom). Poziva se prije brisanja dokumenata.
+    """
+    rows = db.execute(
+        text("""
+            SELECT DISTINCT t.sql_table FROM ingested_tables t
+            WHERE t.document_id = ANY(:ids) AND t.sql_table IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM ingested_tables o
+                  WHERE o.sql_table = t.sql_table AND NOT (o.document_id = ANY(:ids))
+              )
+        """),
+        {"ids": [uuid.UUID(str(i)) for i in document_ids]}
+    ).all()
+    for (name,) in rows:
+        drop_table(db, name)
+
+
+def drop_catalog_tables(db: Session, table_ids: List[Any]) -> int:
+    """
+    Ukloni date tabele iz kataloga i njihove SQL kopije koje ne referencira
+    nijedan drugi unos kataloga (npr. tabele neuspjele nove verzije). Commit radi pozivalac.
+
+    Returns:
+        Broj uklonjenih tabela iz kataloga
+    """
+    if not table_ids:
+        return 0
+    params = {"ids": [uuid.UUID(str(i)) for i in table_ids]}
+    rows = db.execute(
+        text("""
+            SELECT DISTINCT t.sql_table FROM ingested_tables t
+            WHERE t.id = ANY(:ids) AND t.sql_table IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM ingested_tables o
+                  WHERE o.sql_table = t.sql_table AND NOT (o.id = ANY(:ids))
+              )
+        """),
+        params
+    ).all()
+    for (name,) in rows:
+        drop_table(db, name)
+    return db.execute(text("DELETE FROM ingested_tables WHERE id = ANY(:ids)"), params).rowcount
+
+
+def drop_replaced_tables(db: Session, document_id: Any, keep_ids: List[Any]) -> int:
+    """
+    Ukloni katalog (i nereferenciranu SQL kopiju) tabela prethodne verzije
+    dokumenta, osim tabela koje je registrovala nova verzija. Commit radi pozivalac.
+
+    Returns:
+        Broj uklonjenih tabela iz kataloga
+    """
+    params = {"d": uuid.UUID(str(document_id)), "keep": [uuid.UUID(str(i)) for i in keep_ids]}
+    rows = db.execute(
+        text("""
+            SELECT DISTINCT t.sql_table FROM ingested_tables t
+            WHERE t.document_id = :d AND NOT (t.id = ANY(:keep)) AND t.sql_table IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM ingested_tables o
+                  WHERE o.sql_table = t.sql_table AND (o.document_id <> :d OR o.id = ANY(:keep))
+              )
+        """),
+        params
+    ).all()
+    for (name,) in rows:
+        drop_table(db, name)
+    return db.execute(
+        text("DELETE FROM ingested_tables WHERE document_id = :d AND NOT (id = ANY(:keep))"), params
+    ).rowcount
+
+
+# -------- upiti (pushdown) --------
+class _Query:
+    """Gradi parametrizovan WHERE nad katalogom kolona jedne SQL tabele."""
+
+    def __init__(self, sql_table: Dict[str, Any]):
+        self.name = sql_table["name"]
+        self.columns = {c["name"]: c for c in sql_table["columns"]}
+        self.clauses: List[str] = []
+        self.params: Dict[str, Any] = {}
+
+    def param(self, value: Any) -> str:
+        key = f"p{len(self.params)}"
+        self.params[key] = value
+        return f":{key}"
+
+    def as_text(self, col: Dict[str, Any], lower: bool = False) -> str:
+        expr = f"COALESCE({col['sql_name']}::text, '')"
+        return f"lower({expr})" if lower else expr
+
+    def as_number(self, col: Dict[str, Any]) -> str:
+        if col["sql_type"] in NUMERIC_SQL_TYPES:
+            return f"{col['sql_name']}::float8"
+        # Kao pd.to_numeric(errors="coerce"): ne-brojevi postaju NULL
+        c = col["sql_name"]
+        return f"(CASE WHEN {c}::text ~ '{NUMERIC_TEXT_RE}' THEN {c}::text::float8 END)"
+
+    def where(self) -> str:
+        return " AND ".join(self.clauses) if self.clauses else "TRUE"
+
+
+def _like(value: str) -> str:
+    return "%" + re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+
+def _plain(value: Any) -> Any:
+    """Vrijednosti iz Postgresa u JSON-prijateljske Python tipove."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def sql_search(
+    db: Session,
+    sql_table: Dict[str, Any],
+    fulltext: Optional[str] = None,
+    contains: Optional[Dict[str, Any]] = None,
+    equals: Optional[Dict[str, Any]] = None,
+    numeric: Optional[Dict[str, tuple]] = None,
+    limit: int = 50,
+    case_insensitive: bool = True,
+) -> Tuple[int, List[Dict[str, Any]], _Query]:
+    """
+    TableSearchAgent filteri kao parametrizovan SQL (trigram indeks za full-text).
+
+    Returns:
+        (broj pogodaka, preview redovi sa originalnim nazivima kolona kao tekst, upit za eksport)
+    """
+    q = _Query(sql_table)
+    for name, val in (equals or {}).items():
+        col = q.columns.get(name)
+        if col:
+            v = str(val).lower() if case_insensitive else str(val)
+            # Neprazna vrijednost nad tekst kolonom koristi indeks na lower(c)
+            expr = f"lower({col['sql_name']})" if v and case_insensitive and col["sql_type"] == "TEXT" \
+                else q.as_text(col, case_insensitive)
+            q.clauses.append(f"{expr} = {q.param(v)}")
+    for name, terms in (contains or {}).items():
+        col = q.columns.get(name)
+        terms = [str(t).lower() if case_insensitive else str(t) for t in terms or []]
+        if col and terms:
+            ors = [f"{q.as_text(col, case_insensitive)} LIKE {q.param(_like(t))}" for t in terms]
+            q.clauses.append("(" + " OR ".join(ors) + ")")
+    for name, (op, thr) in (numeric or {}).items():
+        col = q.columns.get(name)
+        if col and op in SQL_OPS:
+            q.clauses.append(f"{q.as_number(col)} {SQL_OPS[op]} {q.param(float(thr))}")
+    if fulltext:
+        if case_insensitive:
+            for token in fulltext.lower().split():
+                q.clauses.append(f"{ROW_TEXT} LIKE {q.param(_like(token))}")
+        else:
+            joined = "concat_ws(' ', " + ", ".join(q.as_text(c) for c in q.columns.values()) + ")" \
+                if q.columns else "''"
+            for token in fulltext.split():
+                q.clauses.append(f"{joined} LIKE {q.param(_like(token))}")
+
+    where = q.where()
+    count = db.execute(text(f"SELECT count(*) FROM {q.name} WHERE {where}"), q.params).scalar() or 0
+    select = ", ".join(f'{q.as_text(c)} AS {c["sql_name"]}' for c in q.columns.values()) or "1"
+    rows = db.execute(
+        text(f"SELECT {select} FROM {q.name} WHERE {where} ORDER BY {ROW_ID} LIMIT {q.param(int(limit))}"),
+        q.params,
+    ).mappings().all()
+    preview = [{c["name"]: row[c["sql_name"]] for c in q.columns.values()} for row in rows]
+    return int(count), preview, q
+
+
+def sql_export(db: Session, query: _Query, out_path: Path, batch_rows: int = 10000) -> None:
+    """Upiši sve pogotke u CSV, streamovano (server-side kursor)."""
+    select = ", ".join(f'{query.as_text(c)} AS {c["sql_name"]}' for c in query.columns.values()) or "1"
+    stmt = text(f"SELECT {select} FROM {query.name} WHERE {query.where()} ORDER BY {ROW_ID}")
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_rows), query.params)
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(query.columns))
+        for row in result:
+            writer.writerow(list(row))
+
+
+def sql_aggregate(
+    db: Session,
+    sql_table: Dict[str, Any],
+    metrics: List[Tuple[str, Optional[str], str]],
+    groupbys: List[str],
+    filters: Optional[Dict[str, tuple]] = None,
+) -> Any:
+    """
+    TableAggregateAgent metrike kao jedan GROUP BY upit (paralelna agregacija u Postgresu).
+
+    Args:
+        metrics: [(op, kolona, labela)] kao u TableAggregateAgent-u
+        groupbys: Kolone za grupisanje
+        filters: {kolona: (op, vrijednost)}
+
+    Returns:
+        {labela: vrijednost} ili [{groupby..., labela: vrijednost}]; nepoznate kolone daju None / []
+    """
+    from app.agents.table_aggregate import parse_op
+
+    q = _Query(sql_table)
+    for name, (op, val) in (filters or {}).items():
+        col = q.columns.get(name)
+        if not col:
+            continue
+        if op in ("==", "!="):
+            numeric_val = isinstance(val, (int, float)) and col["sql_type"] in NUMERIC_SQL_TYPES
+            expr = f"{col['sql_name']}::float8" if numeric_val else q.as_text(col)
+            sql_op = "=" if op == "==" else "IS DISTINCT FROM"
+            q.clauses.append(f"{expr} {sql_op} {q.param(float(val) if numeric_val else str(val))}")
+        elif op == "ieq":
+            q.clauses.append(f"btrim({q.as_text(col, lower=True)}) = {q.param(str(val).strip().lower())}")
+        elif op in SQL_OPS:
+            q.clauses.append(f"{q.as_number(col)} {SQL_OPS[op]} {q.param(float(val))}")
+
+    selects: List[str] = []
+    labels: Dict[str, str] = {}
+    for i, (op, name, label) in enumerate(metrics):
+        kind, quantile = parse_op(op)
+        col = q.columns.get(name) if name else None
+        if name and not col:
+            continue
+        alias = f"m_{i}"
+        if kind == "count":
+            expr = f"count({col['sql_name']})" if col else "count(*)"
+        elif not col:
+            continue
+        elif kind == "nunique":
+            expr = f"count(DISTINCT {col['sql_name']})"
+        elif kind == "sum":
+            # pandas sum praznog skupa je 0
+            expr = f"COALESCE(sum({q.as_number(col)}), 0)"
+        elif kind == "avg":
+            expr = f"avg({q.as_number(col)})"
+        elif kind in ("min", "max"):
+            expr = f"{kind}({q.as_number(col)})"
+        else:
+            fraction = 0.5 if kind == "median" else quantile
+            expr = f"percentile_cont(CAST({q.param(fraction)} AS float8)) WITHIN GROUP (ORDER BY {q.as_number(col)})"
+        selects.append(f"{expr} AS {alias}")
+        labels[alias] = label
+
+    groups = [q.columns.get(g) for g in groupbys]
+    if groupbys and (any(g is None for g in groups) or not selects):
+        return []
+
+    def value(raw: Any) -> Any:
+        # Bez grupisanja prazan rezultat je NaN, kao u pandas putanji
+        if raw is None:
+            return None if groupbys else float("nan")
+        return _plain(raw)
+
+    if not groupbys:
+        row = db.execute(text(f"SELECT {', '.join(selects) or '1'} FROM {q.name} WHERE {q.where()}"), q.params).mappings().one()
+        found = {labels[a]: value(row[a]) for a in labels}
+        return {label: found.get(label) for _, _, label in metrics}
+
+    keys = ", ".join(g["sql_name"] for g in groups)
+    group_cols = ", ".join(f'{g["sql_name"]} AS g_{i}' for i, g in enumerate(groups))
+    order = ", ".join(f'{g["sql_name"]} NULLS LAST' for g in groups)
+    rows = db.execute(
+        text(f"SELECT {group_cols}, {', '.join(selects)} FROM {q.name} WHERE {q.where()} GROUP BY {keys} ORDER BY {order}"),
+        q.params,
+    ).mappings().all()
+    out = []
+    for row in rows:
+        record = {g: _plain(row[f"g_{i}"]) for i, g in enumerate(groupbys)}
+        found = {labels[a]: value(row[a]) for a in labels}
+        record.update({label: found.get(label) for _, _, label in metrics})
+        out.append(record)
+    return out
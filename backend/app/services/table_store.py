@@ -0,0 +1,213 @@
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import pandas as pd
+
+from app.services.table_cache import table_cache
+
+# Optional; bez pyarrow-a tabele se čuvaju kao CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+PARQUET_AVAILABLE = pq is not None
+
+# Kanonski zapis broja: bez vodećih nula, "+", eksponenta i sa najviše 15 cifara
+# cijelog dijela (tačno u float64). Sve ostalo ("07000", "001", "1e3", "+387...")
+# su šifre/identifikatori i ostaju tekst.
+_PLAIN_NUMBER = re.compile(r"^-?(?:0|[1-9]\d{0,14})(?:\.\d+)?$")
+
+
+def unique_columns(columns: List[Any]) -> List[str]:
+    """Parquet traži jedinstvene, neprazne nazive kolona."""
+    out: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, col in enumerate(columns):
+        name = str(col).strip() if col is not None else ""
+        if not name or name.lower() in ("none", "nan"):
+            name = f"col_{i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        out.append(name)
+    return out
+
+
+def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tipizuj kolone: kolona čije su sve neprazne vrijednosti broj u kanonskom
+    zapisu postaje numerička, ostale ostaju tekst. Poštanski brojevi, šifre sa
+    vodećim nulama i sl. se ne konvertuju jer bi se izgubio originalni zapis.
+    """
+    out = pd.DataFrame(index=df.index)
+    for col in df.columns:
+        text = df[col].astype("string").str.strip()
+        non_empty = text.replace("", pd.NA).dropna()
+        if len(non_empty) and non_empty.str.fullmatch(_PLAIN_NUMBER).all():
+            out[str(col)] = pd.to_numeric(text.replace("", pd.NA), errors="coerce")
+        else:
+            out[str(col)] = text.fillna("")
+    return out
+
+
+def write_table(df: pd.DataFrame, base_path: Path) -> Dict[str, Any]:
+    """
+    Upiši tabelu u kolonarni store (Parquet; CSV fallback bez pyarrow-a).
+
+    Args:
+        df: Tabela (kolone će biti tipizovane)
+        base_path: Putanja bez ekstenzije
+
+    Returns:
+        Dict sa table_path, format, rows, cols i schema ([{name, dtype}])
+    """
+    df = df.copy()
+    df.columns = unique_columns(list(df.columns))
+    df = coerce_types(df)
+    base_path.parent.mkdir(parents=True, exist_ok=True)
+    if PARQUET_AVAILABLE:
+        path = base_path.with_suffix(".parquet")
+        df.to_parquet(path, index=False, engine="pyarrow")
+        fmt = "parquet"
+    else:
+        path = base_path.with_suffix(".csv")
+        df.to_csv(path, index=False)
+        fmt = "csv"
+    return {
+        "table_path": str(path),
+        "format": fmt,
+        "rows": int(len(df)),
+        "cols": int(len(df.columns)),
+        "schema": [{"name": c, "dtype": str(df[c].dtype)} for c in df.columns],
+    }
+
+
+def _arrow_dtype(type_) -> str:
+    """Naziv dtype-a za šemu kataloga iz Arrow tipa (isti rječnik kao write_table)."""
+    if pa.types.is_integer(type_):
+        return "int64"
+    if pa.types.is_floating(type_):
+        return "float64"
+    if pa.types.is_boolean(type_):
+        return "bool"
+    if pa.types.is_timestamp(type_):
+        return "datetime64[ns]"
+    if pa.types.is_date(type_):
+        return "date"
+    if pa.types.is_decimal(type_):
+        return "decimal"
+    return "string"
+
+
+def describe_table(path: Path) -> Dict[str, Any]:
+    """
+    Zapis za katalog postojećeg Parquet fajla (npr. SQL export) bez prepisivanja:
+    broj redova i šema čitaju se iz footer-a.
+
+    Returns:
+        Dict sa table_path, format, rows, cols i schema ([{name, dtype}])
+    """
+    path = Path(path)
+    schema = pq.read_schema(path)
+    return {
+        "table_path": str(path),
+        "format": "parquet",
+        "rows": row_count(path),
+        "cols": len(schema.names),
+        "schema": [{"name": f.name, "dtype": _arrow_dtype(f.type)} for f in schema],
+    }
+
+
+def table_columns(path: Path) -> List[str]:
+    """Nazivi kolona bez čitanja podataka (Parquet footer / CSV header)."""
+    path = Path(path)
+    return table_cache.get_or_load(path, ("columns",), lambda: _read_columns(path))
+
+
+def row_count(path: Path) -> int:
+    """Broj redova; za Parquet iz metapodataka, bez čitanja kolona."""
+    path = Path(path)
+    return table_cache.get_or_load(path, ("rows",), lambda: _read_row_count(path))
+
+
+def read_table(path: Path, columns: Optional[List[str]] = None, as_text: bool = False) -> pd.DataFrame:
+    """
+    Lijeno učitavanje tabele sa projekcijom kolona.
+
+    Kolone se keširaju pojedinačno u table_cache, pa se sa diska čitaju
+    samo one koje još nisu učitane.
+
+    Args:
+        path: .parquet, .csv ili .xlsx/.xls
+        columns: Samo ove kolone (nepostojeće se ignorišu); [] = samo broj redova
+        as_text: Sve vrijednosti kao string, prazno umjesto NA
+
+    Returns:
+        DataFrame sa očišćenim nazivima kolona
+    """
+    path = Path(path)
+    available = table_columns(path)
+    if columns is None:
+        columns = available
+    else:
+        columns = [c for c in columns if c in set(available)]
+    if not columns:
+        return pd.DataFrame(index=range(row_count(path)))
+
+    loaded: Dict[str, pd.Series] = {}
+    missing = []
+    for col in columns:
+        series = table_cache.get(path, ("col", col, as_text))
+        if series is None:
+            missing.append(col)
+        else:
+            loaded[col] = series
+    if missing:
+        # Sve nedostajuće kolone jednim čitanjem
+        df = _read_columns_data(path, missing, as_text)
+        for col in missing:
+            loaded[col] = df[col]
+            table_cache.put(path, ("col", col, as_text), df[col])
+    return pd.DataFrame({col: loaded[col] for col in columns})
+
+
+def _read_columns(path: Path) -> List[str]:
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        names = pq.read_schema(path).names
+    elif suffix == ".csv":
+        names = pd.read_csv(path, nrows=0).columns
+    else:
+        names = pd.read_excel(path, nrows=0).columns
+    return [str(c).strip() for c in names]
+
+
+def _read_row_count(path: Path) -> int:
+    if path.suffix.lower() == ".parquet":
+        return int(pq.ParquetFile(path).metadata.num_rows)
+    first = _read_columns(path)[:1]
+    return int(len(_read_columns_data(path, first, as_text=True))) if first else 0
+
+
+def _read_columns_data(path: Path, columns: List[str], as_text: bool) -> pd.DataFrame:
+    """Čitanje sa diska; CSV/Excel nazivi se porede nakon strip-a."""
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        df = pd.read_parquet(path, columns=columns)
+        if as_text:
+            df = df.astype("string").fillna("").astype(object)
+    else:
+        wanted = set(columns)
+        usecols = lambda c: str(c).strip() in wanted
+        if suffix == ".csv":
+            df = pd.read_csv(path, usecols=usecols, dtype=str if as_text else None)
+        else:
+            df = pd.read_excel(path, usecols=usecols, dtype=str if as_text else None)
+        df.columns = [str(c).strip() for c in df.columns]
+        if as_text:
+            df = df.fillna("")
+    return df
@@ -0,0 +1,50 @@
+import hashlib
+from pathlib import Path
+from typing import Tuple
+
+import aiofiles
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+
+class UploadTooLarge(Exception):
+    """Upload je prešao UPLOAD_MAX_SIZE tokom streaming-a."""
+
+
+async def save_upload(file: UploadFile, dest: Path, max_size: int = None, chunk_size: int = None) -> Tuple[int, str]:
+    """
+    Stream-uj upload na disk u blokovima fiksne veličine uz inkrementalni SHA-256.
+
+    U memoriji je samo tekući blok, pa vršna potrošnja ne zavisi od veličine
+    fajla. Limit se provjerava dok se čita (Content-Length klijenta se ne mora
+    poslati niti mu se vjeruje); djelimičan fajl se briše.
+
+    Args:
+        file: FastAPI UploadFile
+        dest: odredišna putanja
+        max_size: maksimalna veličina u bajtima (default UPLOAD_MAX_SIZE)
+        chunk_size: veličina bloka (default UPLOAD_CHUNK_SIZE)
+
+    Returns:
+        (veličina u bajtima, SHA-256 hex)
+    """
+    max_size = max_size or settings.UPLOAD_MAX_SIZE
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(dest, "wb") as out_file:
+            while True:
+                block = await file.read(chunk_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_size:
+                    raise UploadTooLarge(f"File exceeds {max_size} bytes")
+                digest.update(block)
+                await out_file.write(block)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
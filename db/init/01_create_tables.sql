@@ -14,12 +14,15 @@ CREATE TABLE IF NOT EXISTS documents (
     file_path TEXT,
     file_size INTEGER,
     mime_type VARCHAR(100),
+    content_hash VARCHAR(64),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     created_by UUID REFERENCES users(id) ON DELETE CASCADE,
     metadata JSONB DEFAULT '{}'
 );
 
 CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
 CREATE INDEX IF NOT EXISTS idx_documents_created_by ON documents(created_by);
 
 -- Document chunks table with vector embeddings
@@ -35,6 +38,8 @@ CREATE TABLE IF NOT EXISTS document_chunks (
 
 CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON document_chunks(document_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_embedding ON document_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- Inkrementalni SQL sync: lookup chunk-a po ključu reda izvora
+CREATE INDEX IF NOT EXISTS idx_chunks_row_key ON document_chunks (document_id, (metadata->>'row_key')) WHERE metadata ? 'row_key';
 CREATE INDEX IF NOT EXISTS idx_chunks_content_trgm ON document_chunks USING gin (to_tsvector('simple', content));
 
 -- Document relations table
@@ -51,6 +56,42 @@ CREATE TABLE IF NOT EXISTS document_relations (
 
 CREATE INDEX IF NOT EXISTS idx_relations_document_id ON document_relations(document_id);
 
+-- Exact-match entity index (JMBG, document IDs, emails, dates, amounts)
+CREATE TABLE IF NOT EXISTS document_entities (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    chunk_id UUID REFERENCES document_chunks(id) ON DELETE CASCADE,
+    entity_type VARCHAR(50) NOT NULL,
+    normalized_value VARCHAR(255) NOT NULL,
+    raw_value VARCHAR(500),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_entities_value_type ON document_entities(normalized_value, entity_type);
+CREATE INDEX IF NOT EXISTS idx_entities_document_id ON document_entities(document_id);
+
+-- Table catalog (columnar table store: Parquet/CSV files with schema)
+CREATE TABLE IF NOT EXISTS ingested_tables (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    table_index INTEGER NOT NULL DEFAULT 0,
+    table_path TEXT NOT NULL,
+    format VARCHAR(20) NOT NULL DEFAULT 'parquet',
+    page INTEGER,
+    sheet VARCHAR(255),
+    row_count INTEGER NOT NULL DEFAULT 0,
+    column_count INTEGER NOT NULL DEFAULT 0,
+    columns JSONB DEFAULT '[]',
+    numeric_columns JSONB DEFAULT '[]',
+    sql_table TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingested_tables_document_id ON ingested_tables(document_id);
+
+-- Tipizovane kopije ingestovanih tabela (SQL pushdown za pretragu i agregacije)
+CREATE SCHEMA IF NOT EXISTS doc_tables;
+
 -- External sources table
 CREATE TABLE IF NOT EXISTS external_sources (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -69,9 +110,18 @@ CREATE TABLE IF NOT EXISTS ingest_jobs (
     status VARCHAR(50) DEFAULT 'pending',
     logs JSONB DEFAULT '[]',
     error TEXT,
+    progress JSONB DEFAULT '{}',
     started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP
 );
 
 CREATE INDEX IF NOT EXISTS idx_ingest_jobs_document_id ON ingest_jobs(document_id);
-CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status);
+
+-- Dijeljeni token bucket-i OpenAI rate limitera (po modelu: <model>:requests i <model>:tokens)
+CREATE TABLE IF NOT EXISTS llm_rate_buckets (
+    bucket VARCHAR(255) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+    blocked_until TIMESTAMPTZ
+);
\ No newline at end of file
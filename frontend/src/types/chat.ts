@@ -13,6 +13,16 @@ export interface Verdict {
   ok: boolean
   needs_more: boolean
   notes?: string
+  tier?: 'heuristic' | 'llm' | 'table'
+  confidence?: number
+}
+
+export interface StageTrace {
+  stage: string
+  status: string
+  duration_ms: number
+  reason?: string
+  error?: string
 }
 
 export interface ChatResponse {
@@ -21,6 +31,9 @@ export interface ChatResponse {
   query: string
   verdict?: Verdict
   summary?: string
+  cached?: boolean
+  stages?: StageTrace[]
+  table?: Record<string, any>
 }
 
 export interface SearchResponse {